@@ -0,0 +1,149 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# The readers and day discovery of sample.py, and the feature definitions the serving windows use
+ROOT = Path(__file__).resolve().parent
+sys.path[:0] = [str(ROOT), str(ROOT.parent / 'roadsafety')]
+from sample import REQUIRED_SENSORS, StampCodes, check_csv_files, find_days, open_stream  # noqa: E402
+from inference.windows import (  # noqa: E402
+    ACC_STATS, GYRO_STATS, MIN_PERIODS, WINDOW_FEATURES as FEATURE_COLUMNS, WINDOW_SIZE, window_stats,
+)
+
+# Configuration
+BASE_DIR = ROOT / "extracted"
+OUTPUT_FILE = ROOT / "window_features.csv"
+STRIDE = 1  # features_14.csv starts a window at every sample
+CHUNK_WINDOWS = 100_000  # windows evaluated per vectorised block, bounds temporary memory
+
+
+def window_features(acc, gyro, window=WINDOW_SIZE, stride=STRIDE, min_periods=MIN_PERIODS):
+    """
+    Windowed features for time-aligned, contiguous (n_samples, 3) accelerometer and gyroscope arrays.
+
+    Windows start every `stride` samples; windows running past the end are
+    kept while they still hold at least `min_periods` samples. Returns a
+    (n_windows, 60) float64 array in FEATURE_COLUMNS order.
+    """
+    if len(acc) != len(gyro):
+        raise ValueError('acc and gyro must hold the same samples (see read_aligned)')
+    n_samples = len(acc)
+    if n_samples < min_periods:
+        return np.empty((0, len(FEATURE_COLUMNS)))
+
+    # Pad the end with NaN so tail windows are ordinary strided rows
+    n_windows = len(range(0, n_samples - min_periods + 1, stride))
+    padded = np.full((n_samples + window - 1, 6), np.nan)
+    padded[:n_samples, :3] = acc[:n_samples]
+    padded[:n_samples, 3:] = gyro[:n_samples]
+    views = sliding_window_view(padded, window, axis=0)[::stride][:n_windows]  # (n_windows, 6, window)
+
+    out = np.empty((n_windows, len(FEATURE_COLUMNS)))
+    for start in range(0, n_windows, CHUNK_WINDOWS):
+        block = slice(start, start + CHUNK_WINDOWS)
+        for sensor, stats_order in ((0, ACC_STATS), (1, GYRO_STATS)):
+            for axis in range(3):
+                stats = window_stats(views[block, sensor * 3 + axis, :])
+                for k, stat in enumerate(stats_order):
+                    out[block, sensor * 30 + k * 3 + axis] = stats[stat]
+    return out
+
+
+def read_aligned(day_path):
+    """
+    A day's accelerometer readings with the gyroscope reading taken at the
+    same time, as contiguous float64 (n_samples, 3) arrays. Readings are
+    paired on their Milliseconds clock with sample.py's as-of merge, not by
+    row number; accelerometer readings with no gyroscope reading within
+    sample.py's tolerance are dropped.
+    """
+    files = check_csv_files(day_path)
+    stamps = StampCodes()
+    streams = {}
+    for kind in REQUIRED_SENSORS:
+        stream = open_stream(kind, files[kind], stamps)
+        if stream is None:
+            raise ValueError(f'{files[kind].name} cannot be read')
+        while stream.read_chunk():
+            pass
+        streams[kind] = stream
+
+    accel = streams['accelerometer']
+    gyro = streams['gyroscope'].asof(accel.times)[0]
+    keep = ~np.isnan(gyro).any(axis=1)
+    return np.ascontiguousarray(accel.values[keep], dtype=np.float64), np.ascontiguousarray(gyro[keep], dtype=np.float64)
+
+
+def process_day(task):
+    """Build one day's feature table; runs in a worker process"""
+    day_path, label, window, stride, min_periods = task
+    if not all(kind in check_csv_files(day_path) for kind in REQUIRED_SENSORS):
+        return day_path.name, None, "⚠️  Missing Accelerometer.csv or Gyroscope.csv, skipping"
+
+    started = time.perf_counter()
+    try:
+        acc, gyro = read_aligned(day_path)
+    except Exception as e:
+        return day_path.name, None, f"⚠️  Error reading sensors: {e}"
+
+    features = window_features(acc, gyro, window, stride, min_periods)
+    table = pd.DataFrame(features, columns=FEATURE_COLUMNS)
+    table.insert(0, 'Target', label)
+    return day_path.name, table, f"✓ {len(acc)} aligned samples -> {len(table)} windows in {time.perf_counter() - started:.2f}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build features_14.csv-style window features from raw sensor CSVs')
+    parser.add_argument('--base-dir', type=Path, default=BASE_DIR)
+    parser.add_argument('--output', type=Path, default=OUTPUT_FILE)
+    parser.add_argument('--window', type=int, default=WINDOW_SIZE, help='Samples per window')
+    parser.add_argument('--stride', type=int, default=STRIDE, help='Samples between window starts')
+    parser.add_argument('--min-periods', type=int, default=MIN_PERIODS, help='Smallest tail window kept')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes (days run in parallel)')
+    args = parser.parse_args()
+
+    if not 4 <= args.min_periods <= args.window:
+        parser.error('--min-periods must be between 4 and --window (kurtosis needs 4 samples)')
+
+    print("=" * 60)
+    print("Building window features")
+    print(f"Base directory: {args.base_dir}")
+    print(f"Window: {args.window}, stride: {args.stride}, min periods: {args.min_periods}, workers: {args.workers}")
+    print("=" * 60)
+
+    days = find_days(args.base_dir)
+    tasks = [(day, label, args.window, args.stride, args.min_periods) for day, label in days]
+    started = time.perf_counter()
+    total = 0
+    header = True
+
+    # map() yields in submission order, so the output is identical whatever the worker count
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        for name, table, message in pool.map(process_day, tasks):
+            print(f"  {name}: {message}")
+            if table is None or table.empty:
+                continue
+            table.to_csv(args.output, mode='w' if header else 'a', header=header, index=False)
+            header = False
+            total += len(table)
+
+    if header:
+        print("\n❌ No data was processed!")
+        return
+
+    print("\n✅ SUCCESS!")
+    print(f"Windows written: {total}")
+    print(f"Saved to: {args.output}")
+    print(f"Elapsed: {time.perf_counter() - started:.2f}s")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,78 @@
 import pandas as pd
+import numpy as np
+import argparse
+import contextlib
+import hashlib
+import io
+import json
 import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # Configuration - Now points to current directory's extracted folder
-SAMPLING_RATE = 10  
+SAMPLE_HZ = 10  # every sensor is resampled onto one grid at this rate
 BASE_DIR = Path(__file__).parent / "extracted"  # ⭐ This fixes the path
 OUTPUT_FILE = Path(__file__).parent / "final_training_data.csv"
 
+# Cache of processed days: <CACHE_DIR>/<key>/ holds one .npy per column plus meta.json,
+# keyed by the content of the day's CSVs and the resampling config below
+CACHE_DIR = Path(__file__).parent / "cache"
+CACHE_VERSION = 3  # bump whenever process_day's output changes
+DATASET_FILE = "dataset.json"  # days of the last run, in order, for load_dataset()
+RUNS_DIR = "runs"              # <RUNS_DIR>/<scope>.json: the entries the last run of each --base-dir / --hz uses
+FILE_INDEX = "files.json"      # path -> (size, mtime, sha256), so unchanged files are not re-hashed
+META_FILE = "meta.json"
+TIMESTAMPS_FILE = "timestamps.npy"  # the day's distinct Timestamp strings; accel_0/gyro_0 hold codes into it
+
+# Streaming - raw rows parsed per chunk, and the out-of-core shuffle layout
+CHUNK_SIZE = 100_000
+SHUFFLE_BUCKETS = 16  # each bucket must fit in memory: ~ total sampled rows / SHUFFLE_BUCKETS
+SHUFFLE_SEED = 42
+STAGES = ('read', 'sample', 'merge', 'write')
+
+# Resampling - how stale a sensor's last reading may be at a grid point before it counts as missing
+# (None: hold the last reading indefinitely, for sensors that only log when the value changes)
+TOLERANCE_MS = {
+    'accelerometer': 200,
+    'gyroscope': 200,
+    'gps': 2000,
+    'proximity': None,
+}
+REQUIRED_SENSORS = ('accelerometer', 'gyroscope')
+VALUE_COLUMNS = {'accelerometer': 3, 'gyroscope': 3, 'gps': 3, 'proximity': 1}
+# Latitude / longitude need float64: float32 steps are ~1e-5 degrees around 50, i.e. about a metre
+VALUE_DTYPES = {'accelerometer': np.float32, 'gyroscope': np.float32, 'gps': np.float64, 'proximity': np.float32}
+
+# Fixed output layout, so every day's rows can be appended to the same files
+OUTPUT_COLUMNS = (
+    [f'accel_{i}' for i in range(5)]
+    + [f'gyro_{i}' for i in range(5)]
+    + ['gps_0', 'gps_1', 'gps_2', 'proximity', 'behavior', 'day']
+)
+
+# Storage schema of one day's rows: a block is a single structured array of this dtype.
+# Timestamps are int32 codes into the day's timestamp dictionary, Milliseconds fit int32
+# (24 days) and accelerometer, gyroscope and proximity readings carry ~7 significant
+# digits, which float32 holds. GPS latitude / longitude stay float64 (see VALUE_DTYPES).
+# behavior and day are constant for a day and live in meta.json.
+ROW_DTYPE = np.dtype(
+    [(f'accel_{i}', dtype) for i, dtype in enumerate([np.int32, np.int32] + [np.float32] * 3)]
+    + [(f'gyro_{i}', dtype) for i, dtype in enumerate([np.int32, np.int32] + [np.float32] * 3)]
+    + [('gps_0', np.float64), ('gps_1', np.float64), ('gps_2', np.float32), ('proximity', np.float32)]
+)
+STAMP_COLUMNS = ('accel_0', 'gyro_0')
+
+# dtypes of the training table returned by load_dataset()
+TABLE_DTYPES = {
+    **{name: ROW_DTYPE[name] for name in ROW_DTYPE.names},
+    'accel_0': 'category', 'gyro_0': 'category',
+    'behavior': np.int8,
+    'day': 'category',
+}
+
 def check_csv_files(day_path):
     """Check which CSV files exist in a day folder"""
     files = {}
@@ -26,19 +92,167 @@ def check_csv_files(day_path):
     
     return files
 
-def sample_csv(file_path, sampling_rate):
-    """Read and sample a CSV file"""
+class StampCodes:
+    """Dictionary encoding of a day's Timestamp strings (shared by all its sensors)"""
+
+    def __init__(self):
+        self.codes = {}
+
+    def encode(self, timestamps):
+        codes, uniques = pd.factorize(timestamps)
+        mapping = np.array([self.codes.setdefault(stamp, len(self.codes)) for stamp in uniques], dtype=np.int32)
+        return mapping[codes] if len(codes) else np.empty(0, dtype=np.int32)
+
+    def strings(self):
+        return np.array(list(self.codes), dtype=str)
+
+
+class SensorStream:
+    """
+    One sensor CSV as a time-ordered stream of readings, read chunk by chunk.
+
+    Time is the `Milliseconds` column: elapsed ms since the recording started,
+    a clock shared by all sensors of a day (`Timestamp` only has second, and
+    sometimes minute, resolution, so it is carried through as a label).
+    Incomplete rows and rows that step back in time are dropped.
+    """
+
+    def __init__(self, kind, file_path, stamps, chunksize=CHUNK_SIZE):
+        self.kind = kind
+        self.name = file_path.name
+        self.tolerance = TOLERANCE_MS[kind]
+        self.n_values = VALUE_COLUMNS[kind]
+        self.dtype = VALUE_DTYPES[kind]
+        self.stamp_codes = stamps
+        self.reader = pd.read_csv(file_path, chunksize=chunksize)  # raises on empty files
+        self.times = np.empty(0, dtype=np.int64)
+        self.stamps = np.empty(0, dtype=np.int32)
+        self.values = np.empty((0, self.n_values), dtype=self.dtype)
+        self.last_time = None
+        self.raw_rows = 0
+        self.kept_rows = 0
+        self.exhausted = False
+
+    def read_chunk(self):
+        """Append the next chunk to the buffer; returns False once the file is exhausted"""
+        chunk = next(self.reader, None)
+        if chunk is None:
+            self.exhausted = True
+            return False
+        self.raw_rows += len(chunk)
+
+        values = chunk.drop(columns=['Timestamp', 'Milliseconds']).iloc[:, :self.n_values]
+        values = values.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=self.dtype)
+        if values.shape[1] < self.n_values:
+            values = np.hstack([values, np.full((len(values), self.n_values - values.shape[1]), np.nan, dtype=self.dtype)])
+        times = pd.to_numeric(chunk['Milliseconds'], errors='coerce').to_numpy(dtype=np.float64)
+        stamps = self.stamp_codes.encode(chunk['Timestamp'])
+
+        keep = ~np.isnan(times) & ~np.isnan(values).any(axis=1)
+        times, values, stamps = times[keep].astype(np.int64), values[keep], stamps[keep]
+
+        # Keep strictly increasing times only (drops duplicates and clock resets)
+        start = self.last_time if self.last_time is not None else np.iinfo(np.int64).min
+        previous = np.maximum.accumulate(np.concatenate([[start], times]))[:-1]
+        keep = times > previous
+        times, values, stamps = times[keep], values[keep], stamps[keep]
+        if len(times):
+            self.last_time = int(times[-1])
+            self.kept_rows += len(times)
+            self.times = np.concatenate([self.times, times])
+            self.stamps = np.concatenate([self.stamps, stamps])
+            self.values = np.concatenate([self.values, values])
+        return True
+
+    def first_time(self):
+        while not len(self.times) and self.read_chunk():
+            pass
+        return self.times[0] if len(self.times) else None
+
+    def covered_until(self):
+        """Grid points before this time can be resampled from what is already buffered"""
+        if self.exhausted:
+            return np.inf
+        return self.times[-1] if len(self.times) else -np.inf
+
+    def asof(self, grid):
+        """
+        The latest reading at or before each grid time (a sorted merge via
+        searchsorted): (values, its Milliseconds, its Timestamp code). Values
+        are NaN where there is no reading within the sensor's tolerance.
+        """
+        index = np.searchsorted(self.times, grid, side='right') - 1
+        valid = index >= 0
+        if self.tolerance is not None:
+            valid[valid] = grid[valid] - self.times[index[valid]] <= self.tolerance
+        values = np.full((len(grid), self.n_values), np.nan, dtype=self.dtype)
+        values[valid] = self.values[index[valid]]
+        return values, np.where(valid, self.times[index], -1), np.where(valid, self.stamps[index], -1)
+
+    def release(self, t):
+        """Drop buffered readings no longer needed for grid points after t (keeps the one at or before t)"""
+        keep_from = max(np.searchsorted(self.times, t, side='right') - 1, 0)
+        self.times = self.times[keep_from:]
+        self.stamps = self.stamps[keep_from:]
+        self.values = self.values[keep_from:]
+
+    def report(self):
+        print(f"  Read {self.name}: {self.raw_rows} rows ({self.kept_rows} usable)")
+
+
+def open_stream(kind, file_path, stamps):
+    """SensorStream for a file, or None if it cannot be read"""
     try:
-        df = pd.read_csv(file_path)
-        sampled_df = df.iloc[::sampling_rate].reset_index(drop=True)
-        print(f"  Sampled {file_path.name}: {len(df)} -> {len(sampled_df)} rows")
-        return sampled_df
+        return SensorStream(kind, file_path, stamps)
     except Exception as e:
         print(f"  Error reading {file_path.name}: {e}")
         return None
 
-def process_day(day_path, behavior_label, sampling_rate):
-    """Process a single day's data"""
+
+def merge_block(grid, streams, timer):
+    """
+    One block of grid rows as a single preallocated ROW_DTYPE array, every
+    sensor resampled onto the grid. Rows without a fresh accelerometer and
+    gyroscope reading are dropped.
+    """
+    with timer('sample'):
+        sampled = {kind: stream.asof(grid) for kind, stream in streams.items() if stream is not None}
+    
+    with timer('merge'):
+        rows = np.zeros(len(grid), dtype=ROW_DTYPE)  # absent GPS / proximity stay 0
+        
+        # Accelerometer and gyroscope: Timestamp code and Milliseconds of the reading used, X, Y, Z
+        for kind, prefix in (('accelerometer', 'accel'), ('gyroscope', 'gyro')):
+            values, times, stamps = sampled[kind]
+            rows[f'{prefix}_0'] = stamps
+            rows[f'{prefix}_1'] = times
+            for i in range(3):
+                rows[f'{prefix}_{i + 2}'] = values[:, i]
+        
+        # GPS and proximity (NaN where the sensor has no reading in range)
+        if 'gps' in sampled:
+            for i in range(3):
+                rows[f'gps_{i}'] = sampled['gps'][0][:, i]
+        if 'proximity' in sampled:
+            rows['proximity'] = sampled['proximity'][0][:, 0]
+        
+        required = (sampled['accelerometer'][1] >= 0) & (sampled['gyroscope'][1] >= 0)
+        return rows[required]
+
+
+def process_day(day_path, sample_hz, write, stamps, timer):
+    """
+    Resample a single day's sensors onto a common `sample_hz` grid and stream it into `write`.
+
+    The grid runs over the span covered by both accelerometer and gyroscope.
+    Each sensor contributes its latest reading at or before every grid time,
+    so rows are aligned by time rather than by row number. Chunks are read
+    from whichever sensor lags behind, and grid points are emitted as soon as
+    every sensor has data past them: one linear pass over each file, with
+    memory bounded by a chunk per sensor. Blocks are ROW_DTYPE arrays whose
+    timestamps are codes into `stamps`; time per stage is added to `timer`.
+    Returns the rows written, or None if the day was skipped.
+    """
     print(f"\nProcessing: {day_path.name}")
     
     csv_files = check_csv_files(day_path)
@@ -53,130 +267,412 @@ def process_day(day_path, behavior_label, sampling_rate):
     
     print(f"  ✓ Found sensors: {list(csv_files.keys())}")
     
-    sensor_data = {}
+    with timer('read'):
+        streams = {kind: open_stream(kind, path, stamps) for kind, path in csv_files.items()}
+        if any(streams[kind] is None for kind in REQUIRED_SENSORS):
+            return None
+        active = [stream for stream in streams.values() if stream is not None]
+        starts = [streams[kind].first_time() for kind in REQUIRED_SENSORS]
     
-    # Sample Accelerometer
-    accel_df = sample_csv(csv_files['accelerometer'], sampling_rate)
-    if accel_df is None:
+    if any(start is None for start in starts):
+        print(f"  ⚠️  No usable Accel or Gyro readings, skipping")
         return None
-    sensor_data['accel'] = accel_df
     
-    # Sample Gyroscope
-    gyro_df = sample_csv(csv_files['gyroscope'], sampling_rate)
-    if gyro_df is None:
-        return None
-    sensor_data['gyro'] = gyro_df
-    
-    # Get minimum rows
-    min_rows = min(len(sensor_data['accel']), len(sensor_data['gyro']))
-    sensor_data['accel'] = sensor_data['accel'].iloc[:min_rows]
-    sensor_data['gyro'] = sensor_data['gyro'].iloc[:min_rows]
-    
-    # Sample GPS if present
-    if 'gps' in csv_files:
-        gps_df = sample_csv(csv_files['gps'], sampling_rate)
-        if gps_df is not None:
-            sensor_data['gps'] = gps_df.iloc[:min_rows]
-    
-    # Sample Proximity if present
-    if 'proximity' in csv_files:
-        prox_df = sample_csv(csv_files['proximity'], sampling_rate)
-        if prox_df is not None:
-            sensor_data['proximity'] = prox_df.iloc[:min_rows]
-    
-    # Merge all sensors
-    merged_df = pd.DataFrame()
-    
-    # Add accelerometer
-    accel_cols = sensor_data['accel'].columns.tolist()
-    for i, col in enumerate(accel_cols):
-        merged_df[f'accel_{i}'] = sensor_data['accel'][col]
-    
-    # Add gyroscope
-    gyro_cols = sensor_data['gyro'].columns.tolist()
-    for i, col in enumerate(gyro_cols):
-        merged_df[f'gyro_{i}'] = sensor_data['gyro'][col]
-    
-    # Add GPS or zeros
-    if 'gps' in sensor_data:
-        gps_cols = sensor_data['gps'].columns.tolist()
-        for i, col in enumerate(gps_cols):
-            merged_df[f'gps_{i}'] = sensor_data['gps'][col]
-    else:
-        merged_df['gps_0'] = 0
-        merged_df['gps_1'] = 0
-        merged_df['gps_2'] = 0
-    
-    # Add Proximity or zero
-    if 'proximity' in sensor_data:
-        merged_df['proximity'] = sensor_data['proximity'].iloc[:, 0]
-    else:
-        merged_df['proximity'] = 0
-    
-    # Add labels
-    merged_df['behavior'] = behavior_label
-    merged_df['day'] = day_path.name
-    
-    print(f"  ✓ Merged data shape: {merged_df.shape}")
-    return merged_df
+    step = 1000.0 / sample_hz
+    next_index = int(np.ceil(max(starts) / step))
+    rows = 0
+    while True:
+        lagging = [stream for stream in active if not stream.exhausted]
+        if lagging:
+            with timer('read'):
+                min(lagging, key=lambda stream: stream.covered_until()).read_chunk()
+        
+        # Grid points that no future chunk can change (none while a sensor has nothing buffered yet)
+        horizon = min(stream.covered_until() for stream in active)
+        ended = [streams[kind].last_time for kind in REQUIRED_SENSORS if streams[kind].exhausted]
+        if ended:
+            horizon = min(horizon, min(ended) + 1)
+        
+        end_index = int(np.ceil(horizon / step)) if horizon > -np.inf else next_index
+        if end_index > next_index:
+            grid = np.round(np.arange(next_index, end_index) * step).astype(np.int64)
+            block = merge_block(grid, streams, timer)
+            if len(block):
+                with timer('write'):
+                    write(block)
+                rows += len(block)
+            next_index = end_index
+            for stream in active:
+                stream.release(grid[-1])
+        
+        if not lagging or (ended and next_index * step > min(ended)):
+            break
+    
+    for stream in active:
+        stream.report()
+    print(f"  ✓ Resampled to {sample_hz} Hz: {(rows, len(OUTPUT_COLUMNS))}")
+    return rows
+
+
+class StageTimer:
+    """Wall time spent in each pipeline stage (read, sample, merge, write), summed over calls"""
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+
+    @contextlib.contextmanager
+    def __call__(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] += time.perf_counter() - started
+
+    def add(self, seconds):
+        for stage, value in seconds.items():
+            self.seconds[stage] += value
+
+
+def file_digest(path, index):
+    """sha256 of a file's content, reused from the index while its size and mtime are unchanged"""
+    stat = path.stat()
+    entry = index.get(str(path))
+    if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        return entry['sha256']
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    index[str(path)] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+    return digest.hexdigest()
+
+
+def day_cache_key(day_path, behavior_label, sample_hz, index):
+    """Content address of a day's processed output: its CSVs' hashes plus everything that shapes the output"""
+    config = {
+        'version': CACHE_VERSION,
+        'day': day_path.name,
+        'behavior': behavior_label,
+        'sample_hz': sample_hz,
+        'tolerance_ms': TOLERANCE_MS,
+        'value_columns': VALUE_COLUMNS,
+        'required': REQUIRED_SENSORS,
+        'files': {f.name: file_digest(f, index) for f in sorted(day_path.glob("*.csv"))},
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:32]
+
+
+def run_scope(base_dir, sample_hz):
+    """Name of a run configuration's manifest: runs over other data or at another rate keep their entries"""
+    config = {'base_dir': str(Path(base_dir).resolve()), 'sample_hz': sample_hz}
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def prune_cache(cache_dir, scope, keys):
+    """
+    Record `keys` as the entries of configuration `scope` and delete the
+    entries no configuration's last run uses. Returns the names deleted.
+    """
+    runs = Path(cache_dir) / RUNS_DIR
+    runs.mkdir(exist_ok=True)
+    (runs / f"{scope}.json").write_text(json.dumps(sorted(set(keys)), indent=1))
+    used = set()
+    for manifest in runs.glob("*.json"):
+        used.update(json.loads(manifest.read_text()))
+    
+    deleted = []
+    for entry in Path(cache_dir).iterdir():
+        if entry.is_dir() and entry.name != RUNS_DIR and entry.name not in used:
+            shutil.rmtree(entry, ignore_errors=True)
+            deleted.append(entry.name)
+    return deleted
+
+
+class DayCacheWriter:
+    """
+    Builds one day's cache entry from the ROW_DTYPE blocks process_day emits.
+
+    Each field is appended to its own raw file, converted to .npy at the end
+    and the staging directory is renamed into place, so readers never see a
+    partial entry.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.staging = self.directory.with_name(f"{self.directory.name}.tmp-{os.getpid()}")
+        shutil.rmtree(self.staging, ignore_errors=True)
+        self.staging.mkdir(parents=True)
+        self.files = {column: open(self.staging / f"{column}.raw", 'wb') for column in ROW_DTYPE.names}
+        self.stamps = StampCodes()
+        self.rows = 0
+
+    def write(self, block):
+        for column in ROW_DTYPE.names:
+            np.ascontiguousarray(block[column]).tofile(self.files[column])
+        self.rows += len(block)
+
+    def commit(self, meta):
+        for column in ROW_DTYPE.names:
+            dtype = ROW_DTYPE[column]
+            self.files[column].close()
+            raw_path = self.staging / f"{column}.raw"
+            target = np.lib.format.open_memmap(self.staging / f"{column}.npy", mode='w+', dtype=dtype, shape=(self.rows,))
+            if self.rows:
+                target[:] = np.memmap(raw_path, dtype=dtype, mode='r', shape=(self.rows,))
+            target.flush()
+            del target
+            raw_path.unlink()
+        np.save(self.staging / TIMESTAMPS_FILE, self.stamps.strings())
+        with open(self.staging / META_FILE, 'w') as f:
+            json.dump({**meta, 'rows': self.rows}, f, indent=2)
+        try:
+            os.replace(self.staging, self.directory)
+        except OSError:
+            # Another run committed the same entry first; content-addressed, so it is identical
+            shutil.rmtree(self.staging, ignore_errors=True)
+
+
+def load_day(directory, mmap_mode='r'):
+    """(meta, {column: array}, timestamp strings) of a cache entry; arrays are memory-mapped by default"""
+    directory = Path(directory)
+    with open(directory / META_FILE) as f:
+        meta = json.load(f)
+    columns = {
+        column: np.load(directory / f"{column}.npy", mmap_mode=mmap_mode, allow_pickle=False)
+        for column in ROW_DTYPE.names
+    }
+    return meta, columns, np.load(directory / TIMESTAMPS_FILE, allow_pickle=False)
+
+
+def day_blocks(meta, columns, stamps, block_rows=CHUNK_SIZE):
+    """A cached day as OUTPUT_COLUMNS DataFrames (timestamps decoded) of up to block_rows rows"""
+    for start in range(0, meta['rows'], block_rows):
+        block = {column: columns[column][start:start + block_rows] for column in ROW_DTYPE.names}
+        for column in STAMP_COLUMNS:
+            block[column] = stamps[block[column]]
+        n = len(block['accel_1'])
+        block['behavior'] = np.full(n, meta['behavior'], dtype=np.int8)
+        block['day'] = np.full(n, meta['day'])
+        yield pd.DataFrame(block, columns=OUTPUT_COLUMNS)
+
+
+def load_dataset(cache_dir=CACHE_DIR, shuffle=True, seed=SHUFFLE_SEED):
+    """
+    The training table straight from the binary cache (no CSV parsing), for
+    the days of the last sample.py run, with TABLE_DTYPES: float32/int32
+    readings (float64 GPS position), int8 behavior and categorical timestamps and day. Each column
+    is gathered into one array and the frame is built once. Rows are
+    shuffled like the CSV export unless shuffle=False.
+    """
+    cache_dir = Path(cache_dir)
+    with open(cache_dir / DATASET_FILE) as f:
+        entries = json.load(f)['days']
+    days = [load_day(cache_dir / entry['key']) for entry in entries]
+    sizes = np.array([meta['rows'] for meta, _, _ in days], dtype=np.int64)
+    order = np.random.default_rng(seed).permutation(sizes.sum()) if shuffle else slice(None)
+    
+    data = {}
+    for column in ROW_DTYPE.names:
+        if column in STAMP_COLUMNS:
+            continue
+        data[column] = np.concatenate([columns[column] for _, columns, _ in days] or [np.empty(0, ROW_DTYPE[column])])[order]
+    
+    # Timestamps: re-code every day's dictionary against one shared category list
+    categories = pd.Index(np.concatenate([stamps for _, _, stamps in days] or [np.empty(0, str)])).unique()
+    for column in STAMP_COLUMNS:
+        codes = np.concatenate(
+            [categories.get_indexer(stamps)[columns[column]] for _, columns, stamps in days] or [np.empty(0, np.int64)]
+        )
+        data[column] = pd.Categorical.from_codes(codes[order], categories=categories)
+    
+    data['behavior'] = np.repeat(np.array([meta['behavior'] for meta, _, _ in days], dtype=np.int8), sizes)[order]
+    data['day'] = pd.Categorical.from_codes(
+        np.repeat(np.arange(len(days)), sizes)[order], categories=[meta['day'] for meta, _, _ in days]
+    )
+    return pd.DataFrame(data, columns=OUTPUT_COLUMNS)
+
+
+class DayShards:
+    """
+    First half of the out-of-core shuffle, for one day: its rows are scattered
+    at random into SHUFFLE_BUCKETS temporary CSV shards
+    (<directory>/bucket_<b>/day_<index>.csv). The RNG is seeded with the day's
+    index, so the scatter does not depend on which worker ran the day.
+    """
+
+    def __init__(self, directory, day_index, buckets=SHUFFLE_BUCKETS, seed=SHUFFLE_SEED):
+        self.paths = [Path(directory) / f"bucket_{b:03d}" / f"day_{day_index:05d}.csv" for b in range(buckets)]
+        self.started = [False] * buckets
+        self.rng = np.random.default_rng([seed, day_index])
+
+    def write(self, block):
+        bucket = self.rng.integers(0, len(self.paths), size=len(block))
+        for b in np.unique(bucket):
+            path = self.paths[b]
+            if not self.started[b]:
+                path.parent.mkdir(exist_ok=True)
+            block[bucket == b].to_csv(path, mode='a' if self.started[b] else 'w', header=not self.started[b], index=False)
+            self.started[b] = True
+
+
+def drain_shards(directory, output_file, buckets=SHUFFLE_BUCKETS, seed=SHUFFLE_SEED):
+    """
+    Second half of the shuffle: each bucket's day shards are concatenated in
+    day order, shuffled in memory with the bucket's own seed and appended to
+    output_file (renamed into place at the end). Memory is bounded by the
+    largest bucket. Returns the row count.
+    """
+    total = 0
+    tmp_output = output_file.with_name(output_file.name + '.tmp')
+    pd.DataFrame(columns=OUTPUT_COLUMNS).to_csv(tmp_output, index=False)
+    for b in range(buckets):
+        parts = sorted((Path(directory) / f"bucket_{b:03d}").glob("day_*.csv"))
+        if not parts:
+            continue
+        shard = pd.concat([pd.read_csv(path, dtype=str, keep_default_na=False) for path in parts], ignore_index=True)
+        shard = shard.iloc[np.random.default_rng([seed, buckets, b]).permutation(len(shard))]
+        shard.to_csv(tmp_output, mode='a', header=False, index=False)
+        total += len(shard)
+        for path in parts:
+            path.unlink()
+    os.replace(tmp_output, output_file)
+    return total
+
+
+def find_days(base_dir):
+    """(day folder, label) pairs in deterministic order: risky days (label 1) then safe days (label 0)"""
+    days = []
+    for label, behavior_label in (("RISKY", 1), ("SAFE", 0)):
+        folder = base_dir / label.lower()
+        if not folder.exists():
+            print(f"⚠️  {label.capitalize()} folder not found at: {folder}")
+            continue
+        day_folders = sorted([d for d in folder.iterdir() if d.is_dir()])
+        print(f"📊 Found {len(day_folders)} {label.lower()} day folders")
+        days += [(d, behavior_label) for d in day_folders]
+    return days
+
+
+def run_day(task):
+    """
+    Bring one day's cache entry up to date and, when exporting CSV, scatter it
+    into its shuffle shards; runs in a worker process.
+
+    Output printed by process_day is captured and returned, so the log reads
+    the same in serial and parallel runs.
+    """
+    day_index, day_path, behavior_label, sample_hz, key, cache_dir, shard_dir = task
+    timer = StageTimer()
+    entry = Path(cache_dir) / key
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        hit = (entry / META_FILE).exists()
+        if hit:
+            print(f"\nCached: {day_path.name} ({key})")
+        else:
+            writer = DayCacheWriter(entry)
+            rows = process_day(day_path, sample_hz=sample_hz, write=writer.write, stamps=writer.stamps, timer=timer)
+            with timer('write'):
+                writer.commit({'day': day_path.name, 'behavior': behavior_label, 'sample_hz': sample_hz, 'skipped': rows is None})
+        
+        with timer('read'):
+            meta, columns, stamps = load_day(entry)
+        if shard_dir is not None and meta['rows']:
+            shards = DayShards(shard_dir, day_index)
+            for block in day_blocks(meta, columns, stamps):
+                with timer('write'):
+                    shards.write(block)
+    return meta['rows'], hit, timer.seconds, log.getvalue()
+
 
 def main():
+    parser = argparse.ArgumentParser(description='Resample the raw sensor CSVs into final_training_data.csv')
+    parser.add_argument('--base-dir', type=Path, default=BASE_DIR)
+    parser.add_argument('--output', type=Path, default=OUTPUT_FILE)
+    parser.add_argument('--cache-dir', type=Path, default=CACHE_DIR, help='Processed days, reused while their CSVs are unchanged')
+    parser.add_argument('--no-csv', action='store_true', help='Only update the cache (training reads it via load_dataset)')
+    parser.add_argument('--hz', type=float, default=SAMPLE_HZ, help='Resampling rate of the output rows')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes (days run in parallel)')
+    args = parser.parse_args()
+    workers = max(1, args.workers)
+    
     print("=" * 60)
     print("Starting Driver Behavior Data Sampling")
-    print(f"Base directory: {BASE_DIR}")
+    print(f"Base directory: {args.base_dir}")
+    print(f"Cache directory: {args.cache_dir}")
+    print(f"Sample rate: {args.hz} Hz, workers: {workers}")
     print("=" * 60)
     
-    all_data = []
+    started = time.perf_counter()
+    timer = StageTimer()
+    args.cache_dir.mkdir(parents=True, exist_ok=True)
+    index_path = args.cache_dir / FILE_INDEX
+    index = json.loads(index_path.read_text()) if index_path.exists() else {}
     
-    # Process RISKY
-    print("\n📊 Processing RISKY days...")
-    risky_path = BASE_DIR / "risky"
+    days = find_days(args.base_dir)
+    with timer('read'):
+        keys = [day_cache_key(day, behavior_label, args.hz, index) for day, behavior_label in days]
+    index_path.write_text(json.dumps(index, indent=1))
     
-    if risky_path.exists():
-        risky_days = sorted([d for d in risky_path.iterdir() if d.is_dir()])
-        print(f"Found {len(risky_days)} risky day folders")
+    counts = {}
+    dataset = []
+    hits = 0
+    shard_dir = None if args.no_csv else tempfile.mkdtemp(prefix="sample_shards_", dir=args.output.parent)
+    try:
+        tasks = [
+            (i, day, behavior_label, args.hz, key, args.cache_dir, shard_dir)
+            for i, ((day, behavior_label), key) in enumerate(zip(days, keys))
+        ]
         
-        for day_folder in risky_days:
-            day_data = process_day(day_folder, behavior_label=1, sampling_rate=SAMPLING_RATE)
-            if day_data is not None:
-                all_data.append(day_data)
-    else:
-        print(f"⚠️  Risky folder not found at: {risky_path}")
-    
-    # Process SAFE
-    print("\n📊 Processing SAFE days...")
-    safe_path = BASE_DIR / "safe"
-    
-    if safe_path.exists():
-        safe_days = sorted([d for d in safe_path.iterdir() if d.is_dir()])
-        print(f"Found {len(safe_days)} safe day folders")
+        # Days only share the shard directory (each writes its own files), and map()
+        # yields in submission order, so the output is byte-identical for any worker count
+        with contextlib.ExitStack() as stack:
+            if workers > 1:
+                results = stack.enter_context(ProcessPoolExecutor(max_workers=workers)).map(run_day, tasks)
+            else:
+                results = map(run_day, tasks)
+            for (day, behavior_label), key, (rows, hit, seconds, log) in zip(days, keys, results):
+                print(log, end="")
+                timer.add(seconds)
+                hits += hit
+                if rows:
+                    counts[behavior_label] = counts.get(behavior_label, 0) + rows
+                    dataset.append({'day': day.name, 'behavior': behavior_label, 'key': key, 'rows': rows})
         
-        for day_folder in safe_days:
-            day_data = process_day(day_folder, behavior_label=0, sampling_rate=SAMPLING_RATE)
-            if day_data is not None:
-                all_data.append(day_data)
-    else:
-        print(f"⚠️  Safe folder not found at: {safe_path}")
-    
-    if not all_data:
-        print("\n❌ No data was processed!")
-        return
-    
-    print("\n" + "=" * 60)
-    print("Combining all data...")
-    final_df = pd.concat(all_data, ignore_index=True)
-    final_df = final_df.sample(frac=1, random_state=42).reset_index(drop=True)
-    
-    final_df.to_csv(OUTPUT_FILE, index=False)
+        # Record this run's days for load_dataset(), and drop entries that neither this
+        # run nor the last run of another --base-dir / --hz still uses
+        (args.cache_dir / DATASET_FILE).write_text(json.dumps({'sample_hz': args.hz, 'days': dataset}, indent=2))
+        prune_cache(args.cache_dir, run_scope(args.base_dir, args.hz), keys)
+        
+        if not dataset:
+            print("\n❌ No data was processed!")
+            return
+        
+        total = sum(entry['rows'] for entry in dataset)
+        if shard_dir is not None:
+            print("\n" + "=" * 60)
+            print("Shuffling shards into the output file...")
+            with timer('write'):
+                drain_shards(shard_dir, args.output)
+    finally:
+        if shard_dir is not None:
+            shutil.rmtree(shard_dir, ignore_errors=True)
     
     print("\n✅ SUCCESS!")
     print("=" * 60)
-    print(f"Final dataset shape: {final_df.shape}")
-    print(f"Total rows: {len(final_df)}")
+    print(f"Final dataset shape: {(total, len(OUTPUT_COLUMNS))}")
+    print(f"Total rows: {total}")
+    print(f"Days reused from cache: {hits}/{len(days)}")
     print(f"\nBehavior distribution:")
-    print(final_df['behavior'].value_counts())
-    print(f"\nSaved to: {OUTPUT_FILE}")
-    print(f"File size: {os.path.getsize(OUTPUT_FILE) / (1024*1024):.2f} MB")
+    print(pd.Series(counts, name='count').rename_axis('behavior').sort_values(ascending=False))
+    print(f"\nCache: {args.cache_dir / DATASET_FILE}")
+    if shard_dir is not None:
+        print(f"Saved to: {args.output}")
+        print(f"File size: {os.path.getsize(args.output) / (1024*1024):.2f} MB")
+    print(f"\nStage timings (summed over workers):")
+    for stage in STAGES:
+        print(f"  {stage:<8}{timer.seconds[stage]:>8.2f}s")
+    print(f"  {'elapsed':<8}{time.perf_counter() - started:>8.2f}s")
     print("=" * 60)
 
 if __name__ == "__main__":
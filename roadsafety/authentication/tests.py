@@ -1,3 +1,88 @@
-from django.test import TestCase
+import json
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings, tag
+
+from inference import benchmarks
+from inference.serving import behaviour_model, predict_behaviour_many, predict_behaviour_one
+from monitor.telemetry import request_driver
+
+from .models import UserProfile
+
+SAMPLE = {
+    'accel_2': -0.31, 'accel_3': 2.45, 'accel_4': 9.84,
+    'gyro_2': -0.05, 'gyro_3': 0.02, 'gyro_4': 0.01,
+    'proximity': 0,
+}
+BATCH = {'samples': [SAMPLE] * 100}
+REGISTRATION = {
+    'first_name': 'Asha', 'last_name': 'Rao', 'username': 'asha', 'email': 'asha@example.com',
+    'password': 'road-safety-1', 'confirm_password': 'road-safety-1',
+}
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AuthFlowTests(TestCase):
+    def test_register_writes_user_and_profile_once(self):
+        # email check, user INSERT, profile INSERT (+ savepoint pair)
+        with self.assertNumQueries(5):
+            response = self.client.post('/register/', REGISTRATION)
+        self.assertRedirects(response, '/login/', fetch_redirect_response=False)
+        user = User.objects.get(username='asha')
+        self.assertTrue(user.check_password('road-safety-1'))
+        self.assertTrue(UserProfile.objects.filter(user=user).exists())
+
+    def test_register_rejects_duplicates(self):
+        self.client.post('/register/', REGISTRATION)
+        self.client.post('/register/', {**REGISTRATION, 'email': 'other@example.com'})
+        self.client.post('/register/', {**REGISTRATION, 'username': 'asha2'})
+        self.assertEqual(User.objects.count(), 1)
+        self.assertEqual(UserProfile.objects.count(), 1)
+
+    def test_login(self):
+        User.objects.create_user('asha', password='road-safety-1')
+        for username, password in [('nobody', 'road-safety-1'), ('asha', 'wrong')]:
+            response = self.client.post('/login/', {'username': username, 'password': password})
+            self.assertRedirects(response, '/login/', fetch_redirect_response=False)
+        response = self.client.post('/login/', {'username': 'asha', 'password': 'road-safety-1'})
+        self.assertRedirects(response, '/home/', fetch_redirect_response=False)
+
+    def test_polling_request_identifies_driver_with_one_query(self):
+        user = User.objects.create_user('asha', password='road-safety-1')
+        self.client.force_login(user)
+        request = RequestFactory().post('/api/predict-behavior/')
+        request.session = self.client.session
+        with self.assertNumQueries(1):  # the user, to check it still exists (the session comes from the cache)
+            self.assertEqual(request_driver(request, {}), (f'user-{user.pk}', user.pk))
+
+
+@tag('benchmark')
+@skipUnless(benchmarks.ENABLED, 'set BENCHMARK=1 to run the benchmarks')
+@skipUnless(behaviour_model.get() is not None, 'no driver behaviour model is loaded')
+class PredictBehaviorBenchmarks(benchmarks.BenchmarkMixin, SimpleTestCase):
+    """Latency / throughput of /api/predict-behavior/ end to end and of the scoring underneath it"""
+
+    def post(self, path, payload):
+        body = json.dumps(payload)
+
+        def make_call():
+            client = Client(HTTP_HOST='localhost')
+
+            def call():
+                response = client.post(path, body, content_type='application/json')
+                assert response.status_code == 200, response.content
+            return call
+        return make_call
+
+    def test_single_sample_view(self):
+        self.assertNoRegression('predict_behavior view', self.post('/api/predict-behavior/', SAMPLE))
+
+    def test_batch_view(self):
+        self.assertNoRegression('predict_behavior_batch view', self.post('/api/predict-behavior/batch/', BATCH), requests=100)
+
+    def test_single_sample_model(self):
+        self.assertNoRegression('predict_behaviour_one', lambda: lambda: predict_behaviour_one(SAMPLE))
+
+    def test_batch_model(self):
+        self.assertNoRegression('predict_behaviour_many', lambda: lambda: predict_behaviour_many(BATCH['samples']), requests=100)
@@ -9,4 +9,6 @@ urlpatterns = [
     path('profile/', views.profile, name='profile'),
     path('sensor-monitor/', views.sensor_monitor, name='sensor_monitor'),  # New page
     path('api/predict-behavior/', views.predict_behavior, name='predict_behavior'),  # API endpoint
+    path('api/predict-behavior/batch/', views.predict_behavior_batch, name='predict_behavior_batch'),
+    path('api/predict-behavior/async/', views.predict_behavior_async, name='predict_behavior_async'),  # ASGI
 ]
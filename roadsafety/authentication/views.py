@@ -3,6 +3,7 @@ from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
 from .models import UserProfile
 
 def register_page(request):
@@ -18,26 +19,26 @@ def register_page(request):
             messages.error(request, "Passwords do not match!")
             return redirect('/register/')
         
-        if User.objects.filter(username=username).exists():
-            messages.error(request, "Username already taken!")
-            return redirect('/register/')
-        
-        if User.objects.filter(email=email).exists():
+        # auth_user has no unique constraint on email, so that one stays a check
+        if email and User.objects.filter(email=email).exists():
             messages.error(request, "Email already registered!")
             return redirect('/register/')
         
-        # Create user
-        user = User.objects.create_user(
-            username=username,
-            email=email,
-            first_name=first_name,
-            last_name=last_name
-        )
-        user.set_password(password)
-        user.save()
-        
-        # Create profile for the new user
-        UserProfile.objects.create(user=user)
+        # Create user (password hashed before the single INSERT) and profile in one
+        # transaction; the unique username constraint catches duplicates
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(
+                    username=username,
+                    email=email,
+                    password=password,
+                    first_name=first_name,
+                    last_name=last_name
+                )
+                UserProfile.objects.create(user=user)
+        except IntegrityError:
+            messages.error(request, "Username already taken!")
+            return redirect('/register/')
         
         messages.success(request, "Account created successfully! Please login.")
         return redirect('/login/')
@@ -49,14 +50,12 @@ def login_page(request):
         username = request.POST.get('username')
         password = request.POST.get('password')
         
-        if not User.objects.filter(username=username).exists():
-            messages.error(request, 'Invalid Username')
-            return redirect('/login/')
-        
+        # One user lookup inside authenticate(); an unknown username and a wrong
+        # password are indistinguishable without a second query
         user = authenticate(request, username=username, password=password)
         
         if user is None:
-            messages.error(request, "Invalid Password")
+            messages.error(request, "Invalid username or password")
             return redirect('/login/')
         else:
             login(request, user)
@@ -220,31 +219,13 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
-import joblib
-import numpy as np
-import pandas as pd  # ✅ Added for DataFrame
-import os
-from pathlib import Path
-
-
-# Load ML model and scaler once when Django starts
-BASE_DIR = Path(__file__).resolve().parent.parent
-MODEL_PATH = BASE_DIR / 'model' / 'driver_behaviour.pkl'
-SCALER_PATH = BASE_DIR / 'model' / 'scaler.pkl'
-
-# Load model if files exist
-try:
-    # ✅ Fixed: Use joblib.load() directly, no need for 'with open'
-    model = joblib.load(MODEL_PATH)
-    scaler = joblib.load(SCALER_PATH)
-    MODEL_LOADED = True
-    print("✅ ML MODEL LOADED SUCCESSFULLY!")
-except FileNotFoundError:
-    MODEL_LOADED = False
-    print("⚠️ Warning: ML model files not found.")
-except Exception as e:
-    MODEL_LOADED = False
-    print(f"⚠️ Error loading model: {e}")
+from inference import metrics, wire
+from inference.admission import Rejected, admission, rejected_response
+from inference.serving import (
+    MAX_BATCH_SIZE, ModelNotLoaded, predict_behaviour_many, predict_behaviour_one, predict_behaviour_rows,
+    push_driver_window,
+)
+from monitor.telemetry import arequest_driver, record_behaviour, request_driver
 
 
 @csrf_exempt  # Remove this in production, use proper CSRF
@@ -252,48 +233,168 @@ except Exception as e:
 def predict_behavior(request):
     """
     API endpoint to predict driver behavior from sensor data
+
+    Takes a JSON object, or one packed inference.wire record (driver_id then
+    goes in the query string).
     """
-    if not MODEL_LOADED:
+    try:
+        data = _sample(request)
+        metrics.lap('parse')
+
+        driver, user_id = request_driver(request, data)
+        metrics.lap('driver')
+        result, version = _score_sample(data, driver)
+
+        # Identified drivers' samples are kept as trip telemetry
+        if driver is not None:
+            record_behaviour(driver, user_id, data, result, version)
+            metrics.lap('telemetry')
+
+        # Return result, tagged with the model version that produced it
+        response = JsonResponse({**result, 'model_version': version})
+        response['X-Model-Version'] = version
+        metrics.lap('serialize')
+        return response
+
+    except ModelNotLoaded as e:
         return JsonResponse({
-            'error': 'Model not loaded. Please upload model files.'
+            'error': str(e)
         }, status=500)
-    
+    except Exception as e:
+        return JsonResponse({
+            'error': str(e)
+        }, status=400)
+
+
+@csrf_exempt  # Remove this in production, use proper CSRF
+@require_http_methods(["POST"])
+async def predict_behavior_async(request):
+    """
+    Async predict_behavior for the ASGI app.
+
+    Model work is admitted through inference.admission: when the model
+    threads and their queue are full the request gets a quick 503, and a
+    queued sample overtaken by a newer one from the same driver a 429, both
+    with Retry-After, instead of everyone's latency growing with the queue.
+    """
     try:
-        # Parse incoming JSON data
+        data = _sample(request)
+        metrics.lap('parse')
+
+        driver, user_id = await arequest_driver(request, data)
+        metrics.lap('driver')
+        result, version = await admission.run(_score_sample, data, driver, driver=driver)
+        if driver is not None:
+            record_behaviour(driver, user_id, data, result, version)
+            metrics.lap('telemetry')
+
+        response = JsonResponse({**result, 'model_version': version})
+        response['X-Model-Version'] = version
+        metrics.lap('serialize')
+        return response
+
+    except Rejected as e:
+        return rejected_response(e)
+    except ModelNotLoaded as e:
+        return JsonResponse({
+            'error': str(e)
+        }, status=500)
+    except Exception as e:
+        return JsonResponse({
+            'error': str(e)
+        }, status=400)
+
+
+def _sample(request):
+    """The posted sample: a JSON object, or one packed inference.wire record (driver_id then in the query string)"""
+    if request.content_type == wire.CONTENT_TYPE:
+        data = wire.as_dicts(wire.decode(request.body, wire.BEHAVIOUR, max_count=1), wire.BEHAVIOUR)[0]
+        data['driver_id'] = request.GET.get('driver_id')
+        return data
+    return json.loads(request.body)
+
+
+def _score_sample(data, driver):
+    result, version = predict_behaviour_one(data)
+
+    # Identified drivers (see request_driver) also feed their sliding feature window
+    if driver is not None:
+        result.update(push_driver_window(driver, data))
+        metrics.lap('window')
+    return result, version
+
+
+@csrf_exempt  # Remove this in production, use proper CSRF
+@require_http_methods(["POST"])
+def predict_behavior_batch(request):
+    """
+    API endpoint to predict driver behavior for many sensor samples at once.
+
+    Accepts {"samples": [{...}, ...]} (or a bare list) where each sample has
+    the same keys as predict_behavior, and scores them in a single
+    scaler/model pass.
+
+    Packed inference.wire records are decoded straight into the feature
+    matrix (no per-value parsing); driver_id then goes in the query string.
+    """
+    try:
+        if request.content_type == wire.CONTENT_TYPE:
+            return _predict_behavior_records(request)
+
         data = json.loads(request.body)
-        
-        # ✅ Fixed: Create DataFrame with feature names (eliminates warning)
-        sensor_data = pd.DataFrame([{
-            'accel_2': float(data.get('accel_2', 0)),
-            'accel_3': float(data.get('accel_3', 0)),
-            'accel_4': float(data.get('accel_4', 0)),
-            'gyro_2': float(data.get('gyro_2', 0)),
-            'gyro_3': float(data.get('gyro_3', 0)),
-            'gyro_4': float(data.get('gyro_4', 0)),
-            'proximity': float(data.get('proximity', 0))
-        }])
-        
-        # Scale the data (now with proper feature names)
-        sensor_scaled = scaler.transform(sensor_data)
-        
-        # Predict
-        prediction = model.predict(sensor_scaled)[0]
-        probability = model.predict_proba(sensor_scaled)[0]
-        
-        # Return result
+        samples = data.get('samples') if isinstance(data, dict) else data
+        metrics.lap('parse')
+
+        if not isinstance(samples, list) or not samples:
+            return JsonResponse({'error': 'Expected a non-empty list of samples'}, status=400)
+        if len(samples) > MAX_BATCH_SIZE:
+            return JsonResponse({
+                'error': f'Batch too large ({len(samples)} > {MAX_BATCH_SIZE} samples)'
+            }, status=400)
+
+        results, version = predict_behaviour_many(samples)
+
+        driver, user_id = request_driver(request, data if isinstance(data, dict) else {})
+        metrics.lap('driver')
+        if driver is not None:
+            for sample, result in zip(samples, results):
+                record_behaviour(driver, user_id, sample, result, version)
+            metrics.lap('telemetry')
+
+        response = JsonResponse({'count': len(results), 'results': results, 'model_version': version})
+        response['X-Model-Version'] = version
+        metrics.lap('serialize')
+        return response
+
+    except ModelNotLoaded as e:
         return JsonResponse({
-            'behavior': 'risky' if prediction == 1 else 'safe',
-            'confidence': float(probability[prediction] * 100),
-            'risky_probability': float(probability[1] * 100),
-            'safe_probability': float(probability[0] * 100)
-        })
-        
+            'error': str(e)
+        }, status=500)
     except Exception as e:
         return JsonResponse({
             'error': str(e)
         }, status=400)
 
 
+def _predict_behavior_records(request):
+    rows = wire.decode(request.body, wire.BEHAVIOUR, max_count=MAX_BATCH_SIZE)
+    metrics.lap('parse')
+
+    results, version = predict_behaviour_rows(rows)
+
+    driver, user_id = request_driver(request, request.GET)
+    metrics.lap('driver')
+    if driver is not None:
+        for sample, result in zip(wire.as_dicts(rows, wire.BEHAVIOUR), results):
+            record_behaviour(driver, user_id, sample, result, version)
+        metrics.lap('telemetry')
+
+    response = JsonResponse({'count': len(results), 'results': results, 'model_version': version})
+    response['X-Model-Version'] = version
+    metrics.lap('serialize')
+    return response
+
+
 @login_required
 def sensor_monitor(request):
     """
@@ -0,0 +1,131 @@
+import asyncio
+import contextvars
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.http import JsonResponse
+
+from . import metrics
+
+
+class Rejected(Exception):
+    """A request turned away before any model work; answered with `status` and a Retry-After"""
+
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Admission control for the async prediction views.
+
+    At most `concurrency` model calls run at once, on a dedicated thread pool
+    of that size; at most `queue_depth` more wait for a slot. Anything beyond
+    is rejected at once with 503, and so is a request that waited longer than
+    `max_age` seconds, since its reading is stale by the time it would be
+    scored. A request waiting for a slot is dropped with 429 as soon as a
+    newer one for the same driver arrives, which takes over its place in the
+    queue: only each driver's latest sample is worth scoring.
+
+    All bookkeeping happens on the event loop thread, so it needs no locks.
+    """
+
+    def __init__(self, concurrency=4, queue_depth=64, max_age=2.0, retry_after=1):
+        self.configure(concurrency, queue_depth, max_age, retry_after)
+
+    def configure(self, concurrency=4, queue_depth=64, max_age=2.0, retry_after=1):
+        self.concurrency = concurrency
+        self.queue_depth = queue_depth
+        self.max_age = max_age
+        self.retry_after = retry_after
+        self._executor = None
+        self._loop = None
+
+    def _bind(self):
+        # Semaphores belong to one event loop; tests and reloads may bring a new one
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._waiting = 0
+            self._waiters = {}  # driver -> its request's pending slot acquisition
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix='inference')
+        return loop
+
+    async def run(self, fn, *args, driver=None):
+        """Run fn(*args) on the model thread pool once admitted; raises Rejected otherwise"""
+        loop = self._bind()
+        previous = self._waiters.pop(driver, None) if driver is not None else None
+        if previous is not None:
+            # The older sample gives up its queue place now, not once a slot frees up
+            previous.cancel()
+            self._waiting -= 1
+        if self._waiting >= self.queue_depth and self._slots.locked():
+            metrics.inc('admission_rejected_overload')
+            raise Rejected('Server busy, retry shortly', 503, self.retry_after)
+
+        queued = time.monotonic()
+        if not await self._acquire(driver):
+            metrics.inc('admission_rejected_superseded')
+            raise Rejected('Superseded by a newer sample from the same driver', 429, self.retry_after)
+
+        try:
+            if time.monotonic() - queued > self.max_age:
+                metrics.inc('admission_rejected_stale')
+                raise Rejected('Sample went stale while queued', 503, self.retry_after)
+            metrics.lap('queue')
+
+            # Carry the request's context (metrics timer) into the worker thread
+            call = functools.partial(contextvars.copy_context().run, fn, *args)
+            return await loop.run_in_executor(self._executor, call)
+        finally:
+            self._slots.release()
+
+    async def _acquire(self, driver):
+        """
+        Wait for a slot; False (holding none) if a newer sample from the same
+        driver replaced this one while it waited.
+        """
+        if not self._slots.locked():
+            await self._slots.acquire()  # free slot: returns without suspending
+            return True
+
+        waiter = asyncio.ensure_future(self._slots.acquire())
+        self._waiting += 1
+        if driver is not None:
+            self._waiters[driver] = waiter
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._slots.release()  # granted just as this request was cancelled
+            superseded = not self._leave_queue(driver, waiter)
+            if superseded and not asyncio.current_task().cancelling():
+                return False
+            raise
+        if not self._leave_queue(driver, waiter):
+            self._slots.release()  # replaced in the same loop iteration the slot was granted
+            return False
+        return True
+
+    def _leave_queue(self, driver, waiter):
+        """Give up a waiter's queue place; False if run() already did because a newer sample replaced it"""
+        if driver is not None:
+            if self._waiters.get(driver) is not waiter:
+                return False
+            del self._waiters[driver]
+        self._waiting -= 1
+        return True
+
+
+admission = AdmissionController()
+
+
+def rejected_response(e):
+    response = JsonResponse({'error': str(e)}, status=e.status)
+    response['Retry-After'] = str(e.retry_after)
+    return response
@@ -0,0 +1,27 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class InferenceConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'inference'
+
+    def ready(self):
+        batching = getattr(settings, 'INFERENCE_BATCHING', None)
+        if batching:
+            from .serving import configure_batching
+            configure_batching(
+                max_batch=batching.get('MAX_BATCH', 16),
+                max_delay=batching.get('MAX_DELAY', 0.002),
+                workers=batching.get('WORKERS', 0),
+            )
+
+        admission_settings = getattr(settings, 'INFERENCE_ADMISSION', None)
+        if admission_settings:
+            from .admission import admission
+            admission.configure(
+                concurrency=admission_settings.get('CONCURRENCY', 4),
+                queue_depth=admission_settings.get('QUEUE_DEPTH', 64),
+                max_age=admission_settings.get('MAX_AGE', 2.0),
+                retry_after=admission_settings.get('RETRY_AFTER', 1),
+            )
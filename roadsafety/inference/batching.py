@@ -0,0 +1,133 @@
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from . import metrics
+
+
+class MicroBatcher:
+    """
+    Groups concurrent single-row requests into one vectorised model call.
+
+    Request threads submit() a feature row and block until its result is
+    ready. A collector thread takes the oldest waiting row, keeps taking rows
+    until it has `max_batch` of them or `max_delay` seconds have passed since
+    that row was submitted, and scores the stacked rows with one
+    `score(rows) -> (results, shared)` call; every request gets back
+    (its result, shared), e.g. (prediction dict, model version).
+
+    With workers > 0 batches are scored by that many worker processes (which
+    import `score`'s module themselves, so it must be a module-level function)
+    with up to `workers` batches in flight; otherwise the collector thread
+    scores them itself. A worker that dies breaks the whole pool: the batches
+    in flight on it fail and the next batch starts a fresh one.
+    """
+
+    def __init__(self, score, max_batch=16, max_delay=0.002, workers=0, name='batch'):
+        self.score = score
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.workers = workers
+        self.name = name
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._collector = None
+        self._pool = None
+        self._in_flight = threading.BoundedSemaphore(max(workers, 1))
+
+    def submit(self, row, timeout=None):
+        """Score one row as part of the next batch; returns (result, shared)"""
+        if self._collector is None:
+            self._start()
+        future = Future()
+        self._queue.put((time.monotonic(), row, future))
+        return future.result(timeout)
+
+    def _start(self):
+        with self._lock:
+            if self._collector is not None:
+                return
+            if self.workers:
+                self._pool = self._new_pool()
+            self._collector = threading.Thread(target=self._run, name=f'{self.name}-collector', daemon=True)
+            self._collector.start()
+
+    def _new_pool(self):
+        # forkserver: the children import the models themselves instead of
+        # inheriting this process's threads mid-flight
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('forkserver'))
+
+    def _replace_pool(self, broken):
+        """The pool to use after `broken` failed; the first caller to see it broken starts the new one"""
+        with self._lock:
+            if self._pool is broken:
+                self._pool = self._new_pool()
+                metrics.inc(f'{self.name}_pool_restarts')
+            pool = self._pool
+        broken.shutdown(wait=False)
+        return pool
+
+    def _run(self):
+        while True:
+            submitted, row, future = self._queue.get()
+            deadline = submitted + self.max_delay
+            rows, futures = [row], [future]
+            while len(rows) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    # Rows that queued up while the previous batch was scored are taken without waiting
+                    _, row, future = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                rows.append(row)
+                futures.append(future)
+
+            metrics.inc(f'{self.name}_batches')
+            metrics.inc(f'{self.name}_batched_rows', len(rows))
+            self._dispatch(np.array(rows, dtype=np.float64), futures)
+
+    def _dispatch(self, rows, futures):
+        if self._pool is None:
+            try:
+                outcome = self.score(rows)
+            except Exception as e:
+                outcome = e
+            self._fan_out(futures, outcome)
+            return
+
+        self._in_flight.acquire()
+        pool = self._pool
+        try:
+            try:
+                scored = pool.submit(self.score, rows)
+            except BrokenProcessPool:
+                # Broken by an earlier batch; this one never reached it
+                pool = self._replace_pool(pool)
+                scored = pool.submit(self.score, rows)
+        except Exception as e:
+            self._in_flight.release()
+            self._fan_out(futures, e)
+            return
+        scored.add_done_callback(lambda done: self._finish(done, futures, pool))
+
+    def _finish(self, done, futures, pool):
+        self._in_flight.release()
+        error = done.exception()
+        if isinstance(error, BrokenProcessPool):
+            self._replace_pool(pool)
+        self._fan_out(futures, error or done.result())
+
+    @staticmethod
+    def _fan_out(futures, outcome):
+        if isinstance(outcome, BaseException):
+            for future in futures:
+                future.set_exception(outcome)
+            return
+        results, shared = outcome
+        for future, result in zip(futures, results):
+            future.set_result((result, shared))
@@ -0,0 +1,128 @@
+import json
+import os
+import resource
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Opt-in: BENCHMARK=1 python manage.py test --tag benchmark   (BENCHMARK=update rewrites the baseline)
+ENABLED = bool(os.environ.get('BENCHMARK'))
+UPDATE_BASELINE = os.environ.get('BENCHMARK') == 'update'
+
+# A benchmark fails when its p50 latency grows, or its single-client throughput drops,
+# by more than THRESHOLD relative to the stored baseline
+BASELINE_FILE = Path(__file__).resolve().parent / 'benchmark_baseline.json'
+THRESHOLD = float(os.environ.get('BENCHMARK_THRESHOLD', '0.5'))
+
+REQUESTS = int(os.environ.get('BENCHMARK_REQUESTS', '500'))
+CONCURRENCY = (1, 4, 16)
+WARMUP = 20
+
+_baseline_lock = threading.Lock()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (ru_maxrss is KB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def latency(call, requests=REQUESTS, warmup=WARMUP):
+    """p50/p95/p99 in ms of `requests` sequential calls"""
+    for _ in range(warmup):
+        call()
+    samples = np.empty(requests)
+    for i in range(requests):
+        started = time.perf_counter()
+        call()
+        samples[i] = time.perf_counter() - started
+    p50, p95, p99 = np.percentile(samples * 1000, [50, 95, 99])
+    return {'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99)}
+
+
+def throughput(make_call, concurrency, requests=REQUESTS):
+    """
+    Calls per second with `concurrency` threads sharing `requests` calls.
+
+    make_call() is invoked once per thread, so each thread gets its own
+    client (Django's test Client is not thread-safe).
+    """
+    calls = [make_call() for _ in range(concurrency)]
+    per_thread = max(1, requests // concurrency)
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker(call):
+        barrier.wait()
+        for _ in range(per_thread):
+            call()
+
+    threads = [threading.Thread(target=worker, args=(call,)) for call in calls]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return per_thread * concurrency / (time.perf_counter() - started)
+
+
+def run(make_call, requests=REQUESTS, concurrency=CONCURRENCY):
+    """Latency percentiles, throughput per concurrency level and peak RSS of one benchmark"""
+    result = latency(make_call(), requests)
+    result['rps'] = {str(level): throughput(make_call, level, requests) for level in concurrency}
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def load_baseline():
+    try:
+        return json.loads(BASELINE_FILE.read_text())
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(name, result):
+    with _baseline_lock:
+        baseline = load_baseline()
+        baseline[name] = result
+        BASELINE_FILE.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+
+
+def regressions(name, result, threshold=THRESHOLD):
+    """Human-readable list of the ways `result` is worse than the stored baseline for `name`"""
+    base = load_baseline().get(name)
+    if base is None:
+        return []
+    problems = []
+    if result['p50_ms'] > base['p50_ms'] * (1 + threshold):
+        problems.append(f"p50 {result['p50_ms']:.3f} ms vs baseline {base['p50_ms']:.3f} ms")
+    if result['rps']['1'] < base['rps']['1'] / (1 + threshold):
+        problems.append(f"{result['rps']['1']:.0f} req/s vs baseline {base['rps']['1']:.0f} req/s")
+    return problems
+
+
+def format_result(name, result):
+    rps = '  '.join(f"c={level}: {value:,.0f}/s" for level, value in result['rps'].items())
+    return (
+        f"{name:<28} p50 {result['p50_ms']:7.3f} ms  p95 {result['p95_ms']:7.3f} ms  "
+        f"p99 {result['p99_ms']:7.3f} ms  {rps}  peak RSS {result['peak_rss_mb']:.0f} MB"
+    )
+
+
+class BenchmarkMixin:
+    """
+    assertNoRegression(name, make_call): run a benchmark, print its report line
+    and fail if it regressed past THRESHOLD (or store it with BENCHMARK=update).
+    """
+
+    def assertNoRegression(self, name, make_call, requests=REQUESTS):
+        result = run(make_call, requests)
+        print('\n' + format_result(name, result))
+        if UPDATE_BASELINE:
+            save_baseline(name, result)
+            return result
+        problems = regressions(name, result)
+        if problems:
+            self.fail(f"{name} regressed by more than {THRESHOLD:.0%}: " + '; '.join(problems))
+        return result
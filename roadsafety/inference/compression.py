@@ -0,0 +1,197 @@
+import copy
+import time
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.model_selection import train_test_split
+
+from .forest import ARRAY_FIELDS, FlatForest
+from .training import measure_latency
+
+# Grid searched by compress(): one forest is fitted per depth (those below the
+# original's, plus the original's own) and pruned down to each tree count
+TREE_COUNTS = (100, 50, 25, 10, 5)
+DEPTHS = (20, 15, 12, 10, 8, 6)
+# Validation accuracy (as a fraction) a compressed model may give up against the original
+MAX_ACCURACY_DROP = 0.005
+# Part of the training split held back and cut in three: one part orders the trees, one
+# compares the variants and one confirms the winner, so no rows both pick and judge
+VALIDATION_SIZE = 0.2
+MAX_VALIDATION_ROWS = 20000
+
+
+def order_trees(forest, X, y, count):
+    """
+    The `count` trees of a fitted forest that best reproduce its labels,
+    picked greedily: each step adds the tree whose vote most improves the
+    accuracy of the ensemble built so far (ties go to the one adding more
+    probability to the true classes). Trees that barely change the vote
+    come last, so any prefix of the order is a usable pruned forest.
+    """
+    target = np.searchsorted(forest.classes_, y)
+    rows = np.arange(len(target))
+    # (trees, rows, classes) per-tree class probabilities, the same votes FlatForest averages
+    votes = np.stack([tree.predict_proba(X) for tree in forest.estimators_]).astype(np.float32)
+
+    total = np.zeros(votes.shape[1:], dtype=np.float32)
+    remaining = np.arange(len(votes))
+    order = []
+    for _ in range(min(count, len(votes))):
+        candidates = total + votes[remaining]
+        correct = (candidates.argmax(axis=2) == target).sum(axis=1)
+        mass = candidates[:, rows, target].sum(axis=1)
+        best = np.lexsort((mass, correct))[-1]
+        order.append(int(remaining[best]))
+        total += votes[remaining[best]]
+        remaining = np.delete(remaining, best)
+    return order
+
+
+def prune(forest, trees):
+    """A shallow copy of a fitted forest keeping only the given trees"""
+    pruned = copy.copy(forest)
+    pruned.estimators_ = [forest.estimators_[i] for i in trees]
+    pruned.n_estimators = len(pruned.estimators_)
+    return pruned
+
+
+def artifact_bytes(forest):
+    """Size of a FlatForest's exported arrays, i.e. what every worker maps"""
+    return int(sum(getattr(forest, field).nbytes for field in ARRAY_FIELDS))
+
+
+def pareto_front(points):
+    """Names of the points no other point matches or beats on accuracy, latency and size at once"""
+    def costs(point):
+        return (-point['validation_accuracy'], point['latency']['single_p50_ms'], point['artifact_bytes'])
+
+    front = []
+    for point in points:
+        mine = costs(point)
+        if not any(
+            all(a <= b for a, b in zip(costs(other), mine)) and costs(other) != mine
+            for other in points
+        ):
+            front.append(point['name'])
+    return front
+
+
+def _describe(name, model, X_val, y_val):
+    forest = FlatForest.from_sklearn(model)
+    return {
+        'name': name,
+        'trees': len(forest.roots),
+        'max_depth': forest.max_depth,
+        'nodes': len(forest.feature),
+        'artifact_bytes': artifact_bytes(forest),
+        'validation_accuracy': float((forest.predict(X_val) == y_val).mean()),
+        'latency': measure_latency(forest, X_val),
+    }
+
+
+def _accuracy(model, X, y):
+    return float((FlatForest.from_sklearn(model).predict(X) == y).mean())
+
+
+def compress(model, data, tree_counts=TREE_COUNTS, depths=DEPTHS, max_accuracy_drop=MAX_ACCURACY_DROP,
+             distill=False, n_jobs=-1, seed=42):
+    """
+    Search smaller versions of a trained forest and keep the smallest one
+    that is within `max_accuracy_drop` of it. Returns (model, report).
+
+    A validation part is split off the training data and cut into an
+    ordering, a selection and a confirmation set; the original configuration
+    is refitted on the rest as the reference. For each depth in `depths`
+    below the original's (and for the original depth) a forest with the
+    original settings is fitted once, its trees ordered by order_trees() on
+    the ordering set, and every prefix of `tree_counts` trees becomes a
+    variant. With distill=True each depth also gets a student forest fitted
+    on the reference's predictions instead of the labels. Every variant is
+    scored on selection-set accuracy, FlatForest latency and export size,
+    and the Pareto front of these is marked in the report.
+
+    Variants within `max_accuracy_drop` of the reference on the selection
+    set are eligible. Taking them smallest first (export size, then
+    latency), each one's configuration (trees, depth, labels) is fitted as a
+    fresh forest on the same rows and must also be within budget on the
+    confirmation set. The first that is gets refitted on the whole training
+    split and returned; the test split is left for the caller's final
+    report. If none is confirmed, or the reference wins, the `model` passed
+    in (fitted on the whole training split) is returned unchanged.
+    """
+    started = time.perf_counter()
+    X_fit, X_val, y_fit, y_val = train_test_split(
+        data['X_train'], data['y_train'], test_size=VALIDATION_SIZE, random_state=seed
+    )
+    X_val, y_val = X_val[:MAX_VALIDATION_ROWS], y_val[:MAX_VALIDATION_ROWS]
+    X_order, X_val, y_order, y_val = train_test_split(X_val, y_val, test_size=2 / 3, random_state=seed)
+    X_val, X_confirm, y_val, y_confirm = train_test_split(X_val, y_val, test_size=0.5, random_state=seed)
+
+    n_trees = model.n_estimators
+    original_depth = model.max_depth
+    counts = sorted({count for count in tree_counts if count < n_trees}, reverse=True)
+    family_depths = [original_depth] + sorted(
+        {depth for depth in depths if original_depth is None or depth < original_depth}, reverse=True
+    )
+
+    reference = clone(model).set_params(n_jobs=n_jobs).fit(X_fit, y_fit)
+    labels = {'refit': y_fit}
+    if distill:
+        labels['distilled'] = reference.predict(X_fit)
+
+    points, variants, configs = [], {}, {}
+    for source, y in labels.items():
+        for depth in family_depths:
+            if source == 'refit' and depth == original_depth:
+                forest = reference
+            else:
+                forest = clone(model).set_params(max_depth=depth, n_jobs=n_jobs).fit(X_fit, y)
+            order = order_trees(forest, X_order, y_order, counts[0]) if counts else []
+            for count in [n_trees] + counts:
+                name = f"{source}-{count}-d{depth or 'max'}"
+                variants[name] = forest if count == n_trees else prune(forest, order[:count])
+                configs[name] = source, {'n_estimators': count, 'max_depth': depth}
+                points.append(_describe(name, variants[name], X_val, y_val))
+
+    front = pareto_front(points)
+    for point in points:
+        point['pareto'] = point['name'] in front
+
+    baseline = points[0]
+    floor = baseline['validation_accuracy'] - max_accuracy_drop
+    eligible = sorted(
+        (point for point in points if point['validation_accuracy'] >= floor),
+        key=lambda point: (point['artifact_bytes'], point['latency']['single_p50_ms']),
+    )
+    # The selection set picked the winner, so its score is optimistic: confirm the configuration
+    # as it will be shipped (a fresh forest, not a pruned one) on rows nothing has seen yet
+    confirm_floor = _accuracy(reference, X_confirm, y_confirm) - max_accuracy_drop
+    rejected = []
+    for chosen in eligible:
+        if chosen is baseline:
+            break
+        source, params = configs[chosen['name']]
+        candidate = clone(model).set_params(n_jobs=n_jobs, **params).fit(X_fit, labels[source])
+        if _accuracy(candidate, X_confirm, y_confirm) >= confirm_floor:
+            break
+        rejected.append(chosen['name'])
+    else:
+        chosen = baseline
+
+    if chosen is not baseline:
+        X_train = data['X_train']
+        y = data['y_train'] if source == 'refit' else model.predict(X_train)
+        model = clone(model).set_params(n_jobs=n_jobs, **params).fit(X_train, y)
+
+    report = {
+        'ordering_rows': len(y_order),
+        'validation_rows': len(y_val),
+        'confirmation_rows': len(y_confirm),
+        'max_accuracy_drop': max_accuracy_drop,
+        'reference': baseline['name'],
+        'chosen': chosen['name'],
+        'rejected_on_confirmation': rejected,
+        'points': points,
+        'seconds': time.perf_counter() - started,
+    }
+    return model, report
@@ -0,0 +1,22 @@
+# Feature layouts shared by training, serving and the wire format. Kept free of
+# imports so training and tools can use them without loading any model.
+
+# Feature order the behaviour scaler and model were fitted on
+SENSOR_FEATURES = ['accel_2', 'accel_3', 'accel_4', 'gyro_2', 'gyro_3', 'gyro_4', 'proximity']
+
+# Accident severity training columns (see main.ipynb) and the form fields the monitor page posts for them
+ACCIDENT_FEATURES = [
+    "Speed_limit", "Number_of_Vehicles", "Number_of_Casualties",
+    "Day_of_Week", "Light_Conditions", "Weather_Conditions",
+    "Road_Surface_Conditions", "Urban_or_Rural_Area"
+]
+FORM_FIELDS = {
+    "Speed_limit": ('speed', float),
+    "Number_of_Vehicles": ('vehicles', int),
+    "Number_of_Casualties": ('casualties', int),
+    "Day_of_Week": ('day', int),
+    "Light_Conditions": ('light', int),
+    "Weather_Conditions": ('weather', int),
+    "Road_Surface_Conditions": ('surface', int),
+    "Urban_or_Rural_Area": ('urban', int),
+}
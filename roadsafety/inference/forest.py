@@ -0,0 +1,232 @@
+import bisect
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+# Arrays written as one .npy file each so they can be memory-mapped read-only
+ARRAY_FIELDS = ('feature', 'threshold', 'left', 'right', 'value', 'roots', 'classes_')
+META_FILE = 'forest.json'
+
+
+class FlatForest:
+    """
+    A fitted sklearn forest classifier flattened into contiguous NumPy arrays.
+
+    All trees share one node table (feature, threshold, left, right, value).
+    Leaves point at themselves, so every row can be walked through every tree
+    at once for a fixed number of steps without any per-tree Python loop.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, classes, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.classes_ = classes
+        self.n_features_in_ = int(n_features)
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """Flatten a fitted RandomForestClassifier / ExtraTreesClassifier"""
+        if getattr(forest, 'n_outputs_', 1) != 1:
+            raise ValueError('Only single-output forests can be flattened')
+
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        sizes = np.array([tree.node_count for tree in trees], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        n_nodes = int(sizes.sum())
+
+        feature = np.zeros(n_nodes, dtype=np.int32)
+        threshold = np.zeros(n_nodes, dtype=np.float64)
+        left = np.empty(n_nodes, dtype=np.int32)
+        right = np.empty(n_nodes, dtype=np.int32)
+        value = np.empty((n_nodes, len(forest.classes_)), dtype=np.float64)
+
+        for tree, offset, size in zip(trees, offsets, sizes):
+            nodes = slice(offset, offset + size)
+            own = np.arange(offset, offset + size, dtype=np.int32)
+            is_leaf = tree.children_left == -1
+
+            feature[nodes] = np.where(is_leaf, 0, tree.feature)
+            threshold[nodes] = np.where(is_leaf, 0.0, tree.threshold)
+            left[nodes] = np.where(is_leaf, own, tree.children_left + offset)
+            right[nodes] = np.where(is_leaf, own, tree.children_right + offset)
+
+            # Same per-node normalisation sklearn applies in DecisionTreeClassifier.predict_proba
+            counts = tree.value[:, 0, :]
+            normalizer = counts.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            value[nodes] = counts / normalizer
+
+        return cls(
+            feature=feature,
+            threshold=threshold,
+            left=left,
+            right=right,
+            value=value,
+            roots=offsets.astype(np.int32),
+            max_depth=max(tree.max_depth for tree in trees),
+            classes=np.asarray(forest.classes_),
+            n_features=forest.n_features_in_,
+        )
+
+    def save(self, directory):
+        """
+        Write the forest as a directory of .npy files plus a small JSON header.
+
+        The directory is assembled next to its final location and renamed
+        into place, so readers never see a half-written artifact.
+        """
+        directory = Path(directory)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=f'.{directory.name}-', dir=directory.parent))
+
+        for field in ARRAY_FIELDS:
+            np.save(staging / f'{field}.npy', np.ascontiguousarray(getattr(self, field)), allow_pickle=False)
+        with open(staging / META_FILE, 'w') as f:
+            json.dump({'max_depth': self.max_depth, 'n_features': self.n_features_in_}, f)
+
+        if directory.exists():
+            retired = Path(tempfile.mkdtemp(prefix=f'.{directory.name}-old-', dir=directory.parent))
+            os.replace(directory, retired / directory.name)
+            os.replace(staging, directory)
+            # Workers still mapping the old files keep their pages until they reload
+            shutil.rmtree(retired)
+        else:
+            os.replace(staging, directory)
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """
+        Open a forest written by save().
+
+        With the default mmap_mode='r' the node arrays are read-only memory
+        maps, so every worker process on the host shares one page-cache copy.
+        """
+        directory = Path(directory)
+        with open(directory / META_FILE) as f:
+            meta = json.load(f)
+        arrays = {
+            field: np.load(directory / f'{field}.npy', mmap_mode=mmap_mode, allow_pickle=False)
+            for field in ARRAY_FIELDS
+        }
+        return cls(
+            feature=arrays['feature'],
+            threshold=arrays['threshold'],
+            left=arrays['left'],
+            right=arrays['right'],
+            value=arrays['value'],
+            roots=np.asarray(arrays['roots']),
+            max_depth=meta['max_depth'],
+            classes=np.asarray(arrays['classes_']),
+            n_features=meta['n_features'],
+        )
+
+    def predict_proba(self, X):
+        # sklearn evaluates trees on float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f'Expected input of shape (n_samples, {self.n_features_in_}), got {X.shape}')
+
+        rows = np.arange(X.shape[0])
+        nodes = np.repeat(self.roots[:, np.newaxis], X.shape[0], axis=1)
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        # (n_trees, n_samples, n_classes) summed tree by tree, like sklearn's accumulation
+        return self.value[nodes].sum(axis=0) / len(self.roots)
+
+    def predict(self, X):
+        return self.classes_.take(self.predict_proba(X).argmax(axis=1), axis=0)
+
+    def split_points(self):
+        """Sorted distinct thresholds each feature is split on, anywhere in the forest"""
+        internal = self.left != np.arange(len(self.left))
+        features = self.feature[internal]
+        thresholds = self.threshold[internal]
+        return [np.unique(thresholds[features == i]).tolist() for i in range(self.n_features_in_)]
+
+
+class PredictionCache:
+    """
+    Bounded LRU of single-row forest predictions.
+
+    The trees only ever ask which side of a split threshold a feature value
+    falls on, so rows are keyed by the interval between consecutive split
+    points each feature lands in. Rows with the same key take the same path
+    through every tree: a hit returns exactly what the forest would, however
+    finely a continuous input such as GPS speed varies.
+    """
+
+    def __init__(self, forest, max_size=4096):
+        self.forest = forest
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._splits = forest.split_points()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, row):
+        # Compared as float32 like predict_proba; NaN goes right at every split
+        values = np.asarray(row, dtype=np.float32).tolist()
+        return tuple(
+            bisect.bisect_left(splits, value) if value == value else len(splits)
+            for splits, value in zip(self._splits, values)
+        )
+
+    def predict(self, row):
+        """Prediction for one feature row; returns (prediction, whether it came from the cache)"""
+        key = self.key(row)
+        with self._lock:
+            prediction = self._entries.get(key)
+            if prediction is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return prediction, True
+            self.misses += 1
+
+        prediction = self.forest.predict(np.asarray(row, dtype=np.float64)[np.newaxis, :])[0]
+        with self._lock:
+            self._entries[key] = prediction
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return prediction, False
+
+
+def artifact_dir(path):
+    """Where the memory-mapped export of a pickled model lives (model/x.pkl -> model/x/)"""
+    path = Path(path)
+    return path.with_suffix('') if path.suffix else path
+
+
+def load_forest(path):
+    """
+    Load a forest for serving.
+
+    `path` may be an exported artifact directory or a joblib pickle. For a
+    pickle, a memory-mapped export next to it is preferred when it is at
+    least as new as the pickle; otherwise the pickle is flattened in memory.
+    """
+    path = Path(path)
+    if path.is_dir():
+        return FlatForest.load(path)
+
+    meta = artifact_dir(path) / META_FILE
+    if meta.exists() and (not path.exists() or meta.stat().st_mtime >= path.stat().st_mtime):
+        return FlatForest.load(meta.parent)
+    return FlatForest.from_sklearn(joblib.load(path))
@@ -0,0 +1,25 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inference.registry import REGISTRY_DIR, activate, current_version
+
+
+class Command(BaseCommand):
+    help = 'Point a registered model at an already published version (running workers pick it up)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='Registered model name')
+        parser.add_argument('version', help='Published version to serve')
+        parser.add_argument('--registry', default=str(REGISTRY_DIR), help='Registry root directory')
+
+    def handle(self, *args, **options):
+        root = Path(options['registry'])
+        previous = current_version(options['name'], root)
+        try:
+            activate(options['name'], options['version'], root=root)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['name']}: {previous or 'none'} -> {options['version']}"
+        ))
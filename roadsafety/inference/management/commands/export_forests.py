@@ -0,0 +1,36 @@
+from pathlib import Path
+
+import joblib
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from inference.forest import FlatForest, artifact_dir
+
+DEFAULT_MODELS = ['driver_behaviour.pkl', 'accident_severity_model.pkl']
+
+
+class Command(BaseCommand):
+    help = 'Export pickled forests in model/ to memory-mappable .npy artifact directories'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models', nargs='*',
+            help='Pickled forests to export (default: driver_behaviour.pkl and accident_severity_model.pkl in model/)'
+        )
+
+    def handle(self, *args, **options):
+        model_dir = Path(settings.BASE_DIR) / 'model'
+        paths = [Path(p) for p in options['models']] or [model_dir / name for name in DEFAULT_MODELS]
+
+        for path in paths:
+            if not path.exists():
+                raise CommandError(f'{path} does not exist')
+
+            forest = FlatForest.from_sklearn(joblib.load(path))
+            target = artifact_dir(path)
+            forest.save(target)
+
+            size = sum(f.stat().st_size for f in target.iterdir()) / (1024 * 1024)
+            self.stdout.write(self.style.SUCCESS(
+                f'Exported {path.name} -> {target} ({len(forest.roots)} trees, {len(forest.feature)} nodes, {size:.1f} MB)'
+            ))
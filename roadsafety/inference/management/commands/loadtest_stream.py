@@ -0,0 +1,138 @@
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _sample():
+    return {
+        'accel_2': random.gauss(-0.3, 1.3), 'accel_3': random.gauss(-2.2, 2.3), 'accel_4': random.gauss(9.6, 0.6),
+        'gyro_2': random.gauss(0, 0.07), 'gyro_3': random.gauss(0, 0.14), 'gyro_4': random.gauss(0, 0.09),
+        'proximity': 0,
+    }
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+
+    def summary(self, elapsed):
+        lat = np.array(self.latencies) * 1000 if self.latencies else np.array([np.nan])
+        return {
+            'ok': len(self.latencies),
+            'errors': self.errors,
+            'rate': len(self.latencies) / elapsed,
+            'p50': float(np.percentile(lat, 50)),
+            'p99': float(np.percentile(lat, 99)),
+        }
+
+
+async def _poll_driver(host, port, path, interval, deadline, stats):
+    """One driver polling the HTTP endpoint over a keep-alive connection, like the old page did"""
+    reader = writer = None
+    await asyncio.sleep(random.uniform(0, interval))
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            body = json.dumps(_sample()).encode()
+            writer.write(
+                f'POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                f'Content-Length: {len(body)}\r\n\r\n'.encode() + body
+            )
+            status = await asyncio.wait_for(reader.readline(), timeout=interval * 5)
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            await reader.readexactly(length)
+            if b' 200 ' not in status:
+                raise ValueError(status)
+            stats.latencies.append(time.monotonic() - started)
+        except Exception:
+            stats.errors += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+        await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+    if writer is not None:
+        writer.close()
+
+
+async def _stream_driver(url, interval, deadline, stats, websockets):
+    """One driver holding a WebSocket open and sending a sample every interval"""
+    await asyncio.sleep(random.uniform(0, interval))
+    try:
+        async with websockets.connect(url, open_timeout=interval * 5) as socket:
+            while time.monotonic() < deadline:
+                started = time.monotonic()
+                try:
+                    await socket.send(json.dumps({'type': 'behavior', **_sample()}))
+                    reply = json.loads(await asyncio.wait_for(socket.recv(), timeout=interval * 5))
+                    if 'error' in reply:
+                        raise ValueError(reply['error'])
+                    stats.latencies.append(time.monotonic() - started)
+                except (ValueError, asyncio.TimeoutError):
+                    stats.errors += 1
+                await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+    except Exception:
+        stats.errors += 1
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test a running server with N simulated drivers, comparing HTTP polling of '
+        '/api/predict-behavior/ with the /ws/sensors/ WebSocket stream'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the running ASGI server')
+        parser.add_argument('--drivers', default='50,200,500,1000', help='Comma-separated driver counts to try')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between samples per driver')
+        parser.add_argument('--duration', type=float, default=20.0, help='Seconds per run')
+        parser.add_argument('--mode', choices=['both', 'poll', 'stream'], default='both')
+
+    def handle(self, *args, **options):
+        base = urlsplit(options['url'])
+        modes = ['poll', 'stream'] if options['mode'] == 'both' else [options['mode']]
+        if 'stream' in modes:
+            # Only the stream mode needs the client library; checked before any run starts
+            try:
+                import websockets
+            except ImportError:
+                raise CommandError('The stream mode needs the "websockets" package (pip install websockets)')
+        interval = options['interval']
+
+        self.stdout.write(f"{'mode':<8}{'drivers':>8}{'ok/s':>10}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}")
+        for drivers in [int(n) for n in options['drivers'].split(',')]:
+            for mode in modes:
+                stats = Stats()
+                deadline = time.monotonic() + options['duration']
+                if mode == 'poll':
+                    tasks = [
+                        _poll_driver(base.hostname, base.port or 80, '/api/predict-behavior/', interval, deadline, stats)
+                        for _ in range(drivers)
+                    ]
+                else:
+                    ws_url = f"{'wss' if base.scheme == 'https' else 'ws'}://{base.netloc}/ws/sensors/"
+                    tasks = [_stream_driver(ws_url, interval, deadline, stats, websockets) for _ in range(drivers)]
+
+                started = time.monotonic()
+                asyncio.run(self._run(tasks))
+                result = stats.summary(time.monotonic() - started)
+                self.stdout.write(
+                    f"{mode:<8}{drivers:>8}{result['rate']:>10.1f}{result['errors']:>8}"
+                    f"{result['p50']:>10.1f}{result['p99']:>10.1f}"
+                )
+
+    async def _run(self, tasks):
+        await asyncio.gather(*tasks)
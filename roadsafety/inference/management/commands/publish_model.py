@@ -0,0 +1,46 @@
+from pathlib import Path
+
+import joblib
+from django.core.management.base import BaseCommand, CommandError
+
+from inference.registry import REGISTRY_DIR, publish
+
+
+class Command(BaseCommand):
+    help = 'Publish a trained forest (plus scaler/encoders) as a new version in model/registry/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='Registered model name, e.g. driver_behaviour or accident_severity')
+        parser.add_argument('version', help='Version tag, e.g. 2025-11-02 or v3')
+        parser.add_argument('--model', required=True, help='joblib pickle of the fitted forest')
+        parser.add_argument('--scaler', help='joblib/pickle file of the fitted StandardScaler')
+        parser.add_argument('--encoders', help='joblib pickle of the label encoders dict')
+        parser.add_argument('--features', help='Comma-separated feature order (default: taken from the scaler or model)')
+        parser.add_argument('--no-activate', action='store_true', help='Store the version without making it current')
+        parser.add_argument('--registry', default=str(REGISTRY_DIR), help='Registry root directory')
+
+    def handle(self, *args, **options):
+        forest = joblib.load(options['model'])
+        scaler = joblib.load(options['scaler']) if options['scaler'] else None
+        encoders = joblib.load(options['encoders']) if options['encoders'] else None
+
+        if options['features']:
+            features = [name.strip() for name in options['features'].split(',')]
+        elif hasattr(scaler, 'feature_names_in_'):
+            features = list(scaler.feature_names_in_)
+        elif hasattr(forest, 'feature_names_in_'):
+            features = list(forest.feature_names_in_)
+        else:
+            raise CommandError('Could not infer the feature order; pass --features')
+
+        try:
+            target = publish(
+                options['name'], options['version'], forest, features,
+                scaler=scaler, label_encoders=encoders,
+                root=Path(options['registry']), make_current=not options['no_activate'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        state = 'stored' if options['no_activate'] else 'published and activated'
+        self.stdout.write(self.style.SUCCESS(f"{options['name']} {options['version']} {state} at {target}"))
@@ -0,0 +1,268 @@
+import asyncio
+import json
+import time
+from collections import Counter
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from inference import wire
+from inference.features import SENSOR_FEATURES
+from inference.serving import MAX_BATCH_SIZE
+from inference.training import load_sample_module
+
+# Recorded sensors -> columns of SENSOR_FEATURES (accel_2..4, gyro_2..4, proximity)
+SENSOR_COLUMNS = {'accelerometer': slice(0, 3), 'gyroscope': slice(3, 6), 'proximity': slice(6, 7)}
+# Pause between the end of a recording and its start again, when a driver loops over it
+LOOP_GAP_MS = 1000
+
+
+def load_trip(day_dir, sample, hz=None):
+    """
+    One recorded day as (ms since its first sample, (n, 7) float32 rows in
+    SENSOR_FEATURES order), or None if it has no usable accelerometer file.
+
+    Every accelerometer reading is a sample (about 100 Hz), or with `hz` a
+    regular grid at that rate; gyroscope and proximity are the latest reading
+    at each sample, as in sample.py, and 0 where a day lacks them.
+    """
+    files = sample.check_csv_files(day_dir)
+    stamps = sample.StampCodes()
+    streams = {}
+    for kind in SENSOR_COLUMNS:
+        if kind in files:
+            stream = sample.open_stream(kind, files[kind], stamps)
+            if stream is not None:
+                while stream.read_chunk():
+                    pass
+                streams[kind] = stream
+    accelerometer = streams.get('accelerometer')
+    if accelerometer is None or not len(accelerometer.times):
+        return None
+
+    clock = accelerometer.times
+    if hz:
+        clock = np.arange(clock[0], clock[-1] + 1, 1000 / hz).astype(np.int64)
+    rows = np.zeros((len(clock), len(SENSOR_FEATURES)), dtype=np.float32)
+    for kind, columns in SENSOR_COLUMNS.items():
+        if kind in streams:
+            rows[:, columns] = streams[kind].asof(clock)[0]
+    keep = ~np.isnan(rows[:, SENSOR_COLUMNS['accelerometer']]).any(axis=1)
+    rows = np.nan_to_num(rows[keep])
+    clock = clock[keep]
+    return clock - clock[0], rows
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []  # scheduled send -> response, in s
+        self.service = []    # actual send -> response, in s
+        self.statuses = Counter()
+        self.requests = 0
+        self.samples = 0
+        self.late = 0
+
+    def summary(self, elapsed):
+        ok = self.statuses[200]
+        lat = np.array(self.latencies) * 1000 if self.latencies else np.array([np.nan])
+        service = np.array(self.service) * 1000 if self.service else np.array([np.nan])
+        return {
+            'requests': self.requests,
+            'ok': ok,
+            'errors': self.requests - ok,
+            'error_rate': (self.requests - ok) / self.requests if self.requests else 0.0,
+            'statuses': {str(status): count for status, count in sorted(self.statuses.items(), key=str)},
+            'rate': ok / elapsed,
+            'samples_rate': self.samples / elapsed,
+            'late_rate': self.late / self.requests if self.requests else 0.0,
+            'p50': float(np.percentile(lat, 50)),
+            'p90': float(np.percentile(lat, 90)),
+            'p99': float(np.percentile(lat, 99)),
+            'max': float(np.max(lat)),
+            'service_p50': float(np.percentile(service, 50)),
+            'service_p99': float(np.percentile(service, 99)),
+        }
+
+
+def _body(rows, driver_id, fmt):
+    """(query string, content type, body) of one request carrying `rows`"""
+    if fmt == 'wire':
+        return f'?driver_id={driver_id}', wire.CONTENT_TYPE, wire.encode(rows, wire.BEHAVIOUR)
+    samples = [dict(zip(SENSOR_FEATURES, row)) for row in rows.tolist()]
+    payload = {**samples[0], 'driver_id': driver_id} if len(samples) == 1 else {'driver_id': driver_id, 'samples': samples}
+    return '', 'application/json', json.dumps(payload).encode()
+
+
+async def _post(reader, writer, host, path, content_type, body, timeout):
+    """One request on a keep-alive connection; returns the status code"""
+    writer.write(
+        f'POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: {content_type}\r\n'
+        f'Content-Length: {len(body)}\r\n\r\n'.encode() + body
+    )
+    status = await asyncio.wait_for(reader.readline(), timeout=timeout)
+    length = 0
+    while True:
+        line = await asyncio.wait_for(reader.readline(), timeout=timeout)
+        if line in (b'\r\n', b''):
+            break
+        if line.lower().startswith(b'content-length:'):
+            length = int(line.split(b':')[1])
+    await asyncio.wait_for(reader.readexactly(length), timeout=timeout)
+    return int(status.split()[1])
+
+
+async def _replay_driver(driver_id, trip, offset, target, options, deadline, stats):
+    """
+    One driver replaying a recording from `offset` (looping at its end) in
+    requests of options['batch'] samples, each sent when its last sample was
+    recorded, scaled by options['speed']. A request still in flight when the
+    next is due delays it; latency is counted from when it was due, so a
+    saturated server shows up as growing latency rather than fewer requests
+    (a late driver also stops at the deadline).
+    """
+    host, port, path = target
+    times, rows = trip
+    batch, speed, timeout = options['batch'], options['speed'], options['timeout']
+    reader = writer = None
+    started = time.monotonic()
+    position, last, virtual = offset, offset, 0.0  # next sample, last one sent, ms of recording replayed
+
+    while True:
+        indices = (position + np.arange(batch)) % len(times)
+        steps = np.diff(times[np.concatenate([[last], indices])])
+        # Wrapping to the start of the recording counts as a LOOP_GAP_MS pause
+        virtual += float(np.where(steps < 0, LOOP_GAP_MS, steps).sum())
+        last = indices[-1]
+        position = (last + 1) % len(times)
+
+        due = started + virtual / 1000 / speed
+        now = time.monotonic()
+        # A driver that fell behind gives up its backlog at the deadline too
+        if due >= deadline or now >= deadline:
+            break
+        if now < due:
+            await asyncio.sleep(due - now)
+        else:
+            stats.late += 1
+
+        query, content_type, body = _body(rows[indices], driver_id, options['format'])
+        stats.requests += 1
+        sent = time.monotonic()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=timeout)
+            status = await _post(reader, writer, host, path + query, content_type, body, timeout)
+        except asyncio.TimeoutError:
+            status = 'timeout'
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+            status = 'connection'
+        stats.statuses[status] += 1
+        if status == 200:
+            done = time.monotonic()
+            stats.latencies.append(done - max(due, started))
+            stats.service.append(done - sent)
+            stats.samples += batch
+        elif writer is not None and not isinstance(status, int):
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay the recorded sensor CSVs (data_sampling/extracted/*/day*/) against a running server as '
+        'concurrent drivers at wall-clock or N x speed, stepping up the driver count until it saturates'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the running server')
+        parser.add_argument('--data', help='Directory with risky/ and safe/ day folders (default: data_sampling/extracted)')
+        parser.add_argument('--drivers', default='10,50,100,200', help='Comma-separated driver counts, run in turn')
+        parser.add_argument('--speed', type=float, default=1.0, help='Replay speed: 1 is wall-clock, N is N times faster')
+        parser.add_argument('--hz', type=float, help='Resample the recordings to this rate (default: every accelerometer reading)')
+        parser.add_argument('--batch', type=int, default=1, help='Samples per request; more than 1 posts to the batch endpoint')
+        parser.add_argument('--format', choices=['json', 'wire'], default='json', help='JSON bodies or packed inference.wire records')
+        parser.add_argument('--path', help='Endpoint (default: /api/predict-behavior/, or its batch/ variant with --batch)')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds per driver count')
+        parser.add_argument('--timeout', type=float, default=10.0, help='Seconds before a request counts as timed out')
+        parser.add_argument('--seed', type=int, default=42, help='Seeds where in its recording each driver starts')
+        parser.add_argument('--max-error-rate', type=float, default=0.05, help='Stop stepping up once errors exceed this share')
+        parser.add_argument('--output', help='Also write every run\'s full results as JSON to this file')
+
+    def handle(self, *args, **options):
+        if options['speed'] <= 0 or options['batch'] < 1:
+            raise CommandError('--speed must be positive and --batch at least 1')
+        if options['batch'] > MAX_BATCH_SIZE:
+            raise CommandError(f'--batch is larger than the batch endpoint accepts ({MAX_BATCH_SIZE})')
+        sample = load_sample_module()
+        data_dir = Path(options['data']) if options['data'] else sample.BASE_DIR
+
+        trips = []
+        for day_dir, _ in sample.find_days(data_dir):
+            trip = load_trip(day_dir, sample, options['hz'])
+            if trip is None:
+                self.stdout.write(self.style.WARNING(f'{day_dir.parent.name}/{day_dir.name}: skipped, no accelerometer readings'))
+                continue
+            times, _ = trip
+            self.stdout.write(
+                f'{day_dir.parent.name}/{day_dir.name}: {len(times)} samples over {times[-1] / 1000:.0f}s '
+                f'({len(times) / max(times[-1] / 1000, 1e-3):.0f} Hz)'
+            )
+            trips.append(trip)
+        if not trips:
+            raise CommandError(f'No replayable recordings under {data_dir}')
+
+        base = urlsplit(options['url'])
+        path = options['path'] or ('/api/predict-behavior/batch/' if options['batch'] > 1 else '/api/predict-behavior/')
+        target = (base.hostname, base.port or 80, path)
+
+        self.stdout.write(
+            f"{'drivers':>8}{'req/s':>9}{'samples/s':>11}{'errors':>8}{'late':>7}"
+            f"{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}{'svc p99':>9}"
+        )
+        results = []
+        for drivers in [int(n) for n in options['drivers'].split(',')]:
+            # Same starting points for the first drivers of every run, so runs are comparable
+            rng = np.random.default_rng(options['seed'])
+            assignments = []
+            for number in range(drivers):
+                trip = trips[number % len(trips)]
+                assignments.append((f'replay-{number}', trip, int(rng.integers(len(trip[0])))))
+
+            stats = Stats()
+            started = time.monotonic()
+            deadline = started + options['duration']
+            asyncio.run(self._run([
+                _replay_driver(driver_id, trip, offset, target, options, deadline, stats)
+                for driver_id, trip, offset in assignments
+            ]))
+            result = {'drivers': drivers, **stats.summary(time.monotonic() - started)}
+            results.append(result)
+
+            self.stdout.write(
+                f"{drivers:>8}{result['rate']:>9.1f}{result['samples_rate']:>11.1f}{result['error_rate']:>8.1%}"
+                f"{result['late_rate']:>7.0%}{result['p50']:>9.1f}{result['p90']:>9.1f}{result['p99']:>9.1f}"
+                f"{result['max']:>9.1f}{result['service_p99']:>9.1f}"
+            )
+            if result['errors']:
+                self.stdout.write(f"          statuses: {result['statuses']}")
+            if result['error_rate'] > options['max_error_rate']:
+                self.stdout.write(self.style.WARNING(
+                    f"Stopped at {drivers} drivers: {result['error_rate']:.1%} of requests failed"
+                ))
+                break
+
+        if options['output']:
+            report = {
+                'url': options['url'], 'path': path, 'trips': len(trips),
+                **{key: options[key] for key in ('speed', 'hz', 'batch', 'format', 'duration', 'seed')},
+                'runs': results,
+            }
+            Path(options['output']).write_text(json.dumps(report, indent=2))
+            self.stdout.write(f"Report: {options['output']}")
+
+    async def _run(self, tasks):
+        await asyncio.gather(*tasks)
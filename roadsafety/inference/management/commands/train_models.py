@@ -0,0 +1,127 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inference.compression import MAX_ACCURACY_DROP, compress
+from inference.registry import REGISTRY_DIR
+from inference.training import (
+    CACHE_DIR, MODEL_DIR, TASKS, evaluate, prepare, publish_version, train, write_artifacts, write_report,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Train driver_behaviour and/or accident_severity: preprocess once (cached), cross-validate the '
+        'candidate forests in parallel, and write the best model atomically into model/'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', help=f'Models to train: {", ".join(TASKS)} (default: all)')
+        parser.add_argument('--behaviour-data', help='sample.py cache directory or training CSV (default: the cache if built)')
+        parser.add_argument('--accidents', help='AccidentsBig.csv (default: DATASET/AccidentsBig.csv)')
+        parser.add_argument('--candidates', help='Comma-separated candidate names to consider (default: all)')
+        parser.add_argument('--folds', type=int, default=5, help='Cross-validation folds (1 skips cross-validation)')
+        parser.add_argument('--jobs', type=int, default=-1, help='Parallel jobs (-1: all cores)')
+        parser.add_argument('--test-size', type=float, default=0.2)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output-dir', default=str(MODEL_DIR), help='Where the artifacts are written')
+        parser.add_argument(
+            '--publish', metavar='VERSION',
+            help='Also publish each trained model to the registry (the registry/ directory inside --output-dir)',
+        )
+        parser.add_argument('--no-cache', action='store_true', help='Recompute the preprocessing instead of reusing it')
+        parser.add_argument(
+            '--compress', action='store_true',
+            help='Search pruned / shallower versions of the trained forest and keep the smallest within --max-accuracy-drop',
+        )
+        parser.add_argument(
+            '--max-accuracy-drop', type=float, default=MAX_ACCURACY_DROP,
+            help=f'Validation accuracy a compressed model may lose, as a fraction (default: {MAX_ACCURACY_DROP})',
+        )
+        parser.add_argument('--distill', action='store_true', help='With --compress, also try students fitted on the forest\'s predictions')
+
+    def handle(self, *args, **options):
+        explicit = bool(options['models'])
+        unknown = set(options['models']) - set(TASKS)
+        if unknown:
+            raise CommandError(f'Unknown model(s) {", ".join(sorted(unknown))}; choose from {", ".join(TASKS)}')
+        sources = {
+            'driver_behaviour': options['behaviour_data'],
+            'accident_severity': options['accidents'],
+        }
+        wanted = set(options['candidates'].split(',')) if options['candidates'] else None
+        output_dir = Path(options['output_dir'])
+
+        reports = {}
+        for task in options['models'] or list(TASKS):
+            source = Path(sources[task] or TASKS[task][3]())
+            if not source.exists():
+                if explicit:
+                    raise CommandError(f'{task}: training data {source} does not exist')
+                self.stdout.write(self.style.WARNING(f'{task}: skipped, {source} does not exist'))
+                continue
+
+            candidates = TASKS[task][1]
+            if wanted is not None:
+                candidates = {name: estimator for name, estimator in candidates.items() if name in wanted}
+                if not candidates:
+                    raise CommandError(f'{task}: none of {sorted(wanted)} is a candidate ({", ".join(TASKS[task][1])})')
+
+            self.stdout.write(f'{task}: preparing {source}')
+            data = prepare(
+                task, source, test_size=options['test_size'], seed=options['seed'],
+                cache_dir=None if options['no_cache'] else CACHE_DIR,
+            )
+            model, report = train(
+                task, data, candidates=candidates, folds=options['folds'], n_jobs=options['jobs'], seed=options['seed']
+            )
+            if options['compress']:
+                self.stdout.write(f"{task}: compressing {report['chosen']}")
+                model, report['compression'] = compress(
+                    model, data, max_accuracy_drop=options['max_accuracy_drop'], distill=options['distill'],
+                    n_jobs=options['jobs'], seed=options['seed'],
+                )
+                report.update(evaluate(model, data))
+            report['source'] = str(source)
+            report['artifacts'] = [str(path) for path in write_artifacts(task, model, data, output_dir)]
+            if options['publish']:
+                try:
+                    report['registry'] = str(publish_version(
+                        task, options['publish'], model, data, root=output_dir / REGISTRY_DIR.name
+                    ))
+                except ValueError as e:
+                    raise CommandError(str(e))
+            reports[task] = report
+
+            for name, result in report['candidates'].items():
+                self.stdout.write(
+                    f"  {name:<16} cv {result['cv_accuracy']:.4f} ± {result['cv_std']:.4f}"
+                    f"  fit {result['fit_seconds']:.2f}s"
+                )
+            compression = report.get('compression')
+            if compression:
+                self.stdout.write('  Pareto front (validation accuracy / p50 latency / export size):')
+                for point in compression['points']:
+                    if not point['pareto'] and point['name'] not in (compression['reference'], compression['chosen']):
+                        continue
+                    marker = '*' if point['name'] == compression['chosen'] else ' '
+                    self.stdout.write(
+                        f"  {marker} {point['name']:<20} {point['validation_accuracy']:.4f}"
+                        f"  {point['latency']['single_p50_ms']:.3f} ms"
+                        f"  {point['artifact_bytes'] / 1024:.0f} KiB"
+                    )
+                if compression['rejected_on_confirmation']:
+                    self.stdout.write(
+                        f"  Within budget on validation but not on confirmation: "
+                        f"{', '.join(compression['rejected_on_confirmation'])}"
+                    )
+            latency = report['latency']
+            self.stdout.write(self.style.SUCCESS(
+                f"{task}: {report['chosen']}{' -> ' + compression['chosen'] if compression else ''} test accuracy {report['test_accuracy']:.4f}, "
+                f"trained in {report['train_seconds']:.2f}s on {report['rows']} rows, "
+                f"{latency['single_p50_ms']:.3f} ms/request p50, {latency['batch_us_per_row']:.1f} µs/row batched"
+            ))
+
+        if not reports:
+            raise CommandError('Nothing was trained')
+        self.stdout.write(f'Report: {write_report(reports, output_dir)}')
@@ -0,0 +1,164 @@
+import bisect
+import contextvars
+import threading
+import time
+from collections import defaultdict
+
+# Latency histogram upper bounds in seconds (Prometheus convention); +Inf is implicit
+BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+PREFIX = 'roadsafety'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+
+
+# Everything is per process: with several workers each one exposes its own series
+_lock = threading.Lock()
+_request_seconds = defaultdict(Histogram)  # endpoint -> whole request
+_phase_seconds = defaultdict(Histogram)    # (endpoint, phase) -> one phase of it
+_requests = defaultdict(int)               # (endpoint, status, model version)
+_errors = defaultdict(int)                 # (endpoint, status)
+_counters = defaultdict(int)               # name -> value, for inc()
+
+# The timer of the request being handled in this thread / task, if any
+_current = contextvars.ContextVar('inference_request_timer', default=None)
+
+
+class RequestTimer:
+    """Collects (phase, seconds) laps for one request; recorded in one go when the request ends"""
+
+    __slots__ = ('started', 'last', 'laps')
+
+    def __init__(self):
+        self.started = self.last = time.perf_counter()
+        self.laps = []
+
+    def restart(self):
+        """Start timing phases from now (the view is about to run)"""
+        self.last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.laps.append((phase, now - self.last))
+        self.last = now
+
+
+def start_request():
+    """Install a fresh timer for the current request; returns (timer, token for finish_request)"""
+    timer = RequestTimer()
+    return timer, _current.set(timer)
+
+
+def lap(phase):
+    """
+    Close the current phase of the request being handled: the time since the
+    view started or since the previous lap is recorded under `phase`.
+    A no-op outside an instrumented request (management commands, WebSockets).
+    """
+    timer = _current.get()
+    if timer is not None:
+        timer.lap(phase)
+
+
+def finish_request(timer, token, endpoint, status, model_version=''):
+    seconds = time.perf_counter() - timer.started
+    _current.reset(token)
+    with _lock:
+        _request_seconds[endpoint,].observe(seconds)
+        for phase, elapsed in timer.laps:
+            _phase_seconds[endpoint, phase].observe(elapsed)
+        _requests[endpoint, status, model_version] += 1
+        if status >= 400:
+            _errors[endpoint, status] += 1
+
+
+def inc(name, amount=1):
+    """Bump a free-standing counter, exposed as roadsafety_<name>_total"""
+    with _lock:
+        _counters[name] += amount
+
+
+def reset():
+    """Forget everything recorded so far (tests)"""
+    with _lock:
+        for series in (_request_seconds, _phase_seconds, _requests, _errors, _counters):
+            series.clear()
+
+
+def _labels(names, values):
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, values)) + '}'
+
+
+def _histogram(name, help, label_names, series):
+    yield f'# HELP {name} {help}'
+    yield f'# TYPE {name} histogram'
+    for values, (counts, total) in sorted(series.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), counts):
+            cumulative += count
+            yield f'{name}_bucket{_labels(label_names + ("le",), values + (bound,))} {cumulative}'
+        yield f'{name}_sum{_labels(label_names, values)} {total:.9f}'
+        yield f'{name}_count{_labels(label_names, values)} {cumulative}'
+
+
+def _counter(name, help, label_names, series):
+    yield f'# HELP {name} {help}'
+    yield f'# TYPE {name} counter'
+    for values, value in sorted(series.items()):
+        yield f'{name}{_labels(label_names, values)} {value}'
+
+
+def render(models=()):
+    """
+    The metrics in Prometheus text exposition format.
+
+    `models` are ModelSlots whose currently served version is reported as
+    roadsafety_model_info{model=...,version=...} 1.
+    """
+    # Snapshot under the lock, format outside it
+    with _lock:
+        request_seconds = {key: (list(h.counts), h.sum) for key, h in _request_seconds.items()}
+        phase_seconds = {key: (list(h.counts), h.sum) for key, h in _phase_seconds.items()}
+        requests = dict(_requests)
+        errors = dict(_errors)
+        counters = dict(_counters)
+
+    lines = [
+        *_histogram(
+            f'{PREFIX}_request_seconds', 'Time spent handling a request, middleware included',
+            ('endpoint',), request_seconds,
+        ),
+        *_histogram(
+            f'{PREFIX}_phase_seconds', 'Time spent in one phase of a prediction request',
+            ('endpoint', 'phase'), phase_seconds,
+        ),
+        *_counter(
+            f'{PREFIX}_requests_total', 'Requests handled, by status and the model version that answered',
+            ('endpoint', 'status', 'model_version'), requests,
+        ),
+        *_counter(
+            f'{PREFIX}_request_errors_total', 'Requests answered with a 4xx or 5xx status',
+            ('endpoint', 'status'), errors,
+        ),
+    ]
+    for name, value in sorted(counters.items()):
+        lines += _counter(f'{PREFIX}_{name}_total', name.replace('_', ' ').capitalize(), (), {(): value})
+
+    lines += [f'# HELP {PREFIX}_model_info Model version currently served', f'# TYPE {PREFIX}_model_info gauge']
+    for slot in models:
+        bundle = slot.get()
+        if bundle is not None:
+            lines.append(f'{PREFIX}_model_info{_labels(("model", "version"), (bundle.name, bundle.version))} 1')
+    return '\n'.join(lines) + '\n'
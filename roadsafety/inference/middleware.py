@@ -0,0 +1,54 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+
+
+class MetricsMiddleware:
+    """
+    Times every request for the metrics endpoint: total latency, status and
+    answering model version per endpoint (the URL name), plus the phases the
+    view and inference.serving mark with metrics.lap().
+
+    Listed first in MIDDLEWARE so the request time covers the whole stack.
+    Runs natively in both modes, so async views under ASGI are not pushed
+    back onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timer, token = metrics.start_request()
+        request.metrics_timer = timer
+        response = self.get_response(request)
+        self._finish(request, timer, token, response)
+        return response
+
+    async def __acall__(self, request):
+        timer, token = metrics.start_request()
+        request.metrics_timer = timer
+        response = await self.get_response(request)
+        self._finish(request, timer, token, response)
+        return response
+
+    def _finish(self, request, timer, token, response):
+        match = request.resolver_match
+        endpoint = (match.url_name or match.view_name) if match is not None else 'unmatched'
+        metrics.finish_request(
+            timer, token, endpoint, response.status_code, response.get('X-Model-Version', '')
+        )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Phases start with the view, not with the middleware stack in front of it
+        request.metrics_timer.restart()
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_timer.restart()
@@ -0,0 +1,215 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+from .forest import FlatForest
+
+# Layout: model/registry/<name>/<version>/{manifest.json, forest/, scaler.pkl, label_encoders.pkl}
+#         model/registry/<name>/CURRENT  (text file holding the active version)
+REGISTRY_DIR = Path(__file__).resolve().parent.parent / 'model' / 'registry'
+MANIFEST_FILE = 'manifest.json'
+CURRENT_FILE = 'CURRENT'
+FOREST_DIR = 'forest'
+SCALER_FILE = 'scaler.pkl'
+ENCODERS_FILE = 'label_encoders.pkl'
+
+
+class ModelVersion:
+    """One loaded set of artifacts (forest, optional scaler/encoders, feature schema)"""
+
+    def __init__(self, name, version, forest, features, scaler=None, label_encoders=None):
+        self.name = name
+        self.version = version
+        self.forest = forest
+        self.features = list(features)
+        self.scaler = scaler
+        self.label_encoders = label_encoders or {}
+        # PredictionCache the serving layer attaches on first use (dies with this version)
+        self.predictions = None
+
+        # StandardScaler precomputed as (x - mean) * inv_scale
+        self.mean = None
+        self.inv_scale = None
+        if scaler is not None:
+            n = len(self.features)
+            self.mean = scaler.mean_ if scaler.with_mean else np.zeros(n)
+            self.inv_scale = 1.0 / scaler.scale_ if scaler.with_std else np.ones(n)
+
+    def scale(self, features):
+        """Standardise a (n_samples, n_features) float64 array in place"""
+        if self.mean is not None:
+            np.subtract(features, self.mean, out=features)
+            np.multiply(features, self.inv_scale, out=features)
+        return features
+
+    def warm(self):
+        """Score a dummy batch so the first real request does not pay for page faults"""
+        self.forest.predict_proba(np.zeros((64, len(self.features))))
+        return self
+
+
+def load_version(name, version, root=REGISTRY_DIR):
+    directory = Path(root) / name / version
+    with open(directory / MANIFEST_FILE) as f:
+        manifest = json.load(f)
+
+    scaler_path = directory / SCALER_FILE
+    encoders_path = directory / ENCODERS_FILE
+    return ModelVersion(
+        name=name,
+        version=manifest['version'],
+        forest=FlatForest.load(directory / FOREST_DIR),
+        features=manifest['features'],
+        scaler=joblib.load(scaler_path) if scaler_path.exists() else None,
+        label_encoders=joblib.load(encoders_path) if encoders_path.exists() else None,
+    )
+
+
+def current_version(name, root=REGISTRY_DIR):
+    """The version CURRENT points at, or None if the model has never been published"""
+    try:
+        return (Path(root) / name / CURRENT_FILE).read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def activate(name, version, root=REGISTRY_DIR):
+    """Atomically point CURRENT at an already published version"""
+    model_dir = Path(root) / name
+    if not (model_dir / version / MANIFEST_FILE).exists():
+        raise ValueError(f'{name} has no published version {version!r}')
+
+    fd, tmp = tempfile.mkstemp(prefix=f'.{CURRENT_FILE}-', dir=model_dir)
+    with os.fdopen(fd, 'w') as f:
+        f.write(version + '\n')
+    os.replace(tmp, model_dir / CURRENT_FILE)
+
+
+def publish(name, version, forest, features, scaler=None, label_encoders=None, root=REGISTRY_DIR, make_current=True):
+    """
+    Store a new immutable version of a model and (by default) make it current.
+
+    `forest` is a fitted sklearn forest or a FlatForest. The version directory
+    is staged and renamed into place before CURRENT is switched, so workers
+    polling the registry only ever see complete versions.
+    """
+    model_dir = Path(root) / name
+    target = model_dir / version
+    if target.exists():
+        raise ValueError(f'{name} version {version!r} already exists')
+    model_dir.mkdir(parents=True, exist_ok=True)
+
+    if not isinstance(forest, FlatForest):
+        forest = FlatForest.from_sklearn(forest)
+    if len(features) != forest.n_features_in_:
+        raise ValueError(f'Feature schema has {len(features)} names but the model expects {forest.n_features_in_}')
+
+    staging = Path(tempfile.mkdtemp(prefix=f'.{version}-', dir=model_dir))
+    try:
+        forest.save(staging / FOREST_DIR)
+        if scaler is not None:
+            joblib.dump(scaler, staging / SCALER_FILE)
+        if label_encoders is not None:
+            joblib.dump(label_encoders, staging / ENCODERS_FILE)
+        with open(staging / MANIFEST_FILE, 'w') as f:
+            json.dump({
+                'name': name,
+                'version': version,
+                'features': [str(feature) for feature in features],
+                'classes': forest.classes_.tolist(),
+                'created': datetime.now(timezone.utc).isoformat(),
+            }, f, indent=2)
+        os.replace(staging, target)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    if make_current:
+        activate(name, version, root=root)
+    return target
+
+
+class ModelSlot:
+    """
+    The serving copy of one registered model.
+
+    get() never loads anything itself: at most every `poll_interval` seconds
+    it reads the registry's small CURRENT file, and when that names a new
+    version the version is loaded and warmed on a background thread, then
+    swapped in with a single reference assignment. Requests already holding the old ModelVersion finish
+    on it untouched.
+
+    `fallback` is a callable returning a ModelVersion, used when the registry
+    has nothing published for this model (e.g. the legacy model/*.pkl files).
+    """
+
+    def __init__(self, name, fallback=None, root=REGISTRY_DIR, poll_interval=5.0):
+        self.name = name
+        self.root = Path(root)
+        self.poll_interval = poll_interval
+        self.fallback = fallback
+
+        self._current = None
+        self._lock = threading.Lock()
+        self._loading = None
+        self._failed = set()
+        self._next_poll = time.monotonic() + poll_interval
+
+        # The first load happens synchronously, like the old import-time joblib.load
+        version = current_version(self.name, self.root)
+        if version is not None:
+            self._current = self._load(version)
+        if self._current is None and fallback is not None:
+            self._current = self._load_fallback()
+
+    def get(self):
+        now = time.monotonic()
+        if now >= self._next_poll:
+            self._next_poll = now + self.poll_interval
+            self.refresh()
+        return self._current
+
+    def refresh(self, wait=False):
+        """Start loading the registry's current version if it differs from the one being served"""
+        version = current_version(self.name, self.root)
+        with self._lock:
+            serving = self._current.version if self._current is not None else None
+            if version is None or version == serving or version == self._loading or version in self._failed:
+                return
+            self._loading = version
+
+        worker = threading.Thread(target=self._swap, args=(version,), name=f'model-loader-{self.name}', daemon=True)
+        worker.start()
+        if wait:
+            worker.join()
+
+    def _load(self, version):
+        try:
+            return load_version(self.name, version, self.root).warm()
+        except Exception as e:
+            self._failed.add(version)
+            print(f"⚠️ Error loading {self.name} model version {version}: {e}")
+            return None
+
+    def _load_fallback(self):
+        try:
+            return self.fallback().warm()
+        except Exception as e:
+            print(f"⚠️ Error loading {self.name} model: {e}")
+            return None
+
+    def _swap(self, version):
+        loaded = self._load(version)
+        with self._lock:
+            if loaded is not None:
+                self._current = loaded
+                print(f"✅ Switched {self.name} model to version {loaded.version}")
+            self._loading = None
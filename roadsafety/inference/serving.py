@@ -0,0 +1,202 @@
+import threading
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+from . import metrics
+from .batching import MicroBatcher
+from .features import ACCIDENT_FEATURES, FORM_FIELDS, SENSOR_FEATURES
+from .forest import PredictionCache, load_forest
+from .registry import ModelSlot, ModelVersion
+from .windows import WINDOW_FEATURES, WindowStore
+
+# Shared by the HTTP views and the WebSocket stream so both score exactly the same way
+BASE_DIR = Path(__file__).resolve().parent.parent
+MODEL_PATH = BASE_DIR / 'model' / 'driver_behaviour.pkl'
+SCALER_PATH = BASE_DIR / 'model' / 'scaler.pkl'
+SEVERITY_MODEL_PATH = BASE_DIR / 'model' / 'accident_severity_model.pkl'
+LABEL_ENCODERS_PATH = BASE_DIR / 'model' / 'label_encoders.pkl'
+
+MAX_BATCH_SIZE = 1000
+# Distinct split-interval combinations remembered per severity model version
+SEVERITY_CACHE_SIZE = 4096
+
+
+class ModelNotLoaded(Exception):
+    pass
+
+
+def _load_legacy_behaviour_model():
+    """The unversioned model/driver_behaviour.pkl + model/scaler.pkl pair, served as version 'legacy'"""
+    # Flattened into NumPy arrays so requests skip sklearn's per-call dispatch
+    # (memory-mapped from model/driver_behaviour/ when `manage.py export_forests` has been run)
+    scaler = joblib.load(SCALER_PATH)
+    features = [str(name) for name in getattr(scaler, 'feature_names_in_', SENSOR_FEATURES)]
+    return ModelVersion('driver_behaviour', 'legacy', load_forest(MODEL_PATH), features, scaler=scaler)
+
+
+def _load_legacy_severity_model():
+    """The unversioned model/accident_severity_model.pkl + label_encoders.pkl, served as version 'legacy'"""
+    return ModelVersion(
+        'accident_severity', 'legacy', load_forest(SEVERITY_MODEL_PATH), ACCIDENT_FEATURES,
+        label_encoders=joblib.load(LABEL_ENCODERS_PATH)
+    )
+
+
+# Serve the current registry versions (falling back to the legacy files) and
+# hot-swap newly published versions in the background
+behaviour_model = ModelSlot('driver_behaviour', fallback=_load_legacy_behaviour_model)
+severity_model = ModelSlot('accident_severity', fallback=_load_legacy_severity_model)
+if behaviour_model.get() is not None:
+    print("✅ ML MODEL LOADED SUCCESSFULLY!")
+
+# Per-driver sliding windows in the features_14.csv layout. They are scored by the
+# 'driver_windows' model once one is published (manage.py publish_model driver_windows ...)
+driver_windows = WindowStore(max_drivers=10000, ttl=600)
+window_model = ModelSlot('driver_windows')
+_WINDOW_COLUMNS = {name: i for i, name in enumerate(WINDOW_FEATURES)}
+
+
+def _current(slot):
+    bundle = slot.get()
+    if bundle is None:
+        raise ModelNotLoaded('Model not loaded. Please upload model files.')
+    return bundle
+
+
+# One preallocated feature row per request thread
+_feature_buffer = threading.local()
+
+
+def _single_feature_row(data, features):
+    """Fill this thread's feature buffer from a request payload, in the model's feature order"""
+    row = getattr(_feature_buffer, 'row', None)
+    if row is None or row.shape[1] != len(features):
+        row = _feature_buffer.row = np.empty((1, len(features)), dtype=np.float64)
+    for i, name in enumerate(features):
+        row[0, i] = float(data.get(name, 0))
+    return row
+
+
+def _behaviour_result(prediction, probability):
+    return {
+        'behavior': 'risky' if prediction == 1 else 'safe',
+        'confidence': float(probability.max() * 100),
+        'risky_probability': float(probability[1] * 100),
+        'safe_probability': float(probability[0] * 100)
+    }
+
+
+# Set by configure_batching() (settings.INFERENCE_BATCHING); None scores each request on its own thread
+behaviour_batcher = None
+
+
+def configure_batching(max_batch=16, max_delay=0.002, workers=0):
+    """Route predict_behaviour_one through a MicroBatcher over predict_behaviour_rows"""
+    global behaviour_batcher
+    behaviour_batcher = MicroBatcher(predict_behaviour_rows, max_batch, max_delay, workers, name='behaviour_batch')
+
+
+def predict_behaviour_one(data):
+    """Score one sensor sample; returns (result dict, model version)"""
+    bundle = _current(behaviour_model)
+
+    if behaviour_batcher is not None:
+        # Concurrent requests share one forest pass; waits at most max_delay for company
+        row = [float(data.get(name, 0)) for name in SENSOR_FEATURES]
+        metrics.lap('features')
+        result, version = behaviour_batcher.submit(row)
+        metrics.lap('batch')
+        return result, version
+
+    # Scale in NumPy (no DataFrame, no sklearn transform dispatch), then one forest pass;
+    # the label is the most probable class
+    row = _single_feature_row(data, bundle.features)
+    metrics.lap('features')
+    sensor_scaled = bundle.scale(row)
+    metrics.lap('scale')
+    probability = bundle.forest.predict_proba(sensor_scaled)[0]
+    metrics.lap('predict_proba')
+    prediction = bundle.forest.classes_[int(probability.argmax())]
+    result = _behaviour_result(prediction, probability)
+    metrics.lap('predict')
+    return result, bundle.version
+
+
+def predict_behaviour_many(samples):
+    """Score a list of sensor samples with one scaler and one forest pass; returns (results, model version)"""
+    bundle = _current(behaviour_model)
+
+    sensor_data = np.array(
+        [[float(sample.get(name, 0)) for name in bundle.features] for sample in samples],
+        dtype=np.float64
+    )
+    return _score_behaviour(bundle, sensor_data)
+
+
+def predict_behaviour_rows(rows):
+    """
+    Like predict_behaviour_many for an (n, len(SENSOR_FEATURES)) array whose
+    columns follow SENSOR_FEATURES, e.g. decoded inference.wire records
+    """
+    bundle = _current(behaviour_model)
+
+    if bundle.features == SENSOR_FEATURES:
+        sensor_data = rows.astype(np.float64)
+    else:
+        sensor_data = rows[:, [SENSOR_FEATURES.index(name) for name in bundle.features]].astype(np.float64)
+    return _score_behaviour(bundle, sensor_data)
+
+
+def _score_behaviour(bundle, sensor_data):
+    metrics.lap('features')
+    sensor_scaled = bundle.scale(sensor_data)
+    metrics.lap('scale')
+    probabilities = bundle.forest.predict_proba(sensor_scaled)
+    metrics.lap('predict_proba')
+    predictions = bundle.forest.classes_[probabilities.argmax(axis=1)]
+    results = [_behaviour_result(p, proba) for p, proba in zip(predictions, probabilities)]
+    metrics.lap('predict')
+    return results, bundle.version
+
+
+def predict_severity(data):
+    """Score one set of monitor form fields (speed, vehicles, ...); returns (severity, model version)"""
+    bundle = _current(severity_model)
+
+    values = []
+    for feature in bundle.features:
+        field, cast = FORM_FIELDS[feature]
+        values.append(cast(data.get(field)))
+    metrics.lap('features')
+
+    # The monitor page posts constants for everything but speed, so nearly every
+    # call is a dictionary lookup instead of a forest pass
+    cache = bundle.predictions
+    if cache is None:
+        cache = bundle.predictions = PredictionCache(bundle.forest, SEVERITY_CACHE_SIZE)
+    prediction, hit = cache.predict(values)
+    metrics.inc('severity_cache_hits' if hit else 'severity_cache_misses')
+    metrics.lap('predict')
+    return int(prediction), bundle.version
+
+
+def push_driver_window(driver_id, data):
+    """
+    Add one sensor sample to a driver's window.
+
+    Returns the window model's prediction fields, or an empty dict while the
+    window is still filling or no window model has been published.
+    """
+    acc = [float(data.get(name, 0)) for name in ('accel_2', 'accel_3', 'accel_4')]
+    gyro = [float(data.get(name, 0)) for name in ('gyro_2', 'gyro_3', 'gyro_4')]
+    features = driver_windows.push(driver_id, acc, gyro)
+
+    bundle = window_model.get()
+    if features is None or bundle is None:
+        return {}
+
+    row = bundle.scale(features[[_WINDOW_COLUMNS[name] for name in bundle.features]][np.newaxis, :])
+    prediction = bundle.forest.predict(row)[0]
+    return {'window_prediction': prediction.item(), 'window_model_version': bundle.version}
@@ -0,0 +1,148 @@
+import json
+import uuid
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+
+from monitor.telemetry import record_behaviour, record_severity
+
+from . import wire
+from .serving import (
+    MAX_BATCH_SIZE, ModelNotLoaded, driver_windows, predict_behaviour_many, predict_behaviour_one,
+    predict_behaviour_rows, predict_severity, push_driver_window,
+)
+
+STREAM_PATH = '/ws/sensors/'
+
+# Model work is CPU-bound, so it runs on a worker thread instead of the event loop
+_score_one = sync_to_async(predict_behaviour_one, thread_sensitive=False)
+_score_many = sync_to_async(predict_behaviour_many, thread_sensitive=False)
+_score_rows = sync_to_async(predict_behaviour_rows, thread_sensitive=False)
+_score_severity = sync_to_async(predict_severity, thread_sensitive=False)
+_push_window = sync_to_async(push_driver_window, thread_sensitive=False)
+
+
+@sync_to_async
+def _session_user_id(scope):
+    """The logged-in user behind the connection's session cookie, if any, checked as for HTTP requests"""
+    headers = dict(scope.get('headers', []))
+    cookies = SimpleCookie(headers.get(b'cookie', b'').decode('latin-1'))
+    morsel = cookies.get(settings.SESSION_COOKIE_NAME)
+    if morsel is None:
+        return None
+    user = get_user(SimpleNamespace(session=import_module(settings.SESSION_ENGINE).SessionStore(morsel.value)))
+    return user.pk if user.is_authenticated else None
+
+
+async def handle_message(message, driver_id=None, user_id=None):
+    """
+    Score one client message and build the reply.
+
+    Messages are JSON objects with a "type":
+      {"type": "behavior", "accel_2": ..., ...}         one sensor sample
+      {"type": "behavior", "samples": [{...}, ...]}     buffered samples
+      {"type": "safety", "speed": ..., "vehicles": ...} monitor form fields
+    Replies carry the same fields as the HTTP endpoints plus "type",
+    "model_version" and the client's "id" if it sent one. Single behaviour
+    samples also feed the driver's sliding window (see inference.windows).
+    Everything scored for a known driver is queued as trip telemetry.
+    """
+    kind = message.get('type', 'behavior')
+    reply = {'type': kind}
+    if 'id' in message:
+        reply['id'] = message['id']
+
+    try:
+        if kind == 'behavior' and 'samples' in message:
+            samples = message['samples']
+            if not isinstance(samples, list) or not samples or len(samples) > MAX_BATCH_SIZE:
+                raise ValueError(f'Expected a list of 1 to {MAX_BATCH_SIZE} samples')
+            results, version = await _score_many(samples)
+            reply.update(count=len(results), results=results)
+            if driver_id is not None:
+                for sample, result in zip(samples, results):
+                    record_behaviour(driver_id, user_id, sample, result, version)
+        elif kind == 'behavior':
+            result, version = await _score_one(message)
+            reply.update(result)
+            if driver_id is not None:
+                reply.update(await _push_window(driver_id, message))
+                record_behaviour(driver_id, user_id, message, result, version)
+        elif kind == 'safety':
+            prediction, version = await _score_severity(message)
+            reply['prediction'] = prediction
+            if driver_id is not None:
+                record_severity(driver_id, user_id, message, prediction, version)
+        else:
+            raise ValueError(f'Unknown message type {kind!r}')
+        reply['model_version'] = version
+    except (ModelNotLoaded, ValueError, TypeError, AttributeError) as e:
+        reply['error'] = str(e)
+    return reply
+
+
+async def handle_records(body, driver_id=None, user_id=None):
+    """Score a binary frame of packed inference.wire behaviour records; replies like a "samples" message"""
+    reply = {'type': 'behavior'}
+    try:
+        rows = wire.decode(body, wire.BEHAVIOUR, max_count=MAX_BATCH_SIZE)
+        results, version = await _score_rows(rows)
+    except (ModelNotLoaded, ValueError) as e:
+        reply['error'] = str(e)
+        return reply
+
+    reply.update(count=len(results), results=results, model_version=version)
+    if driver_id is not None:
+        for sample, result in zip(wire.as_dicts(rows, wire.BEHAVIOUR), results):
+            record_behaviour(driver_id, user_id, sample, result, version)
+    return reply
+
+
+async def sensor_stream(scope, receive, send):
+    """
+    ASGI WebSocket endpoint: one long-lived connection per driver.
+
+    Replaces polling /api/predict-behavior/ and /predict/ with a single
+    socket, so each sample costs one frame instead of a full HTTP request
+    with session and middleware handling.
+    """
+    event = await receive()
+    if event['type'] != 'websocket.connect':
+        return
+    if scope['path'] != STREAM_PATH:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    await send({'type': 'websocket.accept'})
+
+    # Logged-in drivers keep their window across reconnects; anonymous ones get one per connection
+    user_id = await _session_user_id(scope)
+    driver_id = f'user-{user_id}' if user_id is not None else f'conn-{uuid.uuid4().hex}'
+
+    while True:
+        event = await receive()
+        if event['type'] == 'websocket.disconnect':
+            if user_id is None:
+                driver_windows.discard(driver_id)
+            return
+        if event['type'] != 'websocket.receive':
+            continue
+
+        if (event.get('bytes') or b'')[:2] == wire.MAGIC:
+            reply = await handle_records(event['bytes'], driver_id, user_id)
+            await send({'type': 'websocket.send', 'text': json.dumps(reply)})
+            continue
+
+        try:
+            message = json.loads(event.get('text') or event.get('bytes') or '')
+            if not isinstance(message, dict):
+                raise ValueError('Expected a JSON object')
+        except ValueError as e:
+            reply = {'error': f'Invalid message: {e}'}
+        else:
+            reply = await handle_message(message, driver_id, user_id)
+
+        await send({'type': 'websocket.send', 'text': json.dumps(reply)})
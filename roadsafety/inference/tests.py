@@ -0,0 +1,882 @@
+import asyncio
+import contextlib
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from unittest import mock, skipUnless
+
+import joblib
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import Client, SimpleTestCase, TestCase
+from sklearn.ensemble import RandomForestClassifier
+
+from . import metrics, wire
+from .admission import AdmissionController, Rejected
+from .batching import MicroBatcher
+from .compression import compress, order_trees, prune
+from .features import SENSOR_FEATURES
+from .forest import FlatForest, PredictionCache, load_forest
+from .management.commands.replay_trips import load_trip
+from .registry import ModelSlot, ModelVersion, activate, current_version, publish
+from .serving import behaviour_model, driver_windows
+from .streaming import sensor_stream
+from .training import SAMPLE_SCRIPT, evaluate, load_sample_module, prepare, train, write_artifacts
+from .windows import WINDOW_FEATURES, DriverWindow, RollingStats, WindowStore
+
+
+class FlatForestParityTests(SimpleTestCase):
+    """The flattened evaluator must agree with sklearn on the same fitted forest"""
+
+    def assert_parity(self, forest, X):
+        flat = FlatForest.from_sklearn(forest)
+        np.testing.assert_array_equal(flat.predict_proba(X), forest.predict_proba(X))
+        np.testing.assert_array_equal(flat.predict(X), forest.predict(X))
+
+    def test_driver_behaviour_shaped_forest(self):
+        # 7 standardised sensor features, binary label, depth-limited like driver_behaviour.pkl
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(2000, 7))
+        y = (X[:, 0] + 2 * X[:, 4] + rng.normal(size=len(X)) > 0.5).astype(int)
+        forest = RandomForestClassifier(
+            n_estimators=50, max_depth=15, min_samples_split=5, class_weight='balanced', random_state=42
+        ).fit(X, y)
+
+        self.assert_parity(forest, rng.normal(size=(500, 7)))
+        self.assert_parity(forest, X[:1])
+
+    def test_accident_severity_shaped_forest(self):
+        # 8 small-integer features, three severity classes, unlimited depth like accident_severity_model.pkl
+        rng = np.random.default_rng(1)
+        X = np.column_stack([
+            rng.choice([20, 30, 40, 50, 60, 70], 3000),
+            rng.integers(1, 5, 3000),
+            rng.integers(0, 4, 3000),
+            rng.integers(1, 8, 3000),
+            rng.integers(0, 5, 3000),
+            rng.integers(0, 9, 3000),
+            rng.integers(0, 5, 3000),
+            rng.integers(1, 3, 3000),
+        ])
+        y = np.clip((X[:, 0] > 50).astype(int) + rng.integers(0, 3, 3000), 1, 3)
+        forest = RandomForestClassifier(n_estimators=30, random_state=42).fit(X, y)
+
+        self.assert_parity(forest, X[:500])
+        self.assert_parity(forest, np.array([[130.0, 1, 0, 3, 1, 1, 1, 1]]))
+
+    def test_rejects_wrong_feature_count(self):
+        rng = np.random.default_rng(2)
+        forest = RandomForestClassifier(n_estimators=3, random_state=0).fit(rng.normal(size=(50, 7)), rng.integers(0, 2, 50))
+
+        with self.assertRaises(ValueError):
+            FlatForest.from_sklearn(forest).predict_proba(np.zeros((1, 8)))
+
+
+class FlatForestArtifactTests(SimpleTestCase):
+    """Exported .npy artifacts load as read-only memory maps and score identically"""
+
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.X = rng.normal(size=(300, 7))
+        self.forest = RandomForestClassifier(n_estimators=10, max_depth=6, random_state=0).fit(
+            self.X, (self.X[:, 0] > 0).astype(int)
+        )
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_save_and_mmap_load_round_trip(self):
+        target = Path(self.tmp.name) / 'driver_behaviour'
+        FlatForest.from_sklearn(self.forest).save(target)
+
+        loaded = FlatForest.load(target)
+        self.assertIsInstance(loaded.threshold, np.memmap)
+        self.assertFalse(loaded.threshold.flags.writeable)
+        np.testing.assert_array_equal(loaded.predict_proba(self.X), self.forest.predict_proba(self.X))
+
+    def test_load_forest_prefers_fresh_export_over_pickle(self):
+        pickle_path = Path(self.tmp.name) / 'driver_behaviour.pkl'
+        joblib.dump(self.forest, pickle_path)
+        self.assertNotIsInstance(load_forest(pickle_path).threshold, np.memmap)
+
+        FlatForest.from_sklearn(self.forest).save(Path(self.tmp.name) / 'driver_behaviour')
+        self.assertIsInstance(load_forest(pickle_path).threshold, np.memmap)
+
+
+class PredictionCacheTests(SimpleTestCase):
+    def test_cached_predictions_match_the_forest(self):
+        # A continuous speed plus small discrete codes, like the monitor form
+        rng = np.random.default_rng(3)
+        X = np.column_stack([rng.uniform(0, 120, 3000), rng.integers(1, 4, 3000), rng.integers(1, 8, 3000)])
+        y = (X[:, 0] / 40 + X[:, 1] + rng.normal(size=len(X)) > 4).astype(int) + (X[:, 2] > 5)
+        flat = FlatForest.from_sklearn(RandomForestClassifier(n_estimators=20, max_depth=8, random_state=0).fit(X, y))
+        cache = PredictionCache(flat, max_size=64)
+
+        rows = np.column_stack([rng.uniform(0, 120, 2000), rng.integers(1, 4, 2000), rng.integers(1, 8, 2000)])
+        rows[::7, 0] = np.round(rows[::7, 0])
+        rows[5, 0] = np.nan
+        cached = [cache.predict(row.tolist())[0] for row in rows]
+
+        np.testing.assert_array_equal(cached, flat.predict(rows))
+        self.assertGreater(cache.hits, 0)
+        self.assertEqual(cache.hits + cache.misses, len(rows))
+        self.assertLessEqual(len(cache), 64)
+
+
+class ModelRegistryTests(SimpleTestCase):
+    """Published versions are picked up and swapped in without restarting"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+        rng = np.random.default_rng(4)
+        self.X = rng.normal(size=(200, 3))
+        self.features = ['a', 'b', 'c']
+
+    def fit(self, seed):
+        return RandomForestClassifier(n_estimators=5, max_depth=4, random_state=seed).fit(
+            self.X, (self.X[:, 0] > 0).astype(int)
+        )
+
+    def test_slot_swaps_to_newly_published_version(self):
+        publish('driver_behaviour', 'v1', self.fit(0), self.features, root=self.root)
+        slot = ModelSlot('driver_behaviour', root=self.root, poll_interval=3600)
+        v1 = slot.get()
+        self.assertEqual(v1.version, 'v1')
+
+        v2_forest = self.fit(1)
+        publish('driver_behaviour', 'v2', v2_forest, self.features, root=self.root)
+        self.assertEqual(slot.get().version, 'v1')  # not polled yet
+
+        slot.refresh(wait=True)
+        self.assertEqual(slot.get().version, 'v2')
+        np.testing.assert_array_equal(slot.get().forest.predict_proba(self.X), v2_forest.predict_proba(self.X))
+
+        # The old version is still usable by requests that grabbed it before the swap
+        self.assertEqual(v1.forest.predict_proba(self.X).shape, (200, 2))
+
+        activate('driver_behaviour', 'v1', root=self.root)
+        slot.refresh(wait=True)
+        self.assertEqual(slot.get().version, 'v1')
+
+    def test_fallback_used_until_something_is_published(self):
+        legacy = ModelVersion('driver_behaviour', 'legacy', FlatForest.from_sklearn(self.fit(0)), self.features)
+        slot = ModelSlot('driver_behaviour', fallback=lambda: legacy, root=self.root, poll_interval=3600)
+        self.assertEqual(slot.get().version, 'legacy')
+
+        publish('driver_behaviour', 'v1', self.fit(1), self.features, root=self.root)
+        slot.refresh(wait=True)
+        self.assertEqual(slot.get().version, 'v1')
+
+    def test_publish_rejects_mismatched_schema_and_duplicates(self):
+        with self.assertRaises(ValueError):
+            publish('driver_behaviour', 'v1', self.fit(0), ['a', 'b'], root=self.root)
+
+        publish('driver_behaviour', 'v1', self.fit(0), self.features, root=self.root)
+        with self.assertRaises(ValueError):
+            publish('driver_behaviour', 'v1', self.fit(1), self.features, root=self.root)
+
+
+class MetricsTests(SimpleTestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_phases_requests_and_errors_are_exposed(self):
+        timer, token = metrics.start_request()
+        metrics.lap('parse')
+        metrics.lap('predict')
+        metrics.finish_request(timer, token, 'predict_behavior', 200, 'v1')
+        metrics.lap('ignored')  # outside a request: no-op
+
+        client = Client(HTTP_HOST='localhost')
+        self.assertEqual(client.post('/api/predict-behavior/', 'not json', content_type='application/json').status_code, 400)
+        response = client.get('/metrics')
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        text = response.content.decode()
+
+        self.assertIn('roadsafety_phase_seconds_count{endpoint="predict_behavior",phase="parse"} 1', text)
+        self.assertIn('roadsafety_phase_seconds_bucket{endpoint="predict_behavior",phase="predict",le="+Inf"} 1', text)
+        self.assertNotIn('phase="ignored"', text)
+        self.assertIn('roadsafety_requests_total{endpoint="predict_behavior",status="200",model_version="v1"} 1', text)
+        self.assertIn('roadsafety_request_errors_total{endpoint="predict_behavior",status="400"} 1', text)
+        self.assertIn('roadsafety_request_seconds_count{endpoint="predict_behavior"} 2', text)
+
+        self.assertEqual(Client(HTTP_HOST='localhost', REMOTE_ADDR='10.0.0.1').get('/metrics').status_code, 403)
+
+    def test_tunnelled_requests_need_the_token(self):
+        # ngrok connects from 127.0.0.1 but adds X-Forwarded-For
+        tunnel = Client(HTTP_HOST='localhost', HTTP_X_FORWARDED_FOR='203.0.113.7')
+        self.assertEqual(tunnel.get('/metrics').status_code, 403)
+
+        with self.settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(tunnel.get('/metrics').status_code, 403)
+            self.assertEqual(tunnel.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(tunnel.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+            self.assertEqual(Client(HTTP_HOST='localhost').get('/metrics').status_code, 200)
+
+
+    @skipUnless(behaviour_model.get() is not None, 'no driver behaviour model is loaded')
+    def test_identified_requests_time_each_phase_under_its_own_label(self):
+        sample = {name: 0.1 for name in SENSOR_FEATURES}
+        client = Client(HTTP_HOST='localhost')
+        with mock.patch('authentication.views.record_behaviour'):
+            for path in ('/api/predict-behavior/', '/api/predict-behavior/async/'):
+                body = json.dumps({**sample, 'driver_id': 'phase-test'})
+                self.assertEqual(client.post(path, body, content_type='application/json').status_code, 200)
+        driver_windows.discard('driver-phase-test')
+
+        text = metrics.render()
+        for endpoint, phases in [
+            ('predict_behavior', ('parse', 'driver', 'window', 'telemetry', 'serialize')),
+            ('predict_behavior_async', ('parse', 'driver', 'queue', 'window', 'telemetry', 'serialize')),
+        ]:
+            for phase in phases:
+                self.assertIn(f'roadsafety_phase_seconds_count{{endpoint="{endpoint}",phase="{phase}"}} 1', text)
+
+
+class WireFormatTests(SimpleTestCase):
+    def test_round_trip_is_a_view_over_the_body(self):
+        records = np.random.default_rng(0).normal(size=(100, len(SENSOR_FEATURES)))
+        body = wire.encode(records, wire.BEHAVIOUR)
+        self.assertEqual(len(body), 8 + 100 * 7 * 4)
+
+        decoded = wire.decode(body, wire.BEHAVIOUR)
+        np.testing.assert_array_equal(decoded, records.astype(np.float32))
+        self.assertFalse(decoded.flags.owndata)
+        self.assertEqual(wire.as_dicts(decoded[:1], wire.BEHAVIOUR)[0]['accel_2'], float(np.float32(records[0, 0])))
+
+    def test_rejects_malformed_bodies(self):
+        body = wire.encode(np.zeros((3, 8)), wire.SEVERITY)
+        for bad, kwargs in [
+            (body[:5], {}),
+            (b'XX' + body[2:], {}),
+            (body[:2] + b'\x02' + body[3:], {}),
+            (body[:-1], {}),
+            (body, {'max_count': 2}),
+        ]:
+            with self.assertRaises(wire.WireFormatError):
+                wire.decode(bad, wire.SEVERITY, **kwargs)
+        with self.assertRaises(wire.WireFormatError):
+            wire.decode(body, wire.BEHAVIOUR)
+
+        for value in (np.inf, -np.inf, np.nan):
+            records = np.zeros((3, 8))
+            records[1, 0] = value
+            with self.assertRaises(wire.WireFormatError):
+                wire.decode(wire.encode(records, wire.SEVERITY), wire.SEVERITY)
+
+    @skipUnless(behaviour_model.get() is not None, 'no driver behaviour model is loaded')
+    def test_batch_endpoint_scores_packed_records_like_json(self):
+        records = np.random.default_rng(1).normal(size=(20, len(SENSOR_FEATURES))).astype(np.float32)
+        samples = wire.as_dicts(records, wire.BEHAVIOUR)
+        client = Client(HTTP_HOST='localhost')
+
+        packed = client.post('/api/predict-behavior/batch/', wire.encode(records, wire.BEHAVIOUR), content_type=wire.CONTENT_TYPE)
+        as_json = client.post('/api/predict-behavior/batch/', json.dumps({'samples': samples}), content_type='application/json')
+        self.assertEqual(packed.status_code, 200)
+        self.assertEqual(packed.json(), as_json.json())
+
+        truncated = client.post('/api/predict-behavior/batch/', wire.encode(records, wire.BEHAVIOUR)[:-4], content_type=wire.CONTENT_TYPE)
+        self.assertEqual(truncated.status_code, 400)
+
+
+def score_in_worker(rows):
+    """MicroBatcher score for the worker-process tests; a negative first value kills the worker"""
+    if rows[0, 0] < 0:
+        os._exit(1)
+    return rows.sum(axis=1).tolist(), os.getpid()
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def test_concurrent_rows_share_batches_and_get_their_own_results(self):
+        batches = []
+        release = threading.Event()
+
+        def score(rows):
+            release.wait()
+            batches.append(len(rows))
+            return rows.sum(axis=1).tolist(), 'v1'
+
+        batcher = MicroBatcher(score, max_batch=8, max_delay=0.05)
+        with ThreadPoolExecutor(32) as pool:
+            futures = [pool.submit(batcher.submit, [i, 2 * i], 5) for i in range(32)]
+            release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(results, [(3.0 * i, 'v1') for i in range(32)])
+        self.assertEqual(sum(batches), 32)
+        self.assertLessEqual(max(batches), 8)
+        self.assertLess(len(batches), 32)
+
+    def test_errors_reach_every_waiting_request(self):
+        def score(rows):
+            raise ValueError('boom')
+
+        batcher = MicroBatcher(score, max_batch=4, max_delay=0.01)
+        with self.assertRaisesMessage(ValueError, 'boom'):
+            batcher.submit([1.0], timeout=5)
+
+    def test_a_dead_worker_process_is_replaced(self):
+        metrics.reset()
+        # fork instead of forkserver, so the workers inherit this test module and its score function
+        with mock.patch('inference.batching.multiprocessing.get_context', return_value=multiprocessing.get_context('fork')):
+            batcher = MicroBatcher(score_in_worker, max_batch=4, max_delay=0.001, workers=1)
+            self.addCleanup(lambda: batcher._pool.shutdown())
+
+            self.assertEqual(batcher.submit([1.0, 2.0], timeout=30)[0], 3.0)
+            first = batcher._pool
+            with self.assertRaises(BrokenProcessPool):
+                batcher.submit([-1.0, 0.0], timeout=30)
+            result, pid = batcher.submit([3.0, 4.0], timeout=30)
+            self.assertEqual(result, 7.0)
+            self.assertIsNot(batcher._pool, first)
+            self.assertEqual(batcher.submit([5.0, 6.0], timeout=30), (11.0, pid))
+        self.assertIn('roadsafety_batch_pool_restarts_total{} 1', metrics.render())
+
+
+class AdmissionControllerTests(SimpleTestCase):
+    async def test_overload_is_shed_and_stale_samples_coalesced(self):
+        controller = AdmissionController(concurrency=1, queue_depth=3, max_age=60)
+        release = threading.Event()
+
+        def work(value):
+            release.wait(5)
+            return value
+
+        async def outcome(value, driver):
+            try:
+                return await controller.run(work, value, driver=driver)
+            except Rejected as e:
+                return e.status
+
+        tasks = [asyncio.create_task(outcome(value, driver))
+                 for value, driver in [('a', 'a'), ('b1', 'b'), ('b2', 'b'), ('c', 'c'), ('d', 'd'), ('e', 'e')]]
+        for _ in range(6):
+            await asyncio.sleep(0)
+        release.set()
+
+        # 'a' holds the only slot; b2 takes over b1's place in the queue, so
+        # b2 / c / d fill it and e finds it full
+        self.assertEqual(await asyncio.gather(*tasks), ['a', 429, 'b2', 'c', 'd', 503])
+
+    async def test_superseded_waiter_leaves_the_queue_at_once(self):
+        controller = AdmissionController(concurrency=1, queue_depth=1, max_age=60)
+        release = threading.Event()
+        busy = asyncio.create_task(controller.run(release.wait, 5))
+        first = asyncio.create_task(controller.run(lambda: 'first', driver='b'))
+        await asyncio.sleep(0)
+
+        # The only slot is still busy: the older sample is rejected now and its
+        # place goes to the newer one instead of the queue being full
+        second = asyncio.create_task(controller.run(lambda: 'second', driver='b'))
+        with self.assertRaises(Rejected) as rejected:
+            await asyncio.wait_for(first, 1)
+        self.assertEqual(rejected.exception.status, 429)
+        self.assertFalse(busy.done())
+        self.assertEqual(controller._waiting, 1)
+
+        release.set()
+        self.assertEqual(await second, 'second')
+        await busy
+        self.assertEqual((controller._waiting, controller._waiters), (0, {}))
+
+    async def test_cancelled_waiters_leave_no_bookkeeping(self):
+        controller = AdmissionController(concurrency=1, queue_depth=4, max_age=60)
+        release = threading.Event()
+        busy = asyncio.create_task(controller.run(release.wait, 5))
+        waiting = asyncio.create_task(controller.run(lambda: None, driver='c'))
+        await asyncio.sleep(0)
+        self.assertIn('c', controller._waiters)
+
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertEqual((controller._waiting, controller._waiters), (0, {}))
+        release.set()
+        await busy
+        self.assertEqual(await controller.run(lambda: 'free', driver='c'), 'free')
+
+    async def test_samples_that_waited_too_long_are_dropped(self):
+        controller = AdmissionController(concurrency=1, queue_depth=4, max_age=0.01)
+        first = asyncio.create_task(controller.run(time.sleep, 0.05))
+        await asyncio.sleep(0)
+        with self.assertRaises(Rejected) as rejected:
+            await controller.run(time.sleep, 0)
+        self.assertEqual(rejected.exception.status, 503)
+        await first
+
+
+class TripReplayTests(SimpleTestCase):
+    def test_recording_becomes_timed_sensor_rows(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            day = Path(tmp)
+            (day / 'Accelerometer.csv').write_text(
+                'Timestamp,Milliseconds,X,Y,Z\n' + ''.join(f't,{10 * i + 5},{i},0,9.8\n' for i in range(10))
+            )
+            (day / 'Gyroscope.csv').write_text('Timestamp,Milliseconds,X,Y,Z\nt,1,0.1,0.2,0.3\nt,52,0.4,0.5,0.6\n')
+            sample = load_sample_module()
+
+            times, rows = load_trip(day, sample)
+            self.assertEqual(times.tolist(), [10 * i for i in range(10)])
+            self.assertEqual(rows.shape, (10, len(SENSOR_FEATURES)))
+            self.assertEqual(rows[:, 0].tolist(), list(range(10)))
+            np.testing.assert_allclose(rows[4, 3:], [0.1, 0.2, 0.3, 0])
+            np.testing.assert_allclose(rows[5, 3:], [0.4, 0.5, 0.6, 0])
+
+            times, rows = load_trip(day, sample, hz=50)
+            self.assertEqual(times.tolist(), [0, 20, 40, 60, 80])
+            self.assertEqual(rows[:, 0].tolist(), [0, 2, 4, 6, 8])
+
+            (day / 'Accelerometer.csv').unlink()
+            self.assertIsNone(load_trip(day, sample))
+
+
+def write_sensor_csv(path, rows, columns='X,Y,Z'):
+    """A recorded sensor file: (Milliseconds, value, ...) rows, one Timestamp per second"""
+    path.write_text(
+        f'Timestamp,Milliseconds,{columns}\n'
+        + ''.join(f'2020-05-25 18:59:{ms // 1000:02d},' + ','.join(map(str, (ms, *values))) + '\n' for ms, *values in rows)
+    )
+
+
+class LoadTestStreamTests(SimpleTestCase):
+    def test_only_the_stream_mode_needs_websockets(self):
+        with mock.patch.dict('sys.modules', {'websockets': None}):
+            out = io.StringIO()
+            call_command('loadtest_stream', mode='poll', drivers='1', duration=0, interval=0.01, stdout=out)
+            self.assertIn('poll', out.getvalue())
+            for mode in ('stream', 'both'):
+                with self.assertRaisesMessage(CommandError, 'pip install websockets'):
+                    call_command('loadtest_stream', mode=mode, drivers='1', duration=0, stdout=io.StringIO())
+
+
+class SampleResamplingTests(SimpleTestCase):
+    """data_sampling/sample.py joins a day's sensors on a fixed-rate time grid"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.day = Path(self.tmp.name) / 'day1r'
+        self.day.mkdir()
+        self.sample = load_sample_module()
+
+    def resample(self, hz=10):
+        blocks = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            rows = self.sample.process_day(self.day, hz, blocks.append, self.sample.StampCodes(), self.sample.StageTimer())
+        return rows, (np.concatenate(blocks) if blocks else None)
+
+    def test_sensors_are_joined_on_the_grid(self):
+        write_sensor_csv(self.day / 'Accelerometer.csv', [(ms, ms, 0, 9.8) for ms in range(0, 1001, 50)])
+        write_sensor_csv(self.day / 'Gyroscope.csv', [(ms, 0, 0, ms) for ms in range(5, 1001, 50)])
+
+        count, rows = self.resample()
+        # The grid starts once both sensors have a reading and stops at the earlier last reading (955)
+        self.assertEqual(count, 9)
+        self.assertEqual(rows['accel_1'].tolist(), list(range(100, 1000, 100)))
+        self.assertEqual(rows['accel_2'].tolist(), list(range(100, 1000, 100)))
+        self.assertEqual(rows['gyro_1'].tolist(), list(range(55, 900, 100)))
+        self.assertEqual(rows['gyro_4'].tolist(), list(range(55, 900, 100)))
+        self.assertEqual(rows.dtype, self.sample.ROW_DTYPE)
+
+        count, rows = self.resample(hz=4)
+        self.assertEqual(rows['accel_1'].tolist(), [250, 500, 750])
+
+    def test_stale_and_unparseable_readings(self):
+        accel = [(ms, ms, 0, 9.8) for ms in range(0, 3001, 50)]
+        accel[20] = (1000, 'n/a', 0, 9.8)  # dropped, so grid time 1000 uses the reading at 950
+        write_sensor_csv(self.day / 'Accelerometer.csv', accel)
+        write_sensor_csv(self.day / 'Gyroscope.csv', [(ms, 0, 0, ms) for ms in range(5, 3001, 50) if not 300 < ms < 700])
+        write_sensor_csv(self.day / 'GPS.csv', [(0, 51.5012345, -0.1416719, 30)], 'Latitude,Longitude,Speed')
+        write_sensor_csv(self.day / 'Proximity.csv', [(0, 5)], 'centimeters')
+
+        _, rows = self.resample()
+        times = rows['accel_1'].tolist()
+        # Gyroscope older than its 200 ms tolerance (255 at 500-700 ms) drops the row
+        self.assertEqual(times[:5], [100, 200, 300, 400, 800])
+        self.assertEqual(rows['accel_2'][times.index(950)], 950)
+        gps = dict(zip(times, rows['gps_0']))
+        # GPS goes missing 2000 ms after its only reading (kept to the full recorded precision);
+        # proximity is held indefinitely
+        self.assertEqual(gps[2000], 51.5012345)
+        self.assertEqual(rows['gps_1'][0], -0.1416719)
+        self.assertTrue(np.isnan(gps[2100]))
+        self.assertTrue((rows['proximity'] == 5).all())
+
+        (self.day / 'Gyroscope.csv').unlink()
+        self.assertEqual(self.resample(), (None, None))
+
+
+class SampleCacheTests(SimpleTestCase):
+    """Processed days are reused until their CSVs or the resampling config change"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+        self.cache = self.root / 'cache'
+        self.cache.mkdir()
+        self.sample = load_sample_module()
+
+    def make_day(self, base, name):
+        day = self.root / base / 'risky' / name
+        day.mkdir(parents=True)
+        write_sensor_csv(day / 'Accelerometer.csv', [(ms, ms, 0, 9.8) for ms in range(0, 1001, 50)])
+        write_sensor_csv(day / 'Gyroscope.csv', [(ms, 0, 0, ms) for ms in range(5, 1001, 50)])
+        return day
+
+    def run_day(self, day, key, hz=10):
+        return self.sample.run_day((0, day, 1, hz, key, self.cache, None))
+
+    def test_key_follows_content_and_config(self):
+        day = self.make_day('base', 'day1r')
+        index = {}
+        key = self.sample.day_cache_key(day, 1, 10, index)
+        self.assertEqual(len(index), 2)
+
+        # Unchanged size and mtime: the digest comes from the index, not the file
+        with mock.patch.object(self.sample, 'open', create=True, side_effect=AssertionError('re-hashed')):
+            self.assertEqual(self.sample.day_cache_key(day, 1, 10, index), key)
+        self.assertNotEqual(self.sample.day_cache_key(day, 1, 5, index), key)
+        self.assertNotEqual(self.sample.day_cache_key(day, 0, 10, index), key)
+
+        write_sensor_csv(day / 'Gyroscope.csv', [(ms, 0, 0, -ms) for ms in range(5, 1001, 50)])
+        self.assertNotEqual(self.sample.day_cache_key(day, 1, 10, index), key)
+
+    def test_entries_are_reused_and_pruned_per_configuration(self):
+        day = self.make_day('base', 'day1r')
+        other = self.make_day('other', 'day1r')
+        write_sensor_csv(other / 'Gyroscope.csv', [(ms, 0, 0, -ms) for ms in range(5, 1001, 50)])
+
+        def run(day, hz, base):
+            """One sample.py run over a single day: process it, then prune like main()"""
+            key = self.sample.day_cache_key(day, 1, hz, {})
+            rows, hit, _, _ = self.run_day(day, key, hz)
+            deleted = self.sample.prune_cache(self.cache, self.sample.run_scope(self.root / base, hz), [key])
+            return key, rows, hit, deleted
+
+        key, rows, hit, _ = run(day, 10, 'base')
+        self.assertEqual((rows, hit), (9, False))
+        self.assertEqual(run(day, 10, 'base'), (key, 9, True, []))
+
+        # Other data, and the same data at another rate, keep their own entries
+        other_key, _, _, deleted = run(other, 10, 'other')
+        self.assertEqual(deleted, [])
+        slow_key, _, hit, deleted = run(day, 5, 'base')
+        self.assertEqual((hit, deleted), (False, []))
+        self.assertEqual(run(day, 10, 'base'), (key, 9, True, []))
+
+        # A configuration's next run only drops what its previous run used
+        write_sensor_csv(day / 'Gyroscope.csv', [(ms, 0, 0, 2 * ms) for ms in range(5, 1001, 50)])
+        new_key, _, hit, deleted = run(day, 10, 'base')
+        self.assertEqual((hit, deleted), (False, [key]))
+        self.assertEqual(
+            sorted(p.name for p in self.cache.iterdir()), sorted([new_key, other_key, slow_key, self.sample.RUNS_DIR])
+        )
+
+
+class TrainingPipelineTests(SimpleTestCase):
+    """train_models: preprocessing is memoised, the best candidate is written atomically and servable"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+        rng = np.random.default_rng(8)
+        df = pd.DataFrame(rng.normal(size=(600, 7)), columns=SENSOR_FEATURES)
+        df['behavior'] = (df['accel_2'] + df['gyro_3'] > 0).astype(int)
+        self.csv = self.root / 'training_data.csv'
+        df.to_csv(self.csv, index=False)
+
+    def test_train_and_write_artifacts(self):
+        cache = self.root / 'cache'
+        data = prepare('driver_behaviour', self.csv, cache_dir=cache)
+        self.assertTrue(any(cache.rglob('output.pkl')))
+        again = prepare('driver_behaviour', self.csv, cache_dir=cache)
+        np.testing.assert_array_equal(again['X_train'], data['X_train'])
+        self.assertEqual(list(data['scaler'].feature_names_in_), SENSOR_FEATURES)
+
+        candidates = {
+            'small': RandomForestClassifier(n_estimators=5, max_depth=3, random_state=0),
+            'large': RandomForestClassifier(n_estimators=10, max_depth=8, random_state=0),
+        }
+        model, report = train('driver_behaviour', data, candidates=candidates, folds=3, n_jobs=1)
+        self.assertEqual(set(report['candidates']), {'small', 'large'})
+        self.assertEqual(report['chosen'], max(report['candidates'], key=lambda n: report['candidates'][n]['cv_accuracy']))
+        self.assertGreater(report['test_accuracy'], 0.8)
+        self.assertIn('single_p50_ms', report['latency'])
+
+        model_dir = self.root / 'model'
+        write_artifacts('driver_behaviour', model, data, model_dir)
+        self.assertEqual(sorted(p.name for p in model_dir.iterdir()), ['driver_behaviour', 'driver_behaviour.pkl', 'scaler.pkl'])
+        served = load_forest(model_dir / 'driver_behaviour.pkl')
+        self.assertIsInstance(served.threshold, np.memmap)
+        np.testing.assert_array_equal(served.predict_proba(data['X_test']), model.predict_proba(data['X_test']))
+
+    def test_publish_goes_to_the_registry_inside_the_output_dir(self):
+        output_dir = self.root / 'model'
+        output_dir.mkdir()
+        call_command(
+            'train_models', 'driver_behaviour', behaviour_data=str(self.csv), candidates='rf-100-d12', folds=1,
+            jobs=1, no_cache=True, output_dir=str(output_dir), publish='v1', stdout=io.StringIO(),
+        )
+        self.assertEqual(current_version('driver_behaviour', root=output_dir / 'registry'), 'v1')
+
+    def test_compression_keeps_the_smallest_model_within_budget(self):
+        # Enough rows that the ordering and selection sets are not just noise
+        rng = np.random.default_rng(8)
+        df = pd.DataFrame(rng.normal(size=(3000, 7)), columns=SENSOR_FEATURES)
+        df['behavior'] = (df['accel_2'] + df['gyro_3'] > 0).astype(int)
+        df.to_csv(self.csv, index=False)
+        data = prepare('driver_behaviour', self.csv, cache_dir=None)
+        model = RandomForestClassifier(n_estimators=40, max_depth=10, random_state=0).fit(data['X_train'], data['y_train'])
+
+        order = order_trees(model, data['X_test'], data['y_test'], 10)
+        self.assertEqual(len(set(order)), 10)
+        pruned = prune(model, order)
+        self.assertEqual(len(model.estimators_), 40)
+        np.testing.assert_allclose(
+            FlatForest.from_sklearn(pruned).predict_proba(data['X_test']), pruned.predict_proba(data['X_test'])
+        )
+
+        compressed, report = compress(model, data, tree_counts=(10, 3), depths=(4, 2), max_accuracy_drop=0.02, n_jobs=1)
+        points = {point['name']: point for point in report['points']}
+        self.assertEqual(report['reference'], 'refit-40-d10')
+        self.assertEqual(len(points), 9)
+        self.assertTrue(any(point['pareto'] for point in points.values()))
+
+        chosen, reference = points[report['chosen']], points[report['reference']]
+        self.assertGreaterEqual(chosen['validation_accuracy'], reference['validation_accuracy'] - 0.02)
+        self.assertLess(chosen['artifact_bytes'], reference['artifact_bytes'])
+        # The test split is left for the final report
+        self.assertNotIn('test_accuracy', chosen)
+        self.assertEqual(
+            report['ordering_rows'] + report['validation_rows'] + report['confirmation_rows'],
+            round(len(data['y_train']) * 0.2),
+        )
+
+        # The chosen configuration is refitted on the whole training split
+        self.assertEqual((compressed.n_estimators, compressed.max_depth), (chosen['trees'], int(report['chosen'].split('-d')[1])))
+        self.assertEqual(compressed.estimators_[0].tree_.weighted_n_node_samples[0], len(data['y_train']))
+        self.assertGreater(evaluate(compressed, data)['test_accuracy'], 0.8)
+
+        # With an impossible budget the original model is kept
+        compressed, report = compress(model, data, tree_counts=(3,), depths=(2,), max_accuracy_drop=-1, n_jobs=1)
+        self.assertEqual(report['chosen'], report['reference'])
+        self.assertIs(compressed, model)
+
+
+class SlidingWindowTests(SimpleTestCase):
+    """Incremental window statistics must equal pandas on the same window (features_14.csv definitions)"""
+
+    def test_rolling_stats_match_pandas(self):
+        rng = np.random.default_rng(5)
+        values = 9.81 + 0.3 * rng.normal(size=400)
+        values[50:70] = 9.81  # constant stretch: zero variance
+
+        stats = RollingStats(size=14)
+        for i, value in enumerate(values):
+            stats.push(value)
+            if i < 3:
+                continue
+            window = pd.Series(values[max(0, i - 13):i + 1])
+            got = stats.stats()
+            expected = {
+                'Mean': window.mean(), 'Sum': window.sum(), 'Min': window.min(), 'Max': window.max(),
+                'Var': window.var(), 'Cov': window.var(), 'Std': window.std(), 'Median': window.median(),
+                'Skew': window.skew(), 'Kurt': window.kurt(),
+            }
+            for name, value in expected.items():
+                self.assertAlmostEqual(got[name], value, places=7, msg=f'{name} at sample {i}')
+
+    def test_driver_window_feature_layout(self):
+        window = DriverWindow(size=14, min_periods=4)
+        for i in range(3):
+            window.push((i, 0, 0), (0, 0, i))
+            self.assertIsNone(window.features())
+
+        window.push((3, 0, 0), (0, 0, 3))
+        features = dict(zip(WINDOW_FEATURES, window.features()))
+        self.assertEqual(len(features), 60)
+        self.assertEqual(features['AccSumX'], 6.0)
+        self.assertEqual(features['AccMaxX'], 3.0)
+        self.assertEqual(features['GyroMedianZ'], 1.5)
+        self.assertEqual(features['GyroVarX'], 0.0)
+
+    def test_non_finite_samples_are_rejected_without_touching_the_window(self):
+        rng = np.random.default_rng(6)
+        values = rng.normal(size=40)
+        stats = RollingStats(size=14)
+        window = DriverWindow(size=14, min_periods=4)
+        for i, value in enumerate(values):
+            stats.push(value)
+            window.push((value, 0, 0), (0, 0, value))
+            if i % 10 == 5:
+                for bad in (np.nan, np.inf, -np.inf):
+                    with self.assertRaises(ValueError):
+                        stats.push(bad)
+                    with self.assertRaises(ValueError):
+                        window.push((0, 0, 0), (0, 0, bad))
+
+        recent = pd.Series(values[-14:])
+        self.assertAlmostEqual(stats.stats()['Median'], recent.median())
+        self.assertAlmostEqual(stats.stats()['Var'], recent.var())
+        features = dict(zip(WINDOW_FEATURES, window.features()))
+        self.assertAlmostEqual(features['AccMeanX'], recent.mean())
+        self.assertAlmostEqual(features['GyroMedianZ'], recent.median())
+
+    def test_store_evicts_least_recently_used_and_idle_drivers(self):
+        store = WindowStore(max_drivers=2, ttl=60)
+        store.push('a', (0, 0, 0), (0, 0, 0))
+        store.push('b', (0, 0, 0), (0, 0, 0))
+        store.push('a', (0, 0, 0), (0, 0, 0))
+        store.push('c', (0, 0, 0), (0, 0, 0))
+        self.assertEqual(len(store), 2)
+        self.assertIn('a', store)
+        self.assertNotIn('b', store)
+
+        for window in store._windows.values():
+            window.last_seen -= 120
+        store.push('d', (0, 0, 0), (0, 0, 0))
+        self.assertEqual(len(store), 1)
+        self.assertIn('d', store)
+
+
+class BuildFeaturesTests(SimpleTestCase):
+    """data_sampling/build_features.py must reproduce pandas rolling windows over time-aligned sensors"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        spec = importlib.util.spec_from_file_location('data_sampling_build_features', SAMPLE_SCRIPT.parent / 'build_features.py')
+        cls.build = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(cls.build)
+
+    def test_window_features_match_pandas_rolling(self):
+        rng = np.random.default_rng(9)
+        acc = rng.normal(size=(60, 3))
+        gyro = rng.normal(size=(60, 3))
+        gyro[20:40, 1] = 0.5  # constant stretch: zero variance
+
+        got = pd.DataFrame(self.build.window_features(acc, gyro, window=14, stride=1, min_periods=4), columns=WINDOW_FEATURES)
+        # Windows start at every sample and run forward, so they are pandas' trailing windows of the reversed series
+        self.assertEqual(len(got), 60 - 4 + 1)
+        for prefix, values in (('Acc', acc), ('Gyro', gyro)):
+            for axis, name in enumerate('XYZ'):
+                rolling = pd.Series(values[::-1, axis]).rolling(14, min_periods=4)
+                expected = {
+                    'Mean': rolling.mean(), 'Sum': rolling.sum(), 'Min': rolling.min(), 'Max': rolling.max(),
+                    'Var': rolling.var(), 'Cov': rolling.var(), 'Std': rolling.std(), 'Median': rolling.median(),
+                    # Series.skew()/kurt() (0 for a flat window), not rolling.kurt()'s -3
+                    'Skew': rolling.apply(lambda w: pd.Series(w).skew(), raw=True),
+                    'Kurt': rolling.apply(lambda w: pd.Series(w).kurt(), raw=True),
+                }
+                for stat, series in expected.items():
+                    np.testing.assert_allclose(
+                        got[f'{prefix}{stat}{name}'], series.to_numpy()[::-1][:len(got)], atol=1e-7,
+                        err_msg=f'{prefix}{stat}{name}',
+                    )
+
+    def test_gyroscope_is_aligned_to_accelerometer_time(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            day = Path(tmp)
+            stamp = '2020-05-25 18:59:05'
+            # The gyroscope starts later and skips a stretch: pairing by row would shift every reading
+            (day / 'Accelerometer.csv').write_text(
+                'Timestamp,Milliseconds,X,Y,Z\n' + ''.join(f'{stamp},{t},{t},0,0\n' for t in range(0, 1000, 100))
+            )
+            (day / 'Gyroscope.csv').write_text(
+                'Timestamp,Milliseconds,X,Y,Z\n' + ''.join(f'{stamp},{t},0,0,{t}\n' for t in (195, 290, 310, 395, 890))
+            )
+            acc, gyro = self.build.read_aligned(day)
+
+        # 0 and 100 precede the first gyroscope reading; 700 is over 200 ms past the latest (395)
+        np.testing.assert_array_equal(acc[:, 0], [200, 300, 400, 500, 900])
+        np.testing.assert_array_equal(gyro[:, 2], [195, 290, 395, 395, 890])
+        self.assertEqual(acc.dtype, np.float64)
+
+
+class SensorStreamTests(TestCase):
+    """The /ws/sensors/ endpoint, driven through a fake ASGI receive / send pair"""
+
+    async def converse(self, *frames, path='/ws/sensors/', headers=()):
+        events = asyncio.Queue()
+        for event in [{'type': 'websocket.connect'}, *frames, {'type': 'websocket.disconnect'}]:
+            events.put_nowait(event)
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'websocket', 'path': path, 'headers': list(headers)}
+        await asyncio.wait_for(sensor_stream(scope, events.get, send), timeout=5)
+        return sent
+
+    @staticmethod
+    def replies(sent):
+        return [json.loads(message['text']) for message in sent if message['type'] == 'websocket.send']
+
+    async def echo_driver(self, message, driver_id=None, user_id=None):
+        driver_windows.push(driver_id, (0, 0, 0), (0, 0, 0))
+        self.seen.append(driver_id)
+        return {'driver': driver_id, 'user': user_id}
+
+    async def test_anonymous_connection_gets_its_own_window_dropped_on_close(self):
+        self.seen = []
+        with mock.patch('inference.streaming.handle_message', self.echo_driver):
+            sent = await self.converse({'type': 'websocket.receive', 'text': '{"type": "behavior"}'})
+
+        self.assertEqual(sent[0], {'type': 'websocket.accept'})
+        [reply] = self.replies(sent)
+        self.assertTrue(reply['driver'].startswith('conn-'))
+        self.assertIsNone(reply['user'])
+        self.assertNotIn(self.seen[0], driver_windows)
+
+    async def test_session_cookie_identifies_the_driver(self):
+        user = await User.objects.acreate(username='driver')
+        await self.async_client.aforce_login(user)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={self.async_client.cookies[settings.SESSION_COOKIE_NAME].value}'.encode()
+
+        self.seen = []
+        with mock.patch('inference.streaming.handle_message', self.echo_driver):
+            sent = await self.converse({'type': 'websocket.receive', 'text': '{}'}, headers=[(b'cookie', cookie)])
+
+        [reply] = self.replies(sent)
+        self.assertEqual(reply['driver'], f'user-{user.pk}')
+        # Logged-in drivers keep their window for the next connection
+        self.assertIn(f'user-{user.pk}', driver_windows)
+        driver_windows.discard(f'user-{user.pk}')
+
+    async def test_malformed_frames_get_an_error_and_keep_the_socket_open(self):
+        sent = await self.converse(
+            {'type': 'websocket.receive', 'text': 'not json'},
+            {'type': 'websocket.receive', 'text': '[1, 2]'},
+            {'type': 'websocket.receive', 'text': '{"type": "speeding"}'},
+            {'type': 'websocket.receive', 'text': '{"type": "behavior", "samples": []}'},
+            {'type': 'websocket.receive', 'bytes': wire.MAGIC + b'truncated'},
+        )
+        replies = self.replies(sent)
+        self.assertEqual(len(replies), 5)
+        self.assertIn('Invalid message', replies[0]['error'])
+        self.assertIn('Expected a JSON object', replies[1]['error'])
+        self.assertIn("Unknown message type 'speeding'", replies[2]['error'])
+        self.assertIn('Expected a list of 1 to', replies[3]['error'])
+        self.assertIn('error', replies[4])
+        self.assertFalse(any(message['type'] == 'websocket.close' for message in sent))
+
+    async def test_other_paths_are_closed(self):
+        sent = await self.converse(path='/ws/elsewhere/')
+        self.assertEqual(sent, [{'type': 'websocket.close', 'code': 4404}])
@@ -0,0 +1,306 @@
+import hashlib
+import importlib.util
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from .features import ACCIDENT_FEATURES, SENSOR_FEATURES
+from .forest import FlatForest, artifact_dir
+from .registry import publish
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+MODEL_DIR = BASE_DIR / 'model'
+REPORT_FILE = 'training_report.json'
+
+# Inputs: data_sampling/sample.py's binary cache is preferred over re-parsing its CSV export
+PROJECT_DIR = BASE_DIR.parent
+SAMPLE_SCRIPT = PROJECT_DIR / 'data_sampling' / 'sample.py'
+SAMPLE_CACHE_DIR = PROJECT_DIR / 'data_sampling' / 'cache'
+BEHAVIOUR_CSVS = [PROJECT_DIR / 'DATASET' / 'training_data.csv', PROJECT_DIR / 'data_sampling' / 'final_training_data.csv']
+ACCIDENTS_CSV = PROJECT_DIR / 'DATASET' / 'AccidentsBig.csv'
+
+ACCIDENT_TARGET = "Accident_Severity"
+
+# Candidates are sklearn forests only: serving flattens them into a FlatForest.
+# The first entry of each is the configuration main.ipynb trained.
+BEHAVIOUR_CANDIDATES = {
+    'rf-200-d15': RandomForestClassifier(
+        n_estimators=200, max_depth=15, min_samples_split=5, class_weight='balanced', random_state=42
+    ),
+    'rf-100-d12': RandomForestClassifier(
+        n_estimators=100, max_depth=12, min_samples_split=5, class_weight='balanced', random_state=42
+    ),
+    'extra-200-d15': ExtraTreesClassifier(
+        n_estimators=200, max_depth=15, min_samples_split=5, class_weight='balanced', random_state=42
+    ),
+}
+SEVERITY_CANDIDATES = {
+    'rf-200': RandomForestClassifier(n_estimators=200, random_state=42),
+    'rf-100-d20': RandomForestClassifier(n_estimators=100, max_depth=20, random_state=42),
+}
+
+# Fitted preprocessing (split + scaler / label encoders) is cached here, keyed by the input's fingerprint
+CACHE_DIR = MODEL_DIR / '.train_cache'
+LATENCY_ROUNDS = 200
+LATENCY_BATCH = 1000
+
+
+def default_behaviour_source():
+    """The sample.py cache if it has been built, else the first behaviour CSV that exists"""
+    if (SAMPLE_CACHE_DIR / 'dataset.json').exists():
+        return SAMPLE_CACHE_DIR
+    return next((path for path in BEHAVIOUR_CSVS if path.exists()), BEHAVIOUR_CSVS[0])
+
+
+def fingerprint(source):
+    """Changes whenever the training input does (content hash of the cache index, or size/mtime of a CSV)"""
+    source = Path(source)
+    if source.is_dir():
+        return hashlib.sha256((source / 'dataset.json').read_bytes()).hexdigest()
+    stat = source.stat()
+    return f'{stat.st_size}-{stat.st_mtime_ns}'
+
+
+def load_sample_module():
+    """data_sampling/sample.py as a module (it is a script, not part of a package)"""
+    spec = importlib.util.spec_from_file_location('data_sampling_sample', SAMPLE_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def read_behaviour_table(source):
+    """The behaviour training rows, cleaned like main.ipynb: sensor features + behavior, NaN rows dropped"""
+    source = Path(source)
+    if source.is_dir():
+        df = load_sample_module().load_dataset(source, shuffle=False)
+    else:
+        df = pd.read_csv(source, usecols=SENSOR_FEATURES + ['behavior'])
+    df = df[SENSOR_FEATURES + ['behavior']].copy()
+    df['proximity'] = pd.to_numeric(df['proximity'], errors='coerce').fillna(0)
+    return df.dropna()
+
+
+def read_accident_table(source):
+    """The accident severity rows, label-encoding any text columns like main.ipynb"""
+    df = pd.read_csv(source, usecols=ACCIDENT_FEATURES + [ACCIDENT_TARGET]).dropna()
+    label_encoders = {}
+    for col in df.columns:
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            le = LabelEncoder()
+            df[col] = le.fit_transform(df[col])
+            label_encoders[col] = le
+    return df, label_encoders
+
+
+def _prepare_behaviour(source, source_fingerprint, test_size, seed):
+    df = read_behaviour_table(source)
+    X_train, X_test, y_train, y_test = train_test_split(
+        df[SENSOR_FEATURES], df['behavior'], test_size=test_size, random_state=seed, stratify=df['behavior']
+    )
+    # Fitted once on the training split and reused for every candidate and for serving
+    scaler = StandardScaler().fit(X_train)
+    return {
+        'X_train': scaler.transform(X_train), 'X_test': scaler.transform(X_test),
+        'y_train': y_train.to_numpy(), 'y_test': y_test.to_numpy(),
+        'features': SENSOR_FEATURES, 'scaler': scaler, 'label_encoders': None, 'rows': len(df),
+    }
+
+
+def _prepare_severity(source, source_fingerprint, test_size, seed):
+    df, label_encoders = read_accident_table(source)
+    X_train, X_test, y_train, y_test = train_test_split(
+        df[ACCIDENT_FEATURES], df[ACCIDENT_TARGET], test_size=test_size, random_state=seed
+    )
+    return {
+        'X_train': X_train.to_numpy(dtype=np.float64), 'X_test': X_test.to_numpy(dtype=np.float64),
+        'y_train': y_train.to_numpy(), 'y_test': y_test.to_numpy(),
+        'features': ACCIDENT_FEATURES, 'scaler': None, 'label_encoders': label_encoders, 'rows': len(df),
+    }
+
+
+# name -> (prepare function, candidates, model file, data source default)
+TASKS = {
+    'driver_behaviour': (_prepare_behaviour, BEHAVIOUR_CANDIDATES, 'driver_behaviour.pkl', default_behaviour_source),
+    'accident_severity': (_prepare_severity, SEVERITY_CANDIDATES, 'accident_severity_model.pkl', lambda: ACCIDENTS_CSV),
+}
+
+
+def prepare(task, source, test_size=0.2, seed=42, cache_dir=CACHE_DIR):
+    """
+    Read and preprocess a task's data once.
+
+    The result (split arrays plus the fitted scaler / encoders) is memoised
+    on disk by joblib.Memory, keyed by the input's fingerprint and the split
+    settings, so retraining on unchanged data skips straight to fitting.
+    """
+    function = TASKS[task][0]
+    if cache_dir is not None:
+        function = joblib.Memory(str(cache_dir), verbose=0).cache(function)
+    return function(str(source), fingerprint(source), test_size, seed)
+
+
+def _fit_fold(name, estimator, X, y, train, test):
+    estimator = clone(estimator).set_params(n_jobs=1)
+    started = time.perf_counter()
+    estimator.fit(X[train], y[train])
+    fit_seconds = time.perf_counter() - started
+    return name, float((estimator.predict(X[test]) == y[test]).mean()), fit_seconds
+
+
+def cross_validate(candidates, X, y, folds=5, n_jobs=-1, seed=42):
+    """
+    Cross-validated accuracy of every candidate.
+
+    Each (candidate, fold) fit is an independent job, so all of them are
+    spread over the cores at once instead of one candidate at a time.
+    """
+    splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed).split(X, y))
+    jobs = [
+        joblib.delayed(_fit_fold)(name, estimator, X, y, train, test)
+        for name, estimator in candidates.items() for train, test in splits
+    ]
+    results = {name: {'scores': [], 'fit_seconds': []} for name in candidates}
+    for name, score, fit_seconds in joblib.Parallel(n_jobs=n_jobs)(jobs):
+        results[name]['scores'].append(score)
+        results[name]['fit_seconds'].append(fit_seconds)
+    return {
+        name: {
+            'cv_accuracy': float(np.mean(result['scores'])),
+            'cv_std': float(np.std(result['scores'])),
+            'fit_seconds': float(np.mean(result['fit_seconds'])),
+        }
+        for name, result in results.items()
+    }
+
+
+def measure_latency(forest, X, rounds=LATENCY_ROUNDS, batch=LATENCY_BATCH):
+    """Serving-path latency of a FlatForest: single-row p50/p99 in ms and batched µs per row"""
+    forest.predict_proba(X[:64])
+    single = []
+    for i in range(rounds):
+        row = X[i % len(X)][np.newaxis, :]
+        started = time.perf_counter()
+        forest.predict_proba(row)
+        single.append(time.perf_counter() - started)
+    rows = X[np.arange(batch) % len(X)]
+    started = time.perf_counter()
+    forest.predict_proba(rows)
+    batched = time.perf_counter() - started
+    single = np.array(single) * 1000
+    return {
+        'single_p50_ms': float(np.percentile(single, 50)),
+        'single_p99_ms': float(np.percentile(single, 99)),
+        'batch_us_per_row': batched / batch * 1e6,
+    }
+
+
+def train(task, data, candidates=None, folds=5, n_jobs=-1, seed=42):
+    """
+    Cross-validate the candidates, refit the best on the whole training split
+    and evaluate it on the held-out split. Returns (fitted model, report).
+    """
+    candidates = candidates or TASKS[task][1]
+    X_train, y_train = data['X_train'], data['y_train']
+
+    started = time.perf_counter()
+    if len(candidates) > 1 and folds > 1:
+        cv = cross_validate(candidates, X_train, y_train, folds=folds, n_jobs=n_jobs, seed=seed)
+        chosen = max(cv, key=lambda name: cv[name]['cv_accuracy'])
+    else:
+        cv, chosen = {}, next(iter(candidates))
+    cv_seconds = time.perf_counter() - started
+
+    model = clone(candidates[chosen]).set_params(n_jobs=n_jobs)
+    started = time.perf_counter()
+    model.fit(X_train, y_train)
+    train_seconds = time.perf_counter() - started
+
+    report = {
+        'rows': data['rows'],
+        'candidates': cv,
+        'chosen': chosen,
+        'cv_seconds': cv_seconds,
+        'train_seconds': train_seconds,
+        **evaluate(model, data),
+    }
+    return model, report
+
+
+def evaluate(model, data):
+    """Held-out accuracy, serving latency and size of a fitted forest, as reported by train()"""
+    forest = FlatForest.from_sklearn(model)
+    return {
+        'params': {key: value for key, value in model.get_params().items() if key != 'n_jobs'},
+        'test_accuracy': float((forest.predict(data['X_test']) == data['y_test']).mean()),
+        'latency': measure_latency(forest, data['X_test'] if len(data['X_test']) else data['X_train']),
+        'trees': len(forest.roots),
+        'nodes': len(forest.feature),
+    }
+
+
+def _atomic_dump(obj, path):
+    """joblib.dump into a temporary file next to `path`, then rename it over `path`"""
+    fd, tmp = tempfile.mkstemp(prefix=f'.{path.name}-', dir=path.parent)
+    os.close(fd)
+    try:
+        joblib.dump(obj, tmp)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def write_artifacts(task, model, data, model_dir=MODEL_DIR):
+    """
+    Replace a task's files in model/ atomically: the pickle, its memory-mapped
+    export (written last, so load_forest() sees it as fresh) and the fitted
+    scaler or label encoders. Returns the paths written.
+    """
+    model_dir = Path(model_dir)
+    model_dir.mkdir(parents=True, exist_ok=True)
+    model_path = model_dir / TASKS[task][2]
+    written = [model_path]
+
+    _atomic_dump(model, model_path)
+    if data['scaler'] is not None:
+        _atomic_dump(data['scaler'], model_dir / 'scaler.pkl')
+        written.append(model_dir / 'scaler.pkl')
+    if data['label_encoders'] is not None:
+        _atomic_dump(data['label_encoders'], model_dir / 'label_encoders.pkl')
+        written.append(model_dir / 'label_encoders.pkl')
+    FlatForest.from_sklearn(model).save(artifact_dir(model_path))
+    written.append(artifact_dir(model_path))
+    return written
+
+
+def publish_version(task, version, model, data, root=None):
+    """Also store the trained model as a registry version (served after the next poll)"""
+    kwargs = {'root': root} if root is not None else {}
+    return publish(
+        task, version, model, data['features'],
+        scaler=data['scaler'], label_encoders=data['label_encoders'], **kwargs
+    )
+
+
+def write_report(reports, model_dir=MODEL_DIR):
+    """Record accuracy, training time and latency of this run in model/training_report.json"""
+    path = Path(model_dir) / REPORT_FILE
+    fd, tmp = tempfile.mkstemp(prefix=f'.{path.name}-', dir=path.parent)
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'created': datetime.now(timezone.utc).isoformat(), 'models': reports}, f, indent=2, default=str)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+    return path
@@ -0,0 +1,32 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from . import metrics
+from .serving import behaviour_model, severity_model, window_model
+
+# Set by reverse proxies and tunnels, whose own connection comes from a local address
+FORWARDING_HEADERS = ('HTTP_X_FORWARDED_FOR', 'HTTP_FORWARDED', 'HTTP_X_REAL_IP', 'HTTP_X_FORWARDED_HOST')
+
+
+def _metrics_allowed(request):
+    token = settings.METRICS_TOKEN
+    if token:
+        scheme, _, given = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() == 'bearer' and hmac.compare_digest(given.encode(), token.encode()):
+            return True
+    if any(header in request.META for header in FORWARDING_HEADERS):
+        return False
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_HOSTS
+
+
+def metrics_view(request):
+    """
+    Prometheus text exposition of the inference metrics, for direct connections
+    from METRICS_ALLOWED_HOSTS or requests carrying the METRICS_TOKEN bearer token
+    """
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+    body = metrics.render(models=(behaviour_model, severity_model, window_model))
+    return HttpResponse(body, content_type=metrics.CONTENT_TYPE)
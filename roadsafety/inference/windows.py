@@ -0,0 +1,267 @@
+import math
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict, deque
+
+import numpy as np
+
+# Column layout of DATASET/Driver Behavior dataset/features_14.csv (note Sum/Kurt swap places for Gyro)
+ACC_STATS = ['Mean', 'Cov', 'Skew', 'Kurt', 'Sum', 'Min', 'Max', 'Var', 'Median', 'Std']
+GYRO_STATS = ['Mean', 'Cov', 'Skew', 'Sum', 'Kurt', 'Min', 'Max', 'Var', 'Median', 'Std']
+AXES = ['X', 'Y', 'Z']
+WINDOW_FEATURES = (
+    [f'Acc{stat}{axis}' for stat in ACC_STATS for axis in AXES]
+    + [f'Gyro{stat}{axis}' for stat in GYRO_STATS for axis in AXES]
+)
+
+# features_14.csv uses 14-sample windows; its shortest (end-of-trip) windows hold 4 samples
+WINDOW_SIZE = 14
+MIN_PERIODS = 4
+
+# Power sums are recomputed from the window this often to stop rounding drift accumulating
+RESYNC_EVERY = 1024
+
+
+def window_stats(windows):
+    """
+    All per-window statistics for a (n_windows, window) block, without a Python loop per window.
+
+    The batch counterpart of RollingStats, used to build whole training
+    tables (data_sampling/build_features.py). Short tail windows are
+    NaN-padded, so every reduction is NaN-aware and uses the per-window
+    sample count; the definitions are the same pandas ones.
+    """
+    # One sort per block gives min, max and median; NaN padding sorts to the end of each row
+    ordered = np.sort(windows, axis=1)
+    count = np.count_nonzero(~np.isnan(windows), axis=1)
+    lower = np.take_along_axis(ordered, ((count - 1) // 2)[:, np.newaxis], axis=1)[:, 0]
+    upper = np.take_along_axis(ordered, (count // 2)[:, np.newaxis], axis=1)[:, 0]
+
+    n = count.astype(np.float64)
+    total = np.nansum(windows, axis=1)
+    mean = total / n
+    d = windows - mean[:, np.newaxis]
+    d2 = d * d
+    m2 = np.nansum(d2, axis=1)
+    m3 = np.nansum(d2 * d, axis=1)
+    m4 = np.nansum(d2 * d2, axis=1)
+    m2[m2 < 1e-14] = 0.0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var = m2 / (n - 1)
+        skew = np.where(m2 == 0, 0.0, n * np.sqrt(n - 1) / (n - 2) * m3 / m2 ** 1.5)
+        kurt = np.where(
+            m2 == 0, 0.0,
+            n * (n + 1) * (n - 1) * m4 / ((n - 2) * (n - 3) * m2 * m2) - 3 * (n - 1) ** 2 / ((n - 2) * (n - 3))
+        )
+
+    return {
+        'Mean': mean,
+        'Cov': var,
+        'Skew': skew,
+        'Kurt': kurt,
+        'Sum': total,
+        'Min': ordered[:, 0],
+        'Max': np.take_along_axis(ordered, (count - 1)[:, np.newaxis], axis=1)[:, 0],
+        'Var': var,
+        'Median': (lower + upper) / 2,
+        'Std': np.sqrt(var),
+    }
+
+
+class RollingStats:
+    """
+    Sliding-window statistics of one sensor axis, updated in O(1) per sample.
+
+    Mean/Var/Skew/Kurt come from running power sums (shifted by the first
+    value seen, to limit cancellation), Min/Max from monotonic deques and the
+    Median from a small sorted copy of the window. Definitions match pandas:
+    Var/Cov/Std use ddof=1, Skew and Kurt are the bias-corrected estimators
+    that Series.skew() / Series.kurt() return.
+    """
+
+    def __init__(self, size=WINDOW_SIZE):
+        self.size = size
+        self.values = deque()
+        self.ordered = []
+        self.min_queue = deque()
+        self.max_queue = deque()
+        self.shift = None
+        self.sums = [0.0, 0.0, 0.0, 0.0]
+        self.count = 0  # samples pushed in total, used to index the monotonic deques
+        self.updates = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def push(self, x):
+        x = float(x)
+        if not math.isfinite(x):
+            # One NaN would poison the power sums and the sorted copy until the window is rebuilt
+            raise ValueError(f'Window samples must be finite, got {x}')
+        if self.shift is None:
+            self.shift = x
+
+        if len(self.values) == self.size:
+            old = self.values.popleft()
+            del self.ordered[bisect_left(self.ordered, old)]
+            self._accumulate(old - self.shift, -1.0)
+            expired = self.count - self.size
+            if self.min_queue[0][0] == expired:
+                self.min_queue.popleft()
+            if self.max_queue[0][0] == expired:
+                self.max_queue.popleft()
+
+        self.values.append(x)
+        insort(self.ordered, x)
+        self._accumulate(x - self.shift, 1.0)
+        while self.min_queue and self.min_queue[-1][1] >= x:
+            self.min_queue.pop()
+        self.min_queue.append((self.count, x))
+        while self.max_queue and self.max_queue[-1][1] <= x:
+            self.max_queue.pop()
+        self.max_queue.append((self.count, x))
+        self.count += 1
+
+        self.updates += 1
+        if self.updates % RESYNC_EVERY == 0:
+            self._resync()
+
+    def _accumulate(self, y, sign):
+        y2 = y * y
+        self.sums[0] += sign * y
+        self.sums[1] += sign * y2
+        self.sums[2] += sign * y2 * y
+        self.sums[3] += sign * y2 * y2
+
+    def _resync(self):
+        self.shift = self.values[-1]
+        y = np.fromiter(self.values, dtype=np.float64, count=len(self.values)) - self.shift
+        self.sums = [float(y.sum()), float((y ** 2).sum()), float((y ** 3).sum()), float((y ** 4).sum())]
+
+    def stats(self):
+        """Dict of Mean/Cov/Skew/Kurt/Sum/Min/Max/Var/Median/Std over the current window"""
+        n = len(self.values)
+        s1, s2, s3, s4 = self.sums
+        mean_y = s1 / n
+
+        # Central moment sums (sum of (x - mean)^k) from the shifted power sums
+        m2 = s2 - n * mean_y * mean_y
+        m3 = s3 - 3 * mean_y * s2 + 2 * n * mean_y ** 3
+        m4 = s4 - 4 * mean_y * s3 + 6 * mean_y * mean_y * s2 - 3 * n * mean_y ** 4
+        if m2 <= 1e-14 * max(1.0, s2):
+            m2 = m3 = m4 = 0.0
+
+        var = m2 / (n - 1) if n > 1 else math.nan
+        if n < 3:
+            skew = math.nan
+        else:
+            skew = 0.0 if m2 == 0 else n * math.sqrt(n - 1) / (n - 2) * m3 / m2 ** 1.5
+        if n < 4:
+            kurt = math.nan
+        else:
+            kurt = 0.0 if m2 == 0 else (
+                n * (n + 1) * (n - 1) * m4 / ((n - 2) * (n - 3) * m2 * m2)
+                - 3 * (n - 1) ** 2 / ((n - 2) * (n - 3))
+            )
+
+        mid = n // 2
+        median = self.ordered[mid] if n % 2 else (self.ordered[mid - 1] + self.ordered[mid]) / 2
+        return {
+            'Mean': mean_y + self.shift,
+            'Cov': var,
+            'Skew': skew,
+            'Kurt': kurt,
+            'Sum': s1 + n * self.shift,
+            'Min': self.min_queue[0][1],
+            'Max': self.max_queue[0][1],
+            'Var': var,
+            'Median': median,
+            'Std': math.sqrt(var) if var >= 0 else math.nan,
+        }
+
+
+class DriverWindow:
+    """The accelerometer and gyroscope windows of one driver"""
+
+    def __init__(self, size=WINDOW_SIZE, min_periods=MIN_PERIODS):
+        self.min_periods = min_periods
+        self.acc = [RollingStats(size) for _ in AXES]
+        self.gyro = [RollingStats(size) for _ in AXES]
+        self.last_seen = time.monotonic()
+
+    def push(self, acc, gyro):
+        # Checked up front so a bad value leaves every axis as it was
+        if not all(math.isfinite(value) for value in (*acc, *gyro)):
+            raise ValueError('Window samples must be finite')
+        for stats, value in zip(self.acc, acc):
+            stats.push(value)
+        for stats, value in zip(self.gyro, gyro):
+            stats.push(value)
+        self.last_seen = time.monotonic()
+
+    def ready(self):
+        return len(self.acc[0]) >= self.min_periods
+
+    def features(self):
+        """The 60 window features in WINDOW_FEATURES order, or None until min_periods samples arrived"""
+        if not self.ready():
+            return None
+        acc = [stats.stats() for stats in self.acc]
+        gyro = [stats.stats() for stats in self.gyro]
+        return np.array(
+            [acc[i][stat] for stat in ACC_STATS for i in range(len(AXES))]
+            + [gyro[i][stat] for stat in GYRO_STATS for i in range(len(AXES))],
+            dtype=np.float64
+        )
+
+
+class WindowStore:
+    """
+    Bounded in-memory map of driver id -> DriverWindow.
+
+    Entries are kept in least-recently-used order; beyond `max_drivers` the
+    oldest is dropped, and drivers idle for longer than `ttl` seconds are
+    expired as new samples arrive. Both checks only look at the front of the
+    order, so they cost O(1) amortised per sample.
+    """
+
+    def __init__(self, max_drivers=10000, ttl=600.0, size=WINDOW_SIZE, min_periods=MIN_PERIODS):
+        self.max_drivers = max_drivers
+        self.ttl = ttl
+        self.size = size
+        self.min_periods = min_periods
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._windows)
+
+    def __contains__(self, driver_id):
+        return driver_id in self._windows
+
+    def push(self, driver_id, acc, gyro):
+        """Add one sample to a driver's window and return its current features (or None)"""
+        with self._lock:
+            window = self._windows.pop(driver_id, None)
+            if window is None:
+                window = DriverWindow(self.size, self.min_periods)
+            self._windows[driver_id] = window
+            window.push(acc, gyro)
+            features = window.features()
+            self._evict(window.last_seen)
+        return features
+
+    def discard(self, driver_id):
+        with self._lock:
+            self._windows.pop(driver_id, None)
+
+    def _evict(self, now):
+        while len(self._windows) > self.max_drivers:
+            self._windows.popitem(last=False)
+        while self._windows:
+            oldest = next(iter(self._windows.values()))
+            if now - oldest.last_seen <= self.ttl:
+                break
+            self._windows.popitem(last=False)
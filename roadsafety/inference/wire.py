@@ -0,0 +1,71 @@
+import struct
+
+import numpy as np
+
+from .features import FORM_FIELDS, SENSOR_FEATURES
+
+# Packed alternative to the JSON / form bodies of the prediction endpoints:
+#
+#   header   2s magic b'RS' | u8 schema version | u8 record type | u32 record count
+#   records  count x len(SCHEMAS[type]) little-endian float32, row-major
+#
+# so a batch of 100 sensor samples is 8 + 100 * 28 bytes instead of ~15 kB of JSON
+CONTENT_TYPE = 'application/vnd.roadsafety.records'
+MAGIC = b'RS'
+VERSION = 1
+HEADER = struct.Struct('<2sBBI')
+VALUE_DTYPE = np.dtype('<f4')
+
+BEHAVIOUR = 1
+SEVERITY = 2
+SCHEMAS = {
+    BEHAVIOUR: list(SENSOR_FEATURES),
+    SEVERITY: [field for field, _ in FORM_FIELDS.values()],
+}
+
+
+class WireFormatError(ValueError):
+    pass
+
+
+def encode(records, record_type):
+    """Pack a (count, len(SCHEMAS[record_type])) array of records"""
+    values = np.ascontiguousarray(records, dtype=VALUE_DTYPE)
+    if values.ndim != 2 or values.shape[1] != len(SCHEMAS[record_type]):
+        raise WireFormatError(f'Expected records of {len(SCHEMAS[record_type])} values')
+    return HEADER.pack(MAGIC, VERSION, record_type, len(values)) + values.tobytes()
+
+
+def decode(body, record_type, max_count=None):
+    """
+    Unpack a body written by encode() into a read-only (count, n_fields)
+    float32 array that is a view over `body` (no per-value parsing or copying).
+    Bodies holding a NaN or infinite value are rejected.
+    """
+    if len(body) < HEADER.size:
+        raise WireFormatError('Truncated header')
+    magic, version, kind, count = HEADER.unpack_from(body)
+    if magic != MAGIC:
+        raise WireFormatError('Not a roadsafety records body')
+    if version != VERSION:
+        raise WireFormatError(f'Unsupported schema version {version} (expected {VERSION})')
+    if kind != record_type:
+        raise WireFormatError(f'Expected record type {record_type}, got {kind}')
+    if count == 0:
+        raise WireFormatError('Expected at least one record')
+    if max_count is not None and count > max_count:
+        raise WireFormatError(f'Too many records ({count} > {max_count})')
+
+    width = len(SCHEMAS[kind])
+    if len(body) != HEADER.size + count * width * VALUE_DTYPE.itemsize:
+        raise WireFormatError(f'Body length does not match {count} records of {width} values')
+    records = np.frombuffer(body, dtype=VALUE_DTYPE, count=count * width, offset=HEADER.size).reshape(count, width)
+    if not np.isfinite(records).all():
+        raise WireFormatError('Records must hold finite values')
+    return records
+
+
+def as_dicts(records, record_type):
+    """Decoded records as the dicts the JSON / form payloads carry"""
+    fields = SCHEMAS[record_type]
+    return [dict(zip(fields, row)) for row in records.tolist()]
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from monitor.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute every trip\'s risk totals and the per-driver daily rollups (DriverDay) from the stored '
+        'readings, e.g. after changing how they are aggregated or importing readings directly. Safe with the '
+        'server running: telemetry writes wait for the rebuild and then add to the rebuilt totals'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Readings fetched per query')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        trips, days = rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {trips} trips and {days} driver-days in {time.perf_counter() - started:.1f}s'
+        ))
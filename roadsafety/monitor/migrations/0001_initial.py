@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trip',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('driver', models.CharField(max_length=64)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ended_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='trips', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Reading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('kind', models.CharField(choices=[('behavior', 'Driver behaviour'), ('safety', 'Accident severity')], max_length=8)),
+                ('accel_2', models.FloatField(blank=True, null=True)),
+                ('accel_3', models.FloatField(blank=True, null=True)),
+                ('accel_4', models.FloatField(blank=True, null=True)),
+                ('gyro_2', models.FloatField(blank=True, null=True)),
+                ('gyro_3', models.FloatField(blank=True, null=True)),
+                ('gyro_4', models.FloatField(blank=True, null=True)),
+                ('proximity', models.FloatField(blank=True, null=True)),
+                ('risky', models.BooleanField(blank=True, null=True)),
+                ('risky_probability', models.FloatField(blank=True, null=True)),
+                ('speed', models.FloatField(blank=True, null=True)),
+                ('severity', models.SmallIntegerField(blank=True, null=True)),
+                ('model_version', models.CharField(blank=True, max_length=64)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='readings', to=settings.AUTH_USER_MODEL)),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='readings', to='monitor.trip')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['user', 'started_at'], name='monitor_tri_user_id_f2703f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['driver', 'ended_at'], name='monitor_tri_driver_c281e0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reading',
+            index=models.Index(fields=['user', 'trip', 'timestamp'], name='monitor_rea_user_id_91d6f0_idx'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='behaviour_samples',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='high_risk_predictions',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='last_risky',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='max_speed',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='risky_events',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='risky_samples',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='safety_samples',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='DriverDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('behaviour_samples', models.PositiveIntegerField(default=0)),
+                ('risky_samples', models.PositiveIntegerField(default=0)),
+                ('risky_events', models.PositiveIntegerField(default=0)),
+                ('safety_samples', models.PositiveIntegerField(default=0)),
+                ('high_risk_predictions', models.PositiveIntegerField(default=0)),
+                ('max_speed', models.FloatField(blank=True, null=True)),
+                ('driver', models.CharField(max_length=64)),
+                ('day', models.DateField()),
+                ('trips', models.PositiveIntegerField(default=0)),
+                ('driving_seconds', models.FloatField(default=0.0)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='driver_days', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'day'], name='monitor_dri_user_id_887ee5_idx'), models.Index(fields=['day', 'risky_events'], name='monitor_dri_day_f3e0ca_idx')],
+                'constraints': [models.UniqueConstraint(fields=('driver', 'day'), name='unique_driver_day')],
+            },
+        ),
+    ]
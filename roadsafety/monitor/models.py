@@ -1,3 +1,114 @@
 from django.db import models
+from django.contrib.auth.models import User
+from django.utils import timezone
 
-# Create your models here.
+
+class RiskTotals(models.Model):
+    """
+    Running aggregates of the predictions made for a driver, kept up to date
+    by the telemetry writer as readings are stored (see monitor.rollups)
+    """
+    behaviour_samples = models.PositiveIntegerField(default=0)
+    risky_samples = models.PositiveIntegerField(default=0)
+    # Runs of consecutive risky samples, e.g. one harsh braking manoeuvre
+    risky_events = models.PositiveIntegerField(default=0)
+    safety_samples = models.PositiveIntegerField(default=0)
+    # Severity predictions the monitor page shows as high risk
+    high_risk_predictions = models.PositiveIntegerField(default=0)
+    max_speed = models.FloatField(blank=True, null=True)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def risky_fraction(self):
+        return self.risky_samples / self.behaviour_samples if self.behaviour_samples else 0.0
+
+
+class Trip(RiskTotals):
+    """
+    One continuous stretch of telemetry from a driver.
+
+    `driver` is the same key the sliding windows use ("user-<id>",
+    "driver-<id>" or "conn-<uuid>"); a new trip starts after
+    monitor.telemetry.TRIP_IDLE_SECONDS without readings.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='trips', blank=True, null=True)
+    driver = models.CharField(max_length=64)
+    started_at = models.DateTimeField(default=timezone.now)
+    ended_at = models.DateTimeField(default=timezone.now)
+    # Whether the last behaviour sample was risky, so a risky run spanning two flushes counts once
+    last_risky = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'started_at']),
+            models.Index(fields=['driver', 'ended_at']),
+        ]
+
+    @property
+    def duration(self):
+        return self.ended_at - self.started_at
+
+    def __str__(self):
+        return f'{self.driver} trip {self.started_at:%Y-%m-%d %H:%M}'
+
+
+class DriverDay(RiskTotals):
+    """A driver's totals for one (UTC) day, across all their trips that day"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='driver_days', blank=True, null=True)
+    driver = models.CharField(max_length=64)
+    day = models.DateField()
+    # Trips started that day
+    trips = models.PositiveIntegerField(default=0)
+    # Time between consecutive readings of a trip, i.e. time spent driving
+    driving_seconds = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['driver', 'day'], name='unique_driver_day'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'day']),
+            models.Index(fields=['day', 'risky_events']),
+        ]
+
+    def __str__(self):
+        return f'{self.driver} on {self.day:%Y-%m-%d}'
+
+
+class Reading(models.Model):
+    """A sensor sample or monitor form submission together with the prediction it received"""
+    BEHAVIOR = 'behavior'
+    SAFETY = 'safety'
+    KIND_CHOICES = [(BEHAVIOR, 'Driver behaviour'), (SAFETY, 'Accident severity')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='readings', blank=True, null=True)
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='readings')
+    timestamp = models.DateTimeField()
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+
+    # Behaviour samples
+    accel_2 = models.FloatField(blank=True, null=True)
+    accel_3 = models.FloatField(blank=True, null=True)
+    accel_4 = models.FloatField(blank=True, null=True)
+    gyro_2 = models.FloatField(blank=True, null=True)
+    gyro_3 = models.FloatField(blank=True, null=True)
+    gyro_4 = models.FloatField(blank=True, null=True)
+    proximity = models.FloatField(blank=True, null=True)
+    risky = models.BooleanField(blank=True, null=True)
+    risky_probability = models.FloatField(blank=True, null=True)
+
+    # Accident severity requests
+    speed = models.FloatField(blank=True, null=True)
+    severity = models.SmallIntegerField(blank=True, null=True)
+
+    model_version = models.CharField(max_length=64, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'trip', 'timestamp']),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} reading at {self.timestamp:%Y-%m-%d %H:%M:%S}'
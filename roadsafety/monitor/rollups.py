@@ -0,0 +1,148 @@
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import DriverDay, Reading, Trip
+
+# Severity the monitor page shows as "High Risk"
+HIGH_RISK_SEVERITY = 1
+
+COUNTERS = ('behaviour_samples', 'risky_samples', 'risky_events', 'safety_samples', 'high_risk_predictions')
+# Trip columns update_trips() sets to the trip's latest state; its COUNTERS are added to instead
+TRIP_FIELDS = ('ended_at', 'last_risky')
+# DriverDay columns added to (max_speed: raised to) by upsert_days()
+DAY_INCREMENTS = ('trips', 'driving_seconds') + COUNTERS
+
+
+def day_of(timestamp):
+    return timezone.localtime(timestamp).date()
+
+
+def fold(trip, day, kind, fields, seconds):
+    """
+    Add one reading to its trip's and its driver-day's running totals, both
+    updated in place; `seconds` is the time since the trip's previous reading.
+    """
+    day.driving_seconds += seconds
+    if kind == Reading.BEHAVIOR:
+        risky = bool(fields.get('risky'))
+        event = risky and not trip.last_risky
+        trip.last_risky = risky
+        for totals in (trip, day):
+            totals.behaviour_samples += 1
+            totals.risky_samples += risky
+            totals.risky_events += event
+    else:
+        speed = fields.get('speed')
+        high_risk = fields.get('severity') == HIGH_RISK_SEVERITY
+        for totals in (trip, day):
+            totals.safety_samples += 1
+            totals.high_risk_predictions += high_risk
+            if speed is not None and (totals.max_speed is None or speed > totals.max_speed):
+                totals.max_speed = speed
+
+
+def new_day(driver, user_id, day):
+    """A DriverDay accumulating one flush's increments"""
+    return DriverDay(driver=driver, user_id=user_id, day=day)
+
+
+def counters(totals):
+    return [getattr(totals, name) for name in COUNTERS]
+
+
+def update_trips(trips, before):
+    """
+    Write a flush's changes to trips that are already in the database, one
+    prepared UPDATE per trip. COUNTERS are added as the increase since
+    `before` (trip pk -> counters() at the start of the flush) and max_speed
+    only raised, so totals rebuild() wrote meanwhile are added to rather than
+    overwritten.
+    """
+    table = Trip._meta.db_table
+    fields = [Trip._meta.get_field(name) for name in TRIP_FIELDS]
+    max_speed = Trip._meta.get_field('max_speed').column
+    greatest = 'GREATEST' if connection.vendor == 'postgresql' else 'MAX'
+    assignments = [f'{field.column} = %s' for field in fields] + [
+        f'{max_speed} = COALESCE({greatest}({max_speed}, %s), {max_speed}, %s)'
+    ] + [f'{column} = {column} + %s' for column in (Trip._meta.get_field(name).column for name in COUNTERS)]
+    rows = []
+    for trip in trips:
+        speed = trip.max_speed
+        rows.append(
+            [field.get_db_prep_save(getattr(trip, field.attname), connection) for field in fields]
+            + [speed, speed]
+            + [after - start for after, start in zip(counters(trip), before[trip.pk])]
+            + [trip.pk]
+        )
+    with connection.cursor() as cursor:
+        cursor.executemany(f'UPDATE {table} SET {", ".join(assignments)} WHERE id = %s', rows)
+
+
+def upsert_days(days):
+    """
+    Add a flush's DriverDay increments to the stored rows in one INSERT ...
+    ON CONFLICT DO UPDATE per row, so several worker processes writing the
+    same driver-day add up instead of overwriting each other.
+    """
+    table = DriverDay._meta.db_table
+    fields = [DriverDay._meta.get_field(name) for name in ('driver', 'user', 'day', 'max_speed') + DAY_INCREMENTS]
+    columns = [field.column for field in fields]
+    greatest = 'GREATEST' if connection.vendor == 'postgresql' else 'MAX'
+    updates = [f'{column} = {table}.{column} + excluded.{column}' for column in columns[4:]] + [
+        f'user_id = COALESCE({table}.user_id, excluded.user_id)',
+        # SQLite's MAX() of a NULL is NULL
+        f'max_speed = COALESCE({greatest}({table}.max_speed, excluded.max_speed), {table}.max_speed, excluded.max_speed)',
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join(["%s"] * len(columns))}) '
+            f'ON CONFLICT (driver, day) DO UPDATE SET {", ".join(updates)}',
+            [[field.get_db_prep_save(getattr(day, field.attname), connection) for field in fields] for day in days],
+        )
+
+
+def rebuild(chunk_size=10000):
+    """
+    Recompute every trip's totals and all DriverDay rows from the stored
+    readings, folding them in the order the telemetry writer would have.
+    Returns (trips, driver-days) written.
+
+    Safe while telemetry writers run: the tables are locked first, so a
+    flush either committed before (and is counted here) or waits and then
+    adds its increments to the rebuilt totals.
+    """
+    columns = ('trip_id', 'timestamp', 'kind', 'risky', 'speed', 'severity')
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            tables = ', '.join(model._meta.db_table for model in (Trip, Reading, DriverDay))
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {tables} IN SHARE ROW EXCLUSIVE MODE')
+        # On SQLite this first write takes the database-wide write lock
+        DriverDay.objects.all().delete()
+        trips = Trip.objects.in_bulk()
+        for trip in trips.values():
+            trip.last_risky = False
+            trip.max_speed = None
+            for name in COUNTERS:
+                setattr(trip, name, 0)
+
+        days = {}
+        trip = previous = None
+        readings = Reading.objects.order_by('trip_id', 'timestamp', 'id').values_list(*columns)
+        for trip_id, timestamp, kind, risky, speed, severity in readings.iterator(chunk_size=chunk_size):
+            starts = trip is None or trip.pk != trip_id
+            if starts:
+                trip, previous = trips[trip_id], timestamp
+            key = (trip.driver, day_of(timestamp))
+            day = days.get(key)
+            if day is None:
+                day = days[key] = new_day(trip.driver, trip.user_id, key[1])
+            day.trips += starts
+            fold(trip, day, kind, {'risky': risky, 'speed': speed, 'severity': severity},
+                 (timestamp - previous).total_seconds())
+            previous = timestamp
+
+        Trip.objects.bulk_update(trips.values(), ('last_risky', 'max_speed') + COUNTERS, batch_size=500)
+        DriverDay.objects.bulk_create(days.values(), batch_size=500)
+    return len(trips), len(days)
+
@@ -0,0 +1,237 @@
+import atexit
+import threading
+from datetime import timedelta
+
+from django.contrib.auth import aget_user, get_user
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from inference import metrics
+from inference.features import SENSOR_FEATURES
+
+from . import rollups
+from .models import Reading, Trip
+
+# Rows are written with one bulk INSERT once BATCH_SIZE are pending or the
+# oldest has waited FLUSH_SECONDS, whichever comes first
+BATCH_SIZE = 500
+FLUSH_SECONDS = 1.0
+# Beyond this many unwritten rows (database down or locked) the oldest are dropped
+MAX_PENDING = 50000
+# A driver silent for this long starts a new trip
+TRIP_IDLE_SECONDS = 600
+DRIVER_LENGTH = Trip._meta.get_field('driver').max_length
+
+
+class TelemetryBuffer:
+    """
+    In-process write buffer for Reading rows.
+
+    Request threads only append to a list; a background thread turns the
+    pending rows into a Trip bulk_create (new trips only), one Reading
+    bulk_create, one Trip update and one DriverDay upsert per flush, folding
+    each reading into its trip's and day's risk totals on the way
+    (monitor.rollups). Both are written as increments, so a rollup rebuild
+    is not undone by the next flush. The open trip of every
+    active driver is kept in memory, and looked up once in the database the
+    first time this process sees a driver, so trips survive restarts.
+
+    Each worker process has its own buffer, so a driver whose requests land
+    on several processes at once can get one trip per process.
+    With flush_seconds=None there is no background thread and a full batch is
+    written by the thread that fills it (management commands, tests).
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, flush_seconds=FLUSH_SECONDS, max_pending=MAX_PENDING,
+                 trip_idle_seconds=TRIP_IDLE_SECONDS):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self.trip_gap = timedelta(seconds=trip_idle_seconds)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._full = threading.Event()
+        self._worker = None
+        self._trips = {}  # driver -> open Trip
+
+    def __len__(self):
+        return len(self._pending)
+
+    def record(self, driver, user_id, kind, **fields):
+        """Queue one Reading for `driver` (timestamped now); the model instance is built by the writer"""
+        row = (driver, user_id, timezone.now(), kind, fields)
+        with self._lock:
+            self._pending.append(row)
+            pending = len(self._pending)
+            if pending > self.max_pending:
+                dropped = pending - self.max_pending
+                del self._pending[:dropped]
+                metrics.inc('telemetry_rows_dropped', dropped)
+
+        if self.flush_seconds is None:
+            if pending >= self.batch_size:
+                self.flush()
+            return
+        if self._worker is None:
+            self._start()
+        if pending >= self.batch_size:
+            self._full.set()
+
+    def flush(self):
+        """Write everything pending now; returns the number of readings written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                self._write(batch)
+                written = len(batch)
+            except IntegrityError:
+                # Bad rows (e.g. a user deleted mid-trip) would fail every retry: write the batch
+                # again one row at a time and drop only those
+                self._trips.clear()
+                written = 0
+                for position, row in enumerate(batch):
+                    try:
+                        self._write([row])
+                    except IntegrityError as e:
+                        self._trips.pop(row[0], None)
+                        metrics.inc('telemetry_rows_dropped')
+                        print(f"⚠️ Telemetry reading for {row[0]} rejected and dropped: {e}")
+                    except Exception as e:
+                        self._retry_later(batch[position:], e)
+                        break
+                    else:
+                        written += 1
+            except Exception as e:
+                self._retry_later(batch, e)
+                return 0
+            metrics.inc('telemetry_rows_written', written)
+            return written
+
+    def _retry_later(self, rows, error):
+        # Put the rows back in front (bounded by max_pending) for the next flush; the open
+        # trips are re-read since the new ones of the failed write were rolled back
+        with self._lock:
+            self._pending[:0] = rows[-self.max_pending:]
+        self._trips.clear()
+        print(f"⚠️ Telemetry flush failed, {len(rows)} readings kept for retry: {error}")
+
+    def _write(self, batch):
+        new_trips = []
+        touched = {}
+        before = {}  # trip pk -> its counters before this batch, so the flush writes increments
+        readings = []
+        days = {}
+
+        unknown = {row[0] for row in batch if row[0] not in self._trips}
+        if unknown:
+            cutoff = batch[0][2] - self.trip_gap
+            for trip in Trip.objects.filter(driver__in=unknown, ended_at__gte=cutoff).order_by('ended_at'):
+                self._trips[trip.driver] = trip
+
+        for driver, user_id, timestamp, kind, fields in batch:
+            trip = self._trips.get(driver)
+            starts = trip is None or timestamp - trip.ended_at > self.trip_gap
+            if starts:
+                trip = Trip(user_id=user_id, driver=driver, started_at=timestamp, ended_at=timestamp)
+                self._trips[driver] = trip
+                new_trips.append(trip)
+            elif trip.pk is not None and trip.pk not in touched:
+                touched[trip.pk] = trip
+                before[trip.pk] = rollups.counters(trip)
+
+            key = (driver, rollups.day_of(timestamp))
+            day = days.get(key)
+            if day is None:
+                day = days[key] = rollups.new_day(driver, user_id, key[1])
+            day.trips += starts
+            rollups.fold(trip, day, kind, fields, (timestamp - trip.ended_at).total_seconds())
+            trip.ended_at = timestamp
+            readings.append(Reading(user_id=user_id, trip=trip, timestamp=timestamp, kind=kind, **fields))
+
+        with transaction.atomic():
+            Trip.objects.bulk_create(new_trips)
+            Reading.objects.bulk_create(readings, batch_size=self.batch_size)
+            if touched:
+                # One prepared UPDATE run per trip; bulk_update's CASE expression costs
+                # more to build in Python than the whole Reading insert
+                rollups.update_trips(touched.values(), before)
+            rollups.upsert_days(days.values())
+
+        # Forget drivers whose trip is over
+        horizon = batch[-1][2] - self.trip_gap
+        for driver in [driver for driver, trip in self._trips.items() if trip.ended_at < horizon]:
+            del self._trips[driver]
+
+    def _start(self):
+        with self._lock:
+            if self._worker is not None:
+                return
+            self._worker = threading.Thread(target=self._run, name='telemetry-writer', daemon=True)
+        self._worker.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._full.wait(self.flush_seconds)
+            self._full.clear()
+            close_old_connections()
+            self.flush()
+
+
+telemetry = TelemetryBuffer()
+
+
+def record_behaviour(driver, user_id, sample, result, version):
+    """Queue a scored sensor sample (fields as posted to /api/predict-behavior/)"""
+    telemetry.record(
+        driver, user_id, Reading.BEHAVIOR,
+        **{name: float(sample.get(name, 0)) for name in SENSOR_FEATURES},
+        risky=result['behavior'] == 'risky',
+        risky_probability=result['risky_probability'],
+        model_version=version,
+    )
+
+
+def record_severity(driver, user_id, data, prediction, version):
+    """Queue a scored monitor form submission (fields as posted to /predict/)"""
+    telemetry.record(
+        driver, user_id, Reading.SAFETY,
+        speed=float(data.get('speed')),
+        severity=prediction,
+        model_version=version,
+    )
+
+
+def request_driver(request, data):
+    """
+    (driver key, user id) for an HTTP prediction request: the logged-in
+    user, whatever driver_id the payload claims; else the payload's
+    driver_id if it sent one and it fits the driver column; (None, None)
+    for other anonymous requests, which are scored but not recorded.
+
+    The user is resolved by django.contrib.auth.get_user, so a session whose
+    user was deleted or changed password counts as anonymous instead of
+    writing readings for a user that no longer exists.
+    """
+    return _driver(get_user(request), data)
+
+
+async def arequest_driver(request, data):
+    """request_driver for async views (the session and user are loaded without blocking the event loop)"""
+    return _driver(await aget_user(request), data)
+
+
+def _driver(user, data):
+    # A session identifies the driver; a client-sent id must not reach another user's trips
+    if user.is_authenticated:
+        return f'user-{user.pk}', user.pk
+    if data.get('driver_id') is not None:
+        driver = f"driver-{data['driver_id']}"
+        # An id too long for the driver column would fail the flush it lands in
+        if len(driver) <= DRIVER_LENGTH:
+            return driver, None
+    return None, None
@@ -1,3 +1,213 @@
-from django.test import TestCase
+from datetime import timedelta
+from importlib import import_module
+from unittest import skipUnless
 
-# Create your tests here.
+import numpy as np
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.auth.models import User
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, tag
+from django.utils import timezone
+
+from inference import benchmarks, wire
+from inference.serving import predict_severity, severity_model
+
+from .models import DriverDay, Reading, Trip
+from .rollups import rebuild
+from .telemetry import TelemetryBuffer, request_driver
+
+FORM = {
+    'speed': '30', 'vehicles': '2', 'casualties': '1', 'day': '3',
+    'light': '1', 'weather': '1', 'surface': '1', 'urban': '1',
+}
+
+
+class TelemetryBufferTests(TestCase):
+    def test_buffered_rows_are_bulk_written_into_trips(self):
+        user = User.objects.create_user('driver', password='x')
+        buffer = TelemetryBuffer(batch_size=3, flush_seconds=None)
+
+        buffer.record('user-1', user.pk, Reading.SAFETY, speed=30.0, severity=2)
+        buffer.record('conn-a', None, Reading.BEHAVIOR, accel_2=0.1, risky=False)
+        self.assertEqual(Reading.objects.count(), 0)
+        with self.assertNumQueries(6):  # trip lookup, trip insert, reading insert, day upsert, savepoint pair
+            buffer.record('user-1', user.pk, Reading.SAFETY, speed=50.0, severity=3)
+        self.assertEqual(len(buffer), 0)
+
+        trip = Trip.objects.get(driver='user-1')
+        self.assertEqual(list(trip.readings.order_by('timestamp').values_list('speed', flat=True)), [30.0, 50.0])
+        self.assertEqual(trip.ended_at, trip.readings.latest('timestamp').timestamp)
+        self.assertEqual(Trip.objects.count(), 2)
+
+        # A restarted process continues the open trip; one idle for too long is closed
+        Trip.objects.filter(driver='conn-a').update(ended_at=timezone.now() - timedelta(hours=1))
+        restarted = TelemetryBuffer(flush_seconds=None)
+        restarted.record('user-1', user.pk, Reading.SAFETY, speed=40.0, severity=2)
+        restarted.record('conn-a', None, Reading.BEHAVIOR, accel_2=0.2, risky=True)
+        self.assertEqual(restarted.flush(), 2)
+        self.assertEqual(Trip.objects.filter(driver='user-1').count(), 1)
+        self.assertEqual(trip.readings.count(), 3)
+        self.assertEqual(Trip.objects.filter(driver='conn-a').count(), 2)
+
+    def test_logged_in_requests_cannot_claim_another_driver(self):
+        user = User.objects.create_user('driver', password='x')
+        self.client.force_login(user)
+        request = RequestFactory().post('/api/predict-behavior/')
+        request.session = self.client.session
+        self.assertEqual(request_driver(request, {'driver_id': 'someone-else'}), (f'user-{user.pk}', user.pk))
+        self.assertEqual(request_driver(request, {}), (f'user-{user.pk}', user.pk))
+
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        self.assertEqual(request_driver(request, {'driver_id': 'phone-7'}), ('driver-phone-7', None))
+        self.assertEqual(request_driver(request, {}), (None, None))
+        # Too long for the driver column: scored but not recorded, rather than failing the flush
+        self.assertEqual(request_driver(request, {'driver_id': 'x' * 57}), ('driver-' + 'x' * 57, None))
+        self.assertEqual(request_driver(request, {'driver_id': 'x' * 58}), (None, None))
+
+    def test_stale_sessions_count_as_anonymous(self):
+        user = User.objects.create_user('driver', password='x')
+        request = RequestFactory().post('/api/predict-behavior/')
+        # A user id alone, without the backend and password hash that login() stores
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        request.session[SESSION_KEY] = str(user.pk)
+        self.assertEqual(request_driver(request, {}), (None, None))
+
+        self.client.force_login(user)
+        request.session = self.client.session
+        user.delete()
+        self.assertEqual(request_driver(request, {'driver_id': 'phone-7'}), ('driver-phone-7', None))
+
+
+class TelemetryFlushTests(TransactionTestCase):
+    """Flushes that hit a constraint, which SQLite only checks when a real transaction commits"""
+
+    def test_a_rejected_reading_does_not_drop_the_rest_of_the_batch(self):
+        user = User.objects.create_user('driver', password='x')
+        buffer = TelemetryBuffer(flush_seconds=None)
+        buffer.record('user-1', user.pk, Reading.SAFETY, speed=30.0, severity=2)
+        buffer.record('user-gone', user.pk + 1, Reading.BEHAVIOR, risky=True)  # no such user
+        buffer.record('conn-a', None, Reading.BEHAVIOR, accel_2=0.1, risky=False)
+        buffer.record('user-1', user.pk, Reading.SAFETY, speed=50.0, severity=3)
+
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(Reading.objects.count(), 3)
+        self.assertFalse(Trip.objects.filter(driver='user-gone').exists())
+        trip = Trip.objects.get(driver='user-1')
+        self.assertEqual((trip.safety_samples, trip.max_speed), (2, 50.0))
+
+
+class RiskRollupTests(TestCase):
+    def test_totals_follow_each_flush_and_rebuild_reproduces_them(self):
+        user = User.objects.create_user('driver', password='x')
+        buffer = TelemetryBuffer(flush_seconds=None)
+
+        # A risky run spanning two flushes counts as one event
+        for risky in (False, True, True):
+            buffer.record('user-1', user.pk, Reading.BEHAVIOR, risky=risky)
+        buffer.record('user-1', user.pk, Reading.SAFETY, speed=30.0, severity=1)
+        buffer.flush()
+        for risky in (True, False, True):
+            buffer.record('user-1', user.pk, Reading.BEHAVIOR, risky=risky)
+        buffer.record('user-1', user.pk, Reading.SAFETY, speed=50.0, severity=3)
+        buffer.flush()
+
+        trip = Trip.objects.get()
+        totals = ('behaviour_samples', 'risky_samples', 'risky_events', 'safety_samples', 'high_risk_predictions', 'max_speed')
+        expected = (6, 4, 2, 2, 1, 50.0)
+        self.assertEqual(tuple(getattr(trip, name) for name in totals), expected)
+        self.assertAlmostEqual(trip.risky_fraction, 4 / 6)
+
+        day = DriverDay.objects.get()
+        self.assertEqual((day.driver, day.user_id, day.day, day.trips), ('user-1', user.pk, timezone.localdate(), 1))
+        self.assertEqual(tuple(getattr(day, name) for name in totals), expected)
+        self.assertAlmostEqual(day.driving_seconds, trip.duration.total_seconds(), places=3)
+
+        Trip.objects.update(risky_samples=0, risky_events=0, max_speed=None)
+        DriverDay.objects.all().delete()
+        self.assertEqual(rebuild(), (1, 1))
+        trip.refresh_from_db()
+        self.assertEqual(tuple(getattr(trip, name) for name in totals), expected)
+        rebuilt = DriverDay.objects.get()
+        self.assertEqual(tuple(getattr(rebuilt, name) for name in totals), expected)
+        self.assertEqual(rebuilt.trips, 1)
+        self.assertAlmostEqual(rebuilt.driving_seconds, day.driving_seconds)
+
+    def test_flushes_after_a_rebuild_add_to_the_rebuilt_totals(self):
+        user = User.objects.create_user('driver', password='x')
+        buffer = TelemetryBuffer(flush_seconds=None)
+        buffer.record('user-1', user.pk, Reading.BEHAVIOR, risky=False)
+        buffer.flush()
+
+        # Readings imported behind the running buffer's back, then rebuilt into the totals
+        trip = Trip.objects.get()
+        Reading.objects.create(user=user, trip=trip, timestamp=trip.ended_at, kind=Reading.BEHAVIOR, risky=True)
+        Reading.objects.create(user=user, trip=trip, timestamp=trip.ended_at, kind=Reading.SAFETY, speed=80.0)
+        rebuild()
+
+        buffer.record('user-1', user.pk, Reading.BEHAVIOR, risky=True)
+        buffer.record('user-1', user.pk, Reading.SAFETY, speed=40.0, severity=1)
+        buffer.flush()
+
+        totals = ('behaviour_samples', 'risky_samples', 'safety_samples', 'high_risk_predictions', 'max_speed')
+        trip.refresh_from_db()
+        flushed = tuple(getattr(trip, name) for name in totals)
+        self.assertEqual(flushed, (3, 2, 2, 1, 80.0))
+        rebuild()
+        trip.refresh_from_db()
+        self.assertEqual(tuple(getattr(trip, name) for name in totals), flushed)
+
+    def test_dashboard_reads_the_stored_rollups(self):
+        user = User.objects.create_user('driver', password='x', is_staff=True)
+        for i in range(3):
+            DriverDay.objects.create(
+                driver=f'user-{user.pk}', user=user, day=timezone.localdate() - timedelta(days=i),
+                behaviour_samples=100_000, risky_samples=25_000, risky_events=i,
+            )
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+
+        with self.assertNumQueries(4):  # user, days, trips, fleet (the session comes from the cache)
+            response = client.get('/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['days']), 3)
+        self.assertEqual(len(response.context['fleet']), 1)
+        self.assertContains(response, '25%')
+
+
+@skipUnless(severity_model.get() is not None, 'no accident severity model is loaded')
+class PredictSafetyTests(TestCase):
+    def test_bad_form_values_get_a_400(self):
+        client = Client(HTTP_HOST='localhost')
+        self.assertEqual(client.post('/predict/', FORM).status_code, 200)
+        for path in ('/predict/', '/predict/async/'):
+            self.assertEqual(client.post(path, {**FORM, 'speed': 'fast'}).status_code, 400)
+            self.assertEqual(client.post(path, {k: v for k, v in FORM.items() if k != 'vehicles'}).status_code, 400)
+
+        record = np.array([[float(FORM[field]) for field in wire.SCHEMAS[wire.SEVERITY]]])
+        record[0, 0] = np.inf
+        # encode() does not check values, so this is what a misbehaving client could send
+        response = client.post('/predict/', wire.encode(record, wire.SEVERITY), content_type=wire.CONTENT_TYPE)
+        self.assertEqual(response.status_code, 400)
+
+
+@tag('benchmark')
+@skipUnless(benchmarks.ENABLED, 'set BENCHMARK=1 to run the benchmarks')
+@skipUnless(severity_model.get() is not None, 'no accident severity model is loaded')
+class PredictSafetyBenchmarks(benchmarks.BenchmarkMixin, SimpleTestCase):
+    """Latency / throughput of /predict/ end to end and of the scoring underneath it"""
+
+    def test_predict_view(self):
+        def make_call():
+            client = Client(HTTP_HOST='localhost')
+
+            def call():
+                response = client.post('/predict/', FORM)
+                assert response.status_code == 200, response.content
+            return call
+
+        self.assertNoRegression('predict_safety view', make_call)
+
+    def test_predict_model(self):
+        self.assertNoRegression('predict_severity', lambda: lambda: predict_severity(FORM))
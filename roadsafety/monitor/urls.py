@@ -4,4 +4,6 @@ from . import views
 urlpatterns = [
     path('index/', views.index, name='index'),
     path('predict/', views.predict_safety, name='predict'),
+    path('predict/async/', views.predict_safety_async, name='predict_async'),  # ASGI
+    path('dashboard/', views.dashboard, name='dashboard'),
 ]
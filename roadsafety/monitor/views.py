@@ -1,41 +1,115 @@
+from datetime import timedelta
+
 from django.shortcuts import render
 
 # Create your views here.
-import joblib
-import numpy as np
+from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 
+from inference import metrics, wire
+from inference.admission import Rejected, admission, rejected_response
+from inference.serving import ModelNotLoaded, predict_severity
 
-import joblib
-import os
+from .models import DriverDay, Trip
+from .telemetry import arequest_driver, record_severity, request_driver
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-model_path = os.path.join(BASE_DIR, 'model', 'accident_severity_model.pkl')
-model = joblib.load(model_path)
-label_model_path = os.path.join(BASE_DIR, 'model', 'label_encoders.pkl')
-label_encoders = joblib.load(label_model_path)
+# Rows shown on the dashboard
+DASHBOARD_DAYS = 30
+DASHBOARD_TRIPS = 20
+DASHBOARD_FLEET = 100
 
 
 def predict_safety(request):
     if request.method == 'POST':
-        data = request.POST
-        speed = float(data.get('speed'))
-        vehicles = int(data.get('vehicles'))
-        casualties = int(data.get('casualties'))
-        day = int(data.get('day'))
-        light = int(data.get('light'))
-        weather = int(data.get('weather'))
-        surface = int(data.get('surface'))
-        urban = int(data.get('urban'))
-
-        X = np.array([[speed, vehicles, casualties, day, light, weather, surface, urban]])
-        prediction = model.predict(X)[0]
-
-        return JsonResponse({'prediction': int(prediction)})
+        try:
+            data = _form(request)
+        except wire.WireFormatError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        metrics.lap('parse')
+        try:
+            prediction, version = predict_severity(data)
+        except ModelNotLoaded as e:
+            return JsonResponse({'error': str(e)}, status=500)
+        except (ValueError, TypeError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        driver, user_id = request_driver(request, data)
+        metrics.lap('driver')
+        if driver is not None:
+            record_severity(driver, user_id, data, prediction, version)
+            metrics.lap('telemetry')
+
+        response = JsonResponse({'prediction': prediction, 'model_version': version})
+        response['X-Model-Version'] = version
+        metrics.lap('serialize')
+        return response
+    return JsonResponse({'error': 'Invalid request'}, status=400)
+
+
+async def predict_safety_async(request):
+    """Async predict_safety for the ASGI app, admitted through inference.admission like predict_behavior_async"""
+    if request.method == 'POST':
+        try:
+            data = _form(request)
+        except wire.WireFormatError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        metrics.lap('parse')
+
+        driver, user_id = await arequest_driver(request, data)
+        metrics.lap('driver')
+        try:
+            prediction, version = await admission.run(predict_severity, data, driver=driver)
+        except Rejected as e:
+            return rejected_response(e)
+        except ModelNotLoaded as e:
+            return JsonResponse({'error': str(e)}, status=500)
+        except (ValueError, TypeError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        if driver is not None:
+            record_severity(driver, user_id, data, prediction, version)
+            metrics.lap('telemetry')
+
+        response = JsonResponse({'prediction': prediction, 'model_version': version})
+        response['X-Model-Version'] = version
+        metrics.lap('serialize')
+        return response
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
 
+def _form(request):
+    """The form fields, or one packed inference.wire severity record (driver_id then in the query string)"""
+    if request.content_type == wire.CONTENT_TYPE:
+        data = wire.as_dicts(wire.decode(request.body, wire.SEVERITY, max_count=1), wire.SEVERITY)[0]
+        data['driver_id'] = request.GET.get('driver_id')
+        return data
+    return request.POST
+
+
 from django.shortcuts import render
 
 def index(request):
     return render(request, 'monitor/index.html')
+
+
+@login_required
+def dashboard(request):
+    """
+    Risk history from the stored rollups (monitor.rollups): the user's
+    recent days and trips, plus for staff the busiest drivers of one day
+    (?day=YYYY-MM-DD, default today). Every row is read precomputed, so the
+    cost does not grow with the number of readings behind it.
+    """
+    today = timezone.localdate()
+    since = today - timedelta(days=DASHBOARD_DAYS)
+    context = {
+        'days': DriverDay.objects.filter(user=request.user, day__gt=since).order_by('-day', 'driver'),
+        'trips': Trip.objects.filter(user=request.user).order_by('-started_at')[:DASHBOARD_TRIPS],
+    }
+    if request.user.is_staff:
+        day = parse_date(request.GET.get('day') or '') or today
+        context['fleet_day'] = day
+        context['fleet'] = DriverDay.objects.filter(day=day).order_by('-risky_events', 'driver')[:DASHBOARD_FLEET]
+    return render(request, 'monitor/dashboard.html', context)
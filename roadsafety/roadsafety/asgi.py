@@ -2,6 +2,8 @@
 ASGI config for roadsafety project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django; WebSocket connections go to the sensor stream in
+``inference.streaming`` (run under an ASGI server such as uvicorn or daphne).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +15,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'roadsafety.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up, since it loads the models
+from inference.streaming import sensor_stream  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await sensor_stream(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -42,10 +42,12 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     "authentication",
     "pwa",
-    "monitor"
+    "monitor",
+    "inference",
 ]
 
 MIDDLEWARE = [
+    'inference.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -97,6 +99,16 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open across requests instead of reconnecting (and re-running the PRAGMAs) each time
+        'CONN_MAX_AGE': None,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # WAL lets readers proceed while the telemetry writer commits; writers queue on
+            # the 20s busy timeout instead of failing with "database is locked"
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -152,5 +164,28 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# Sessions are read from the local cache and only written through to the database when
+# they change, so the monitor pages' polling requests do not query django_session.
+# 'django.contrib.sessions.backends.signed_cookies' removes the database entirely, at the
+# cost of sessions that cannot be revoked server-side before they expire.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/home/'
+
+# /metrics (Prometheus text format) only answers scrapers connecting directly from these
+# addresses, or any scraper sending "Authorization: Bearer <METRICS_TOKEN>". Requests with
+# proxy forwarding headers never count as local: the ngrok tunnel connects from 127.0.0.1.
+METRICS_ALLOWED_HOSTS = ['127.0.0.1', '::1']
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Micro-batch concurrent single-sample behaviour predictions into one forest pass
+# (inference.batching): a request waits up to MAX_DELAY seconds for others to join its
+# batch of at most MAX_BATCH rows; WORKERS > 0 scores batches in that many processes.
+# Worth enabling once many drivers post at once; a lone request pays the full MAX_DELAY.
+INFERENCE_BATCHING = None  # e.g. {'MAX_BATCH': 16, 'MAX_DELAY': 0.002, 'WORKERS': 0}
+
+# Admission control for the async prediction views (inference.admission): CONCURRENCY model
+# calls at once, QUEUE_DEPTH more waiting, then 503 + Retry-After; samples older than
+# MAX_AGE seconds by the time a slot frees up are dropped rather than scored
+INFERENCE_ADMISSION = {'CONCURRENCY': 4, 'QUEUE_DEPTH': 64, 'MAX_AGE': 2.0, 'RETRY_AFTER': 1}
@@ -25,6 +25,7 @@ urlpatterns = [
     path('', include('authentication.urls')),
     path('', include('pwa.urls')),
     path('', include('monitor.urls')),
+    path('', include('inference.urls')),
 
 ]
 